@@ -0,0 +1,11 @@
+"""
+Benchmarks of the checker on synthetic bibliographies.
+
+    python -m benchmarks run --size 1000 10000 -o before.json
+    python -m benchmarks compare before.json after.json
+    python -m benchmarks generate refs.bib --case duplicates --size 100000
+
+corpus generates the .bib files (seeded, so every run and machine measures
+the same input) and bench measures the parse, check (per rule) and render
+phases on them and compares results.
+"""
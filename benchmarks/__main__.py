@@ -0,0 +1,105 @@
+import os
+import sys
+import argparse
+
+# The checker's modules are at the top of the repository, next to this package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import CASES, DEFAULT_SEED, write_corpus
+from benchmarks.bench import (DEFAULT_CASES, DEFAULT_SIZES, DEFAULT_REPEAT, DEFAULT_CORPUS_DIR, DEFAULT_TOLERANCE,
+                              run_benchmarks, print_results, write_results, load_results, compare_results)
+from benchmarks.startup import DEFAULT_STARTUP_SIZE, DEFAULT_STARTUP_REPEAT, run_startup, print_startup
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmarks of parsing, checking and rendering synthetic bibliographies.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic .bib file")
+    generate.add_argument("output", help="Path of the .bib file to write")
+    generate.add_argument("--case", choices=list(CASES), default="typical", help="Kind of corpus (default: typical)")
+    generate.add_argument("--size", type=int, default=1000, help="Number of entries (default: 1000)")
+    generate.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED})")
+
+    run = commands.add_parser("run", help="Measure the parse, check (per rule) and render phases")
+    run.add_argument("--case", dest="cases", nargs="+", choices=list(CASES), default=list(DEFAULT_CASES),
+                     help="Kinds of corpus (default: all)")
+    run.add_argument("--size", dest="sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                     help=f"Numbers of entries, 1000 to 1000000 (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    run.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED})")
+    run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                     help=f"Timed runs of each phase, of which the best is kept (default: {DEFAULT_REPEAT})")
+    run.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurements")
+    run.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR,
+                     help=f"Where generated corpora are kept between runs (default: {DEFAULT_CORPUS_DIR})")
+    run.add_argument("--output", "-o", default=None,
+                     help="Write the results as JSON to this file ('-' for standard output)")
+
+    startup = commands.add_parser("startup", help="Measure how long main.py takes to start and check a small file")
+    startup.add_argument("--size", type=int, default=DEFAULT_STARTUP_SIZE,
+                         help=f"Number of entries (default: {DEFAULT_STARTUP_SIZE})")
+    startup.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED})")
+    startup.add_argument("--repeat", type=int, default=DEFAULT_STARTUP_REPEAT,
+                         help=f"Runs of each command, of which the best is kept (default: {DEFAULT_STARTUP_REPEAT})")
+    startup.add_argument("--budget", type=float, default=None, metavar="MS",
+                         help="Exit with status 1 if checking the file takes longer than this many milliseconds")
+    startup.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR,
+                         help=f"Where generated corpora are kept between runs (default: {DEFAULT_CORPUS_DIR})")
+    startup.add_argument("--output", "-o", default=None,
+                         help="Write the results as JSON to this file ('-' for standard output)")
+
+    compare = commands.add_parser("compare", help="Compare the results of two runs, e.g. of two commits")
+    compare.add_argument("old", help="Results of the earlier run")
+    compare.add_argument("new", help="Results of the later run")
+    compare.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                         help=f"Relative slowdown or growth reported as a regression (default: {DEFAULT_TOLERANCE})")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        if args.size < 1:
+            parser.error("--size must be at least 1")
+        size = write_corpus(args.output, args.case, args.size, args.seed)
+        print(f"Wrote '{args.output}': {args.size} entries, {size} bytes.")
+
+    elif args.command == "run":
+        if min(args.sizes) < 1 or args.repeat < 1:
+            parser.error("--size and --repeat must be at least 1")
+        # Keep standard output for the results when they go there
+        log = sys.stderr if args.output == "-" else sys.stdout
+        results = run_benchmarks(args.cases, args.sizes, seed=args.seed, repeat=args.repeat,
+                                 memory=not args.no_memory, corpus_dir=args.corpus_dir, log=log)
+        print_results(results, file=log)
+        if args.output is not None:
+            write_results(results, args.output)
+
+    elif args.command == "startup":
+        if args.size < 1 or args.repeat < 1:
+            parser.error("--size and --repeat must be at least 1")
+        log = sys.stderr if args.output == "-" else sys.stdout
+        results = run_startup(args.size, seed=args.seed, repeat=args.repeat, corpus_dir=args.corpus_dir)
+        print_startup(results, file=log)
+        if args.output is not None:
+            write_results(results, args.output)
+        run = results['runs'][0]
+        over_budget = args.budget is not None and run['phases']['check']['seconds'] * 1000 > args.budget
+        if over_budget:
+            print(f"Checking took longer than {args.budget:g} ms.", file=log)
+        sys.exit(1 if over_budget or run['excluded_imports'] else 0)
+
+    else:
+        try:
+            old, new = load_results(args.old), load_results(args.new)
+        except (OSError, ValueError) as error:
+            print(f"Error: {error}", file=sys.stderr)
+            sys.exit(2)
+        regressions = compare_results(old, new, tolerance=args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions.")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import gc
+import sys
+import time
+import json
+import platform
+import datetime
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from bib_read import Book, Others
+from bib_parser import BibParser
+from check_bib import RULES, check
+from html_show import html_save
+from issue import IssueStats
+from profiler import CHECK_RULE_PREFIX, format_bytes
+from benchmarks.corpus import GENERATOR_VERSION, DEFAULT_SEED, write_corpus
+
+# Version of the layout of the results file
+RESULTS_VERSION = 1
+DEFAULT_CASES = ('typical', 'deep_braces', 'huge_abstracts', 'duplicates', 'many_venues')
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 3
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), 'latexbibchecker-bench')
+# A phase this much slower than before is reported as a regression by compare
+DEFAULT_TOLERANCE = 0.1
+# Phases shorter than this are too noisy to call a regression
+MIN_COMPARED_SECONDS = 0.005
+
+
+def corpus_path(corpus_dir: str, case: str, size: int, seed: int) -> str:
+    """The generated corpus for (case, size, seed), written on first use."""
+    path = os.path.join(corpus_dir, f"{case}-{size}-{seed}-v{GENERATOR_VERSION}.bib")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        partial = path + '.partial'
+        write_corpus(partial, case, size, seed)
+        os.replace(partial, path)
+    return path
+
+
+def measure(func: Callable[[], object], repeat: int, memory: bool) -> Tuple[Dict[str, float], object]:
+    """
+    Time `func` `repeat` times, then run it once more under tracemalloc.
+
+    Returns:
+        ({'seconds': best time, 'median': median time[, 'peak_bytes': peak
+        allocated beyond what was allocated before]}, result of the last call)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    measurement = {'seconds': min(times), 'median': statistics.median(times)}
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            result = func()
+            measurement['peak_bytes'] = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+    return measurement, result
+
+
+def count_issues(entries) -> int:
+    return sum(len(entry.issues) for entry in entries)
+
+
+def run_case(path: str, repeat: int, memory: bool, output_dir: str) -> Dict[str, object]:
+    """
+    Measure the phases of checking the file `path` as main.py does.
+
+    The phases are 'parse' (BibParser.parse_file), 'check:<rule>' for
+    every rule of check_bib.RULES run on its own, 'check' (all of them in
+    one pass, as check() does) and 'render' (html_save, which writes the
+    report to `output_dir`).
+    """
+    phases: Dict[str, Dict[str, float]] = {}
+    phases['parse'], parsed = measure(lambda: BibParser.parse_file(path), repeat, memory)
+
+    # check() leaves books and other entries out
+    entries = [entry for entry in parsed if not isinstance(entry, (Others, Book))]
+    for rule in RULES.rules:
+        measurement, _ = measure(lambda: RULES.run(entries, rules=(rule,)), repeat, memory)
+        measurement['issues'] = count_issues(entries)
+        phases[CHECK_RULE_PREFIX + rule.name] = measurement
+
+    phases['check'], checked = measure(lambda: check(list(parsed)), repeat, memory)
+    phases['check']['issues'] = count_issues(checked)
+
+    stats = IssueStats.from_entries(checked)
+    report = os.path.join(output_dir, 'report.html')
+    phases['render'], _ = measure(lambda: html_save(checked, report, stats=stats), repeat, memory)
+    phases['render']['bytes'] = os.path.getsize(report)
+
+    return {'bytes': os.path.getsize(path), 'entries': len(parsed), 'checked': len(checked),
+            'issues': phases['check']['issues'], 'phases': phases}
+
+
+def git_revision() -> Tuple[Optional[str], Optional[bool]]:
+    """(commit, whether the tree has uncommitted changes) of the checkout being measured, or Nones outside git."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def run_benchmarks(cases: Sequence[str] = DEFAULT_CASES, sizes: Sequence[int] = DEFAULT_SIZES,
+                   seed: int = DEFAULT_SEED, repeat: int = DEFAULT_REPEAT, memory: bool = True,
+                   corpus_dir: str = DEFAULT_CORPUS_DIR, log: Optional[TextIO] = None) -> Dict[str, object]:
+    """
+    Measure every case at every size.
+
+    Args:
+        cases: Names of benchmarks.corpus.CASES
+        sizes: Numbers of entries
+        seed: Seed of the generated corpora
+        repeat: Timed runs of each phase; the best and the median are kept
+        memory: Also measure the peak memory of each phase, in one more run under tracemalloc
+        corpus_dir: Where generated corpora are kept between runs
+        log: Where to report progress, if anywhere
+
+    Returns:
+        The results, as written by `python -m benchmarks run`
+    """
+    commit, dirty = git_revision()
+    results = {
+        'version': RESULTS_VERSION,
+        'generator_version': GENERATOR_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as output_dir:
+        for case in cases:
+            for size in sizes:
+                if log is not None:
+                    print(f"{case} {size}...", file=log, flush=True)
+                path = corpus_path(corpus_dir, case, size, seed)
+                results['runs'].append({'case': case, 'size': size, **run_case(path, repeat, memory, output_dir)})
+    return results
+
+
+def print_results(results: Dict[str, object], file: Optional[TextIO] = None) -> None:
+    """One line per case, size and phase: best time, median time and peak memory."""
+    for run in results['runs']:
+        print(f"{run['case']} {run['size']}: {run['entries']} entries, {run['issues']} issues, "
+              f"{format_bytes(run['bytes'])}", file=file)
+        for phase, measurement in run['phases'].items():
+            print(f"  {phase:<32} {measurement['seconds'] * 1000:10.1f} ms  {measurement['median'] * 1000:10.1f} ms  "
+                  f"{format_bytes(measurement.get('peak_bytes')):>10}", file=file)
+
+
+def load_results(path: str) -> Dict[str, object]:
+    with open(path, 'r', encoding='utf-8') as file:
+        results = json.load(file)
+    if results.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{path}: results version {results.get('version')}, expected {RESULTS_VERSION}")
+    return results
+
+
+def compare_results(old: Dict[str, object], new: Dict[str, object], tolerance: float = DEFAULT_TOLERANCE,
+                    file: Optional[TextIO] = None) -> List[Tuple[str, int, str]]:
+    """
+    Print the time and memory of every phase measured in both results, new relative to old.
+
+    Returns:
+        (case, size, phase) of the phases at least `tolerance` slower (by
+        best time) or bigger (by peak memory) than before
+    """
+    if old.get('generator_version') != new.get('generator_version') or old.get('seed') != new.get('seed'):
+        print("Warning: the results were measured on different corpora", file=file)
+    old_runs = {(run['case'], run['size']): run for run in old['runs']}
+    regressions = []
+    for run in new['runs']:
+        old_run = old_runs.get((run['case'], run['size']))
+        if old_run is None:
+            continue
+        print(f"{run['case']} {run['size']}:", file=file)
+        for phase, measurement in run['phases'].items():
+            before = old_run['phases'].get(phase)
+            if before is None:
+                continue
+            time_ratio = measurement['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+            slower = time_ratio > 1 + tolerance and measurement['seconds'] >= MIN_COMPARED_SECONDS
+            memory_ratio = None
+            if before.get('peak_bytes') and 'peak_bytes' in measurement:
+                memory_ratio = measurement['peak_bytes'] / before['peak_bytes']
+            bigger = memory_ratio is not None and memory_ratio > 1 + tolerance
+            if slower or bigger:
+                regressions.append((run['case'], run['size'], phase))
+            memory_text = f"{memory_ratio:6.2f}x" if memory_ratio is not None else '      -'
+            print(f"  {phase:<32} {before['seconds'] * 1000:10.1f} ms -> {measurement['seconds'] * 1000:10.1f} ms "
+                  f"{time_ratio:6.2f}x  memory {memory_text}{'  REGRESSION' if slower or bigger else ''}", file=file)
+    return regressions
+
+
+def write_results(results: Dict[str, object], path: Optional[str]) -> None:
+    """Write `results` as JSON to `path`, or to standard output for None or '-'."""
+    text = json.dumps(results, indent=1) + '\n'
+    if path is None or path == '-':
+        sys.stdout.write(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
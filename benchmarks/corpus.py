@@ -0,0 +1,215 @@
+import os
+import random
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Part of the corpus file names; bump it when the output of a generator changes,
+# so that corpora generated by an older version are not reused
+GENERATOR_VERSION = 2
+DEFAULT_SEED = 20240501
+
+# Journal of arXiv preprints; each paper gets an identifier of its own (see paper)
+ARXIV_VENUE = 'arXiv preprint'
+# Deep brace nesting: levels of braces around title words
+BRACE_DEPTH = 200
+# Huge abstracts: words per abstract (about 30 kB)
+ABSTRACT_WORDS = 4000
+# Many duplicates: share of the entries that repeat an earlier key or title
+DUPLICATE_SHARE = 0.5
+
+# Words are made of two or three of these syllables, so titles seldom share more than a few words
+ONSETS = ('b', 'c', 'd', 'f', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'z', 'br', 'cl', 'tr', 'st')
+VOWELS = ('a', 'e', 'i', 'o', 'u', 'ai', 'ea', 'io')
+CODAS = ('', 'n', 'r', 's', 't', 'l', 'x', 'm')
+SMALL_WORDS = ('of', 'for', 'and', 'the', 'with', 'in', 'on', 'via', 'to', 'a')
+FIRST_NAMES = ('Wei', 'Anna', 'John', 'Maria', 'Yuki', 'Omar', 'Li', 'Sara', 'Pierre', 'Chen', 'Ivan', 'Priya')
+VENUES = (
+    ('inproceedings', 'Advances in Neural Information Processing Systems'),
+    ('inproceedings', 'Proceedings of the IEEE Conference on Computer Vision and Pattern Recognition'),
+    ('inproceedings', 'International Conference on Machine Learning'),
+    ('inproceedings', 'International Conference on Learning Representations'),
+    ('inproceedings', 'Proceedings of the AAAI Conference on Artificial Intelligence'),
+    ('inproceedings', 'European Conference on Computer Vision'),
+    ('inproceedings', 'Annual Meeting of the Association for Computational Linguistics'),
+    ('inproceedings', 'ACM SIGKDD International Conference on Knowledge Discovery and Data Mining'),
+    ('article', 'IEEE Transactions on Pattern Analysis and Machine Intelligence'),
+    ('article', 'Journal of Machine Learning Research'),
+    ('article', 'Nature'),
+    ('article', ARXIV_VENUE),
+    ('article', 'Communications of the ACM'),
+    ('article', 'International Journal of Computer Vision'),
+)
+ORDINALS = ('1st', '2nd', '3rd', '21st', '35th', '40th')
+
+
+def word(rng: random.Random) -> str:
+    return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+                   for _ in range(rng.randint(2, 3)))
+
+
+def title(rng: random.Random) -> str:
+    """A title in title case, with the odd lowercase word for the capitalization check."""
+    words = []
+    for position in range(rng.randint(5, 12)):
+        if position and rng.random() < 0.2:
+            words.append(rng.choice(SMALL_WORDS))
+        else:
+            text = word(rng)
+            words.append(text if rng.random() < 0.03 else text.capitalize())
+    return ' '.join(words)
+
+
+def authors(rng: random.Random) -> str:
+    return ' and '.join(f"{word(rng).capitalize()}, {rng.choice(FIRST_NAMES)}" for _ in range(rng.randint(1, 6)))
+
+
+def venue(rng: random.Random) -> Tuple[str, str]:
+    """Entry type and venue; some conference names carry a year or an ordinal, as the checks expect to find."""
+    entry_type, name = rng.choice(VENUES)
+    if entry_type == 'inproceedings':
+        draw = rng.random()
+        if draw < 0.1:
+            name = f"{name} {rng.randint(2000, 2024)}"
+        elif draw < 0.15:
+            name = f"Proceedings of the {rng.choice(ORDINALS)} {name}"
+    return entry_type, name
+
+
+def pages(rng: random.Random) -> str:
+    first = rng.randint(1, 3000)
+    dash = '-' if rng.random() < 0.1 else '--'
+    return f"{first}{dash}{first + rng.randint(1, 30)}"
+
+
+def format_entry(entry_type: str, key: str, fields: Dict[str, str]) -> str:
+    body = ''.join(f"  {name} = {{{value}}},\n" for name, value in fields.items())
+    return f"@{entry_type}{{{key},\n{body}}}\n\n"
+
+
+def paper(rng: random.Random, index: int) -> Tuple[str, str, Dict[str, str]]:
+    """(entry type, citation key, fields) of a typical paper."""
+    entry_type, name = venue(rng)
+    fields = {'title': title(rng), 'author': authors(rng),
+              'journal' if entry_type == 'article' else 'booktitle': name,
+              'year': str(rng.randint(1990, 2024))}
+    if name == ARXIV_VENUE:
+        # Identifiers only repeat in the duplicates case
+        year = int(fields['year'])
+        fields['journal'] = f"arXiv preprint arXiv:{year % 100:02d}{rng.randint(1, 12):02d}.{rng.randrange(10 ** 5):05d}"
+    if rng.random() < 0.95:
+        fields['pages'] = pages(rng)
+    if entry_type == 'article' and rng.random() < 0.7:
+        fields['volume'] = str(rng.randint(1, 60))
+        fields['number'] = str(rng.randint(1, 12))
+    if rng.random() < 0.1:
+        fields['publisher'] = 'ACM'
+    if rng.random() < 0.05:
+        fields['doi'] = f"10.{rng.randint(1000, 9999)}/{index}"
+    return entry_type, f"{word(rng)}{fields['year']}{index}", fields
+
+
+def typical(rng: random.Random, size: int) -> Iterator[str]:
+    """Mostly conference and journal papers, a few books and other entries; some of each kind of issue."""
+    for index in range(size):
+        draw = rng.random()
+        if draw < 0.03:
+            yield format_entry('book', f"book{index}", {'title': title(rng), 'author': authors(rng),
+                                                        'publisher': 'Springer', 'year': str(rng.randint(1990, 2024))})
+        elif draw < 0.05:
+            yield format_entry('misc', f"misc{index}", {'title': title(rng), 'howpublished': f"\\url{{https://{word(rng)}.org}}"})
+        else:
+            yield format_entry(*paper(rng, index))
+
+
+def deep_braces(rng: random.Random, size: int) -> Iterator[str]:
+    """Typical papers whose title and venue are wrapped in BRACE_DEPTH levels of braces."""
+    for index in range(size):
+        entry_type, key, fields = paper(rng, index)
+        depth = rng.randint(BRACE_DEPTH // 2, BRACE_DEPTH)
+        fields['title'] = '{' * depth + fields['title'] + '}' * depth
+        pub = 'journal' if entry_type == 'article' else 'booktitle'
+        fields[pub] = '{{' + fields[pub] + '}}'
+        yield format_entry(entry_type, key, fields)
+
+
+def huge_abstracts(rng: random.Random, size: int) -> Iterator[str]:
+    """Typical papers with an abstract of ABSTRACT_WORDS words, a few of them braced."""
+    vocabulary = [word(rng) for _ in range(2000)] + ['{GPU}', '{$x^2$}', 'the', 'of', 'and']
+    for index in range(size):
+        entry_type, key, fields = paper(rng, index)
+        fields['abstract'] = ' '.join(rng.choices(vocabulary, k=ABSTRACT_WORDS))
+        yield format_entry(entry_type, key, fields)
+
+
+def duplicates(rng: random.Random, size: int) -> Iterator[str]:
+    """
+    Typical papers, DUPLICATE_SHARE of which repeat an earlier entry: its key,
+    its title, its title with one word changed (for the similarity index) or all of it.
+    """
+    earlier: List[tuple] = []
+    for index in range(size):
+        if earlier and rng.random() < DUPLICATE_SHARE:
+            entry_type, key, fields = rng.choice(earlier)
+            fields = dict(fields)
+            draw = rng.random()
+            if draw < 0.25:
+                fields['title'] = title(rng)
+            elif draw < 0.5:
+                key = f"{key}dup{index}"
+            elif draw < 0.75:
+                words = fields['title'].split(' ')
+                words[rng.randrange(len(words))] = word(rng).capitalize()
+                fields['title'] = ' '.join(words)
+                key = f"{key}dup{index}"
+        else:
+            entry_type, key, fields = paper(rng, index)
+            # Bounded, so that 1M entries do not keep 1M entries around
+            if len(earlier) < 10000:
+                earlier.append((entry_type, key, fields))
+            else:
+                earlier[rng.randrange(len(earlier))] = (entry_type, key, fields)
+        yield format_entry(entry_type, key, fields)
+
+
+def many_venues(rng: random.Random, size: int) -> Iterator[str]:
+    """Typical papers, each at a venue of its own name."""
+    for index in range(size):
+        entry_type, key, fields = paper(rng, index)
+        pub = 'journal' if entry_type == 'article' else 'booktitle'
+        prefix = 'Proceedings of the' if entry_type == 'inproceedings' and rng.random() < 0.5 else 'International'
+        fields[pub] = f"{prefix} {title(rng)} {rng.choice(('Conference', 'Symposium', 'Workshop', 'Journal'))}"
+        yield format_entry(entry_type, key, fields)
+
+
+# Corpus kinds, by name; each yields the text of `size` entries
+CASES: Dict[str, Callable[[random.Random, int], Iterator[str]]] = {
+    'typical': typical,
+    'deep_braces': deep_braces,
+    'huge_abstracts': huge_abstracts,
+    'duplicates': duplicates,
+    'many_venues': many_venues,
+}
+
+
+def generate(case: str, size: int, seed: int = DEFAULT_SEED) -> Iterator[str]:
+    """
+    The entries of a synthetic bibliography, as .bib text, one entry at a time.
+
+    The same (case, size, seed) always gives the same text, on any machine
+    and Python version, and a corpus is a prefix of any larger one with the
+    same case and seed.
+    """
+    rng = random.Random(f"{case}:{seed}")
+    return CASES[case](rng, size)
+
+
+def write_corpus(path: str, case: str, size: int, seed: int = DEFAULT_SEED) -> int:
+    """Write the corpus of generate() to `path`; returns its size in bytes."""
+    with open(path, 'w', encoding='utf-8', newline='\n') as file:
+        chunk = []
+        for text in generate(case, size, seed):
+            chunk.append(text)
+            if len(chunk) == 1000:
+                file.write(''.join(chunk))
+                chunk = []
+        file.write(''.join(chunk))
+    return os.path.getsize(path)
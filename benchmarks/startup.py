@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import datetime
+import platform
+import tempfile
+import statistics
+import subprocess
+import compileall
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from benchmarks.bench import RESULTS_VERSION, DEFAULT_CORPUS_DIR, corpus_path, git_revision
+from benchmarks.corpus import GENERATOR_VERSION, DEFAULT_SEED
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STARTUP_SIZE = 50
+DEFAULT_STARTUP_REPEAT = 20
+# Modules that checking into JSON Lines must not import: the HTML report, the other modes and the worker pools
+CHECK_EXCLUDED_MODULES = ('html_show', 'webbrowser', 'bib_watch', 'bib_batch', 'bib_fix', 'tex_scan',
+                          'concurrent.futures', 'tracemalloc', 'tempfile')
+
+
+def time_command(args: Sequence[str], repeat: int) -> Dict[str, float]:
+    """Best and median wall time of running `python args` in a new process from the top of the repository."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'median': statistics.median(times)}
+
+
+def import_times(args: Sequence[str]) -> List[Tuple[str, float, float]]:
+    """
+    Run `python -X importtime args` once.
+
+    Returns:
+        (module, own seconds, cumulative seconds) of every module it imported, in import order
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return modules
+
+
+def run_startup(size: int = DEFAULT_STARTUP_SIZE, seed: int = DEFAULT_SEED, repeat: int = DEFAULT_STARTUP_REPEAT,
+                corpus_dir: str = DEFAULT_CORPUS_DIR) -> Dict[str, object]:
+    """
+    Measure how long main.py takes to start and check a small file, each run in a new process.
+
+    The phases are 'python' (the interpreter alone), 'import' (importing
+    main.py), 'check' (checking a typical corpus of `size` entries into
+    JSON Lines, without the parse cache), 'check:cached' (the same, the
+    parse served from a warm cache) and 'report' (writing the HTML report
+    instead). The modules the check imports are listed with their import
+    times, and those of CHECK_EXCLUDED_MODULES among them are reported.
+
+    Returns:
+        Results in the layout of `python -m benchmarks run`, with one run of case 'startup'
+    """
+    # Start from compiled bytecode, as every run after the first one does
+    compileall.compile_dir(ROOT, maxlevels=0, quiet=1)
+    commit, dirty = git_revision()
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = corpus_path(corpus_dir, 'typical', size, seed)
+        check_args = ['main.py', '-i', path, '--format', 'jsonl', '-o', os.devnull]
+        cache_args = ['--cache-dir', os.path.join(output_dir, 'cache')]
+        # Fill the cache
+        subprocess.run([sys.executable, *check_args, *cache_args], cwd=ROOT, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        phases = {
+            'python': time_command(['-c', 'pass'], repeat),
+            'import': time_command(['-c', 'import main'], repeat),
+            'check': time_command(check_args + ['--no-cache'], repeat),
+            'check:cached': time_command(check_args + cache_args, repeat),
+            'report': time_command(['main.py', '-i', path, '--no-cache', '--no-open',
+                                    '-o', os.path.join(output_dir, 'report.html')], repeat),
+        }
+        modules = import_times(check_args + ['--no-cache'])
+        size_bytes = os.path.getsize(path)
+
+    imported = {name for name, _, _ in modules}
+    return {
+        'version': RESULTS_VERSION,
+        'generator_version': GENERATOR_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'runs': [{'case': 'startup', 'size': size, 'bytes': size_bytes, 'phases': phases,
+                  'modules': [{'name': name, 'seconds': own, 'cumulative': cumulative}
+                              for name, own, cumulative in modules],
+                  'excluded_imports': [name for name in CHECK_EXCLUDED_MODULES if name in imported]}],
+    }
+
+
+def print_startup(results: Dict[str, object], slowest: int = 10, file: Optional[TextIO] = None) -> None:
+    """The time of every phase, then the `slowest` imports of the check by cumulative time."""
+    run = results['runs'][0]
+    print(f"startup, {run['size']} entries:", file=file)
+    for name, measurement in run['phases'].items():
+        print(f"  {name:<32} {measurement['seconds'] * 1000:10.1f} ms  {measurement['median'] * 1000:10.1f} ms", file=file)
+    print("slowest imports of the check:", file=file)
+    for module in sorted(run['modules'], key=lambda module: -module['cumulative'])[:slowest]:
+        print(f"  {module['name']:<32} {module['cumulative'] * 1000:10.1f} ms  (own {module['seconds'] * 1000:.1f} ms)",
+              file=file)
+    if run['excluded_imports']:
+        print(f"The check imported {', '.join(run['excluded_imports'])}", file=file)
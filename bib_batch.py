@@ -0,0 +1,156 @@
+import os
+import glob
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from bib_read import BibEntry
+from bib_parser import BibParser
+from bib_cache import ParseCache, parse_with_cache
+from check_bib import CheckSettings, check
+from duplicate_index import collision_groups, duplicate_keys
+from issue import IssueLevel, IssueStats, IssueCrossFileEntryKey, IssueCrossFileTitle
+
+BIB_SUFFIX = '.bib'
+# Files per task sent to a worker; small files are cheap, so several go at once
+FILES_PER_TASK = 4
+
+
+class FileResult:
+    """Checked entries of one .bib file of a batch, or the error that stopped it from being read."""
+
+    __slots__ = ('path', 'entries', 'error', 'stats')
+
+    def __init__(self, path: str, entries: List[BibEntry], error: Optional[str] = None,
+                 stats: Optional[IssueStats] = None):
+        self.path = path
+        self.entries = entries
+        self.error = error
+        # Issue counts, gathered while checking
+        self.stats = stats if stats is not None else IssueStats.from_entries(entries)
+
+    def count_issues(self) -> Dict[IssueLevel, int]:
+        return dict(self.stats.levels)
+
+
+def expand_inputs(inputs: Sequence[str]) -> List[str]:
+    """
+    The .bib files named by `inputs`, each listed once, in order.
+
+    Args:
+        inputs: File paths, directories (searched recursively for .bib
+            files), glob patterns (`**` matches subdirectories) and '@list'
+            files naming one input per line
+
+    Returns:
+        Paths of the files found
+    """
+    paths: List[str] = []
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:], 'r', encoding='utf-8') as file:
+                listed = [line.strip() for line in file if line.strip() and not line.lstrip().startswith('#')]
+            paths += expand_inputs(listed)
+        elif os.path.isdir(item):
+            for root, directories, names in os.walk(item):
+                directories.sort()
+                paths += [os.path.join(root, name) for name in sorted(names) if name.endswith(BIB_SUFFIX)]
+        elif glob.has_magic(item):
+            paths += sorted(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        else:
+            paths.append(item)
+
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def check_file(path: str, cache_dir: Optional[str] = None) -> FileResult:
+    """Parse and check one file, as main.py does; worker of check_files."""
+    try:
+        if cache_dir is None:
+            entries = BibParser.parse_file(path)
+        else:
+            entries = parse_with_cache(path, ParseCache(cache_dir))
+    except (OSError, UnicodeDecodeError) as error:
+        return FileResult(path, [], error=str(error))
+    stats = IssueStats()
+    return FileResult(path, check(entries, stats=stats), stats=stats)
+
+
+def _check_files(paths: List[str], cache_dir: Optional[str]) -> List[FileResult]:
+    return [check_file(path, cache_dir) for path in paths]
+
+
+def check_files(paths: List[str], jobs: int = 1, cache_dir: Optional[str] = None) -> List[FileResult]:
+    """
+    Check every file on its own, in `jobs` worker processes, then across files.
+
+    Results are in the order of `paths` whatever the number of workers.
+    After the per-file checks, the citation keys and canonical titles of all
+    files go through one collision pass, and entries that share one with an
+    entry of another file get an IssueCrossFileEntryKey or
+    IssueCrossFileTitle naming the other files.
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        results = _check_files(paths, cache_dir)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        tasks = [paths[start:start + FILES_PER_TASK] for start in range(0, len(paths), FILES_PER_TASK)]
+        # Workers check with the settings of this process (--title-similarity, --venues, ...)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=CheckSettings.current().apply) as executor:
+            results = [result for chunk in executor.map(_check_files, tasks, [cache_dir] * len(tasks))
+                       for result in chunk]
+
+    check_across_files(results)
+    return results
+
+
+def check_across_files(results: List[FileResult]) -> None:
+    """Add the cross-file duplicate key and title issues to the entries of `results`."""
+    located: List[Tuple[int, BibEntry]] = []
+    summaries = []
+    for file_index, result in enumerate(results):
+        for entry in result.entries:
+            located.append((file_index, entry))
+            summaries.append(duplicate_keys(entry))
+
+    key_groups, title_groups = collision_groups(summaries)[:2]
+    for groups, make_issue in ((key_groups, _cross_file_key_issue), (title_groups, _cross_file_title_issue)):
+        for value, group in groups.items():
+            files = sorted({located[idx][0] for idx in group})
+            if len(files) < 2:
+                # Only within one file: reported by that file's own check
+                continue
+            for file_index in files:
+                other_files = [results[other].path for other in files if other != file_index]
+                issue = make_issue(value, other_files)
+                for idx in group:
+                    if located[idx][0] == file_index:
+                        located[idx][1].add_issues(issue)
+                        results[file_index].stats.add((issue,))
+
+
+def _cross_file_key_issue(cit_key: str, other_files: List[str]) -> IssueCrossFileEntryKey:
+    return IssueCrossFileEntryKey(entry=None, issue_level=IssueLevel.NOTICE, cit_key=cit_key, other_files=other_files)
+
+
+def _cross_file_title_issue(title: str, other_files: List[str]) -> IssueCrossFileTitle:
+    return IssueCrossFileTitle(entry=None, issue_level=IssueLevel.NOTICE, title=title, other_files=other_files)
+
+
+def print_summaries(results: List[FileResult], file: Optional[TextIO] = None) -> None:
+    """One line per file (to `file`, standard output by default): entries and issues by level, or why it could not be read."""
+    width = max((len(result.path) for result in results), default=0)
+    for result in results:
+        if result.error is not None:
+            print(f"{result.path:<{width}}  error: {result.error}", file=file)
+            continue
+        counts = result.count_issues()
+        print(f"{result.path:<{width}}  {len(result.entries):6d} entries  "
+              f"{counts[IssueLevel.ERROR]:5d} errors  {counts[IssueLevel.WARNING]:5d} warnings  "
+              f"{counts[IssueLevel.NOTICE]:5d} notices", file=file)
@@ -0,0 +1,144 @@
+import os
+import sys
+import marshal
+import hashlib
+from array import array
+from typing import Optional
+
+from bib_parser import BibParser, ParseResult, LineIndex, ENTRY_CLASSES, PARSER_VERSION
+from profiler import Profile, phase
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bib_checker")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_SUFFIX = ".bibcache"
+
+
+class ParseCache:
+    """
+    On-disk cache of parse results, keyed by file content.
+
+    Each parse is stored in one marshal file named after a BLAKE2 hash of the
+    raw file bytes, the parser version and the Python version, so any edit
+    to the file (or a parser upgrade) simply misses. Files are touched on
+    every hit, and the least recently used ones are evicted once the cache
+    grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        hasher = hashlib.blake2b(data, digest_size=20)
+        hasher.update(f"|parser={PARSER_VERSION}|python={sys.version_info[0]}.{sys.version_info[1]}".encode())
+        return hasher.hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + CACHE_SUFFIX)
+
+    def load(self, digest: str) -> Optional[ParseResult]:
+        """Return the cached parse for `digest`, or None on a miss or unreadable file."""
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as file:
+                payload = marshal.loads(file.read())
+            os.utime(path)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        # A truncated file, or one written by something else, is a miss like a missing one
+        try:
+            entry_rows, strings, preambles, line_starts = payload
+            entries = []
+            for entry_type, citation_key, line_number, offset, names, values in entry_rows:
+                fields = dict(zip(map(sys.intern, names), values))
+                entries.append(ENTRY_CLASSES[entry_type](citation_key, fields, line_number, offset=offset))
+            line_index = LineIndex.from_line_starts(array('q', line_starts))
+        except (EOFError, ValueError, TypeError, KeyError):
+            return None
+        return ParseResult(entries, strings=strings, preambles=preambles, line_index=line_index)
+
+    def store(self, digest: str, result: ParseResult) -> None:
+        """
+        Write `result` under `digest` atomically, then evict old entries.
+
+        A cache directory that cannot be created or written only means the
+        result is not cached: the check goes on without it.
+        """
+        entry_rows = [
+            (entry.entry_type, entry.citation_key, entry.line_number, entry.offset,
+             tuple(entry.fields), tuple(entry.fields.values()))
+            for entry in result
+        ]
+        payload = (entry_rows, dict(result.strings), list(result.preambles), result.line_index.line_starts.tobytes())
+
+        # Only a cache miss writes, so only a miss pays for importing tempfile
+        import tempfile
+
+        temp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(marshal.dumps(payload))
+            os.replace(temp_path, self._path(digest))
+            self.evict()
+        except OSError:
+            if temp_path is not None and os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def evict(self) -> None:
+        """Remove least recently used cache files until the total fits in max_bytes."""
+        files = []
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if item.name.endswith(CACHE_SUFFIX):
+                    stat = item.stat()
+                    files.append((stat.st_mtime_ns, stat.st_size, item.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def parse_with_cache(file_path: str, cache: ParseCache, jobs: int = 1, profile: Optional[Profile] = None) -> ParseResult:
+    """
+    Parse `file_path`, reusing a cached result when its contents are unchanged.
+
+    Args:
+        file_path: Path to the BibTeX file
+        cache: Cache to read from and to fill on a miss
+        jobs: Number of worker processes for a full parse
+        profile: Where to record the 'read', 'cache' and 'parse' phases
+
+    Returns:
+        ParseResult; `source` is not set for results served from the cache
+    """
+    with phase(profile, 'read'), open(file_path, 'rb') as file:
+        data = file.read()
+
+    with phase(profile, 'cache'):
+        digest = cache.digest(data)
+        result = cache.load(digest)
+    if result is not None:
+        return result
+
+    if jobs > 1:
+        del data
+        result = BibParser.parse_file(file_path, jobs=jobs, profile=profile)
+    else:
+        with phase(profile, 'parse'):
+            result = BibParser.parse_bytes(data)
+    with phase(profile, 'cache'):
+        cache.store(digest, result)
+    return result
@@ -0,0 +1,173 @@
+import os
+import re
+import mmap
+import tempfile
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from bib_read import BibEntry, Article, InProceedings
+from bib_parser import BibTokenizer, LazyFields, ENTRY_CLASSES
+from check_bib import YEAR_PATTERN, ORDINAL_PATTERN
+from issue import IssueRedundantKeys, IssueTitleContainsYear, IssueTitleContainsOrdinal
+
+FIXED_SUFFIX = '.fixed.bib'
+
+# A page range with any dash (or several), possibly spaced: 1-10, 1 – 10, 1---10
+PAGE_RANGE_FIX_PATTERN = re.compile(r'(\s*)(\d+)\s*(?:-+|[–—−])\s*(\d+)(\s*)')
+# Left over once years and ordinals are taken out of a venue name
+EMPTY_PARENTHESES_PATTERN = re.compile(r'\(\s*\)')
+REPEATED_SPACES_PATTERN = re.compile(r'[ \t]{2,}')
+SPACE_BEFORE_PUNCTUATION_PATTERN = re.compile(r'[ \t]+(?=[,.;:)])')
+REPEATED_COMMAS_PATTERN = re.compile(r',(?:\s*,)+')
+EDGE_PUNCTUATION = ' \t,;:-'
+
+# Rewrites the raw source text of a field value
+ValueFix = Callable[[str], str]
+
+
+def fix_pages(text: str) -> str:
+    """A page range with a single hyphen or another dash, as 'begin--end'."""
+    match = PAGE_RANGE_FIX_PATTERN.fullmatch(text)
+    if match is None:
+        return text
+    return f"{match.group(1)}{match.group(2)}--{match.group(3)}{match.group(4)}"
+
+
+def remove_years_and_ordinals(text: str) -> str:
+    """The venue name without the years and ordinals check_bib reports, and the punctuation they leave."""
+    text = ORDINAL_PATTERN.sub('', YEAR_PATTERN.sub('', text))
+    text = EMPTY_PARENTHESES_PATTERN.sub('', text)
+    text = REPEATED_COMMAS_PATTERN.sub(',', text)
+    text = SPACE_BEFORE_PUNCTUATION_PATTERN.sub('', text)
+    text = REPEATED_SPACES_PATTERN.sub(' ', text)
+    return text.strip(EDGE_PUNCTUATION)
+
+
+def plan_fixes(entry: BibEntry) -> Dict[str, Optional[ValueFix]]:
+    """
+    The safe corrections of a checked entry.
+
+    Returns:
+        Field name -> function rewriting its value, or None to drop the field
+    """
+    if not isinstance(entry, (Article, InProceedings)):
+        return {}
+    fixes: Dict[str, Optional[ValueFix]] = {}
+    pages = entry.fields.get('pages')
+    if pages is not None and fix_pages(pages) != pages:
+        fixes['pages'] = fix_pages
+    for issue in entry.issues:
+        if isinstance(issue, IssueRedundantKeys):
+            for key in issue.redundant_keys:
+                fixes[key] = None
+        elif isinstance(issue, (IssueTitleContainsYear, IssueTitleContainsOrdinal)) and issue.pub_type == 'booktitle':
+            fixes['booktitle'] = remove_years_and_ordinals
+    return fixes
+
+
+def separator_start(buffer, pos: int, field_start: int) -> int:
+    """Where the comma and whitespace before the field at `field_start` begin, not before `pos`."""
+    start = field_start
+    while start > pos and buffer[start - 1:start].isspace():
+        start -= 1
+    if start > pos and buffer[start - 1:start] == b',':
+        start -= 1
+    return start
+
+
+def find_edits(buffer, parsed: Sequence[BibEntry]) -> Tuple[List[Tuple[int, int, bytes]], int]:
+    """
+    The byte spans of `buffer` to replace to fix the entries parsed from it.
+
+    Args:
+        buffer: Raw contents of the .bib file
+        parsed: Every entry parsed from it, checked, in file order
+
+    Returns:
+        ((start, end, replacement) in order, number of entries changed)
+    """
+    tokenizer = BibTokenizer(buffer, lazy=True)
+    checked = iter(parsed)
+    edits = []
+    num_entries = 0
+    for _, entry_type, citation_key, fields in tokenizer.tokenize():
+        if entry_type not in ENTRY_CLASSES:
+            continue
+        entry = next(checked, None)
+        if entry is None or citation_key != entry.citation_key:
+            raise ValueError("the file changed since it was checked")
+        fixes = plan_fixes(entry)
+        if not fixes or not isinstance(fields, LazyFields):
+            continue
+
+        num_edits = len(edits)
+        spans = tokenizer.field_spans(*fields.span)
+        # Fields from `trailing` on are all dropped
+        trailing = len(spans)
+        while trailing and spans[trailing - 1][0] in fixes and fixes[spans[trailing - 1][0]] is None:
+            trailing -= 1
+        for i, (name, field_start, field_end, value_span) in enumerate(spans):
+            if name not in fixes:
+                continue
+            fix = fixes[name]
+            if fix is None and i >= trailing and i > 0:
+                # No field follows: the comma and whitespace before it go too, not to leave 'pages={3--4},}'
+                start = separator_start(buffer, edits[-1][1] if i > trailing else spans[i - 1][1], field_start)
+                edits.append((start, field_end, b''))
+            elif fix is None:
+                edits.append((field_start, field_end, b''))
+            elif value_span is not None:
+                # Values made of several parts or @string macros are left alone
+                text = buffer[value_span[0]:value_span[1]].decode('utf-8')
+                fixed = fix(text)
+                if fixed != text:
+                    edits.append((value_span[0], value_span[1], fixed.encode('utf-8')))
+        num_entries += len(edits) > num_edits
+    if next(checked, None) is not None:
+        raise ValueError("the file changed since it was checked")
+    return edits, num_entries
+
+
+def write_fixed(input_path: str, parsed: Sequence[BibEntry], output_path: str) -> Tuple[int, int]:
+    """
+    Write `input_path` with the safe corrections of its checked entries to `output_path`.
+
+    Everything outside the corrected values and dropped fields, comments and
+    formatting included, is copied byte for byte from the memory-mapped
+    input, so the cost is about that of copying the file.
+
+    Returns:
+        (number of edits, number of entries changed)
+    """
+    output_directory = os.path.dirname(os.path.abspath(output_path))
+    with open(input_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            buffer = b''
+        else:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        edits, num_entries = find_edits(buffer, parsed)
+        descriptor, temp_path = tempfile.mkstemp(dir=output_directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as output, memoryview(buffer) as view:
+                pos = 0
+                for start, end, replacement in edits:
+                    output.write(view[pos:start])
+                    output.write(replacement)
+                    pos = end
+                output.write(view[pos:])
+            os.chmod(temp_path, os.stat(input_path).st_mode & 0o777)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+    return len(edits), num_entries
+
+
+def fixed_path(input_path: str) -> str:
+    """Default output of --fix: refs.bib -> refs.fixed.bib, next to the input."""
+    root, _ = os.path.splitext(input_path)
+    return root + FIXED_SUFFIX
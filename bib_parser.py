@@ -0,0 +1,948 @@
+import os
+import re
+import sys
+import mmap
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from bib_read import Article, InProceedings, Book
+from profiler import Profile, phase
+
+# Entry header right after an '@': the entry type and its opening delimiter.
+ENTRY_HEAD_PATTERN = re.compile(r'\s*(?P<entry_type>[A-Za-z][\w-]*)\s*(?P<delim>[{(])')
+# Field name (BibTeX identifier) followed by '='.
+FIELD_KEY_PATTERN = re.compile(r'\s*(?P<key>[^\s"#%\'(),={}]+)\s*=\s*')
+# Bare (unbraced) value parts: numbers and @string macro names.
+BARE_VALUE_PATTERN = re.compile(r'[^\s"#%\'(),={}]+')
+# Fast path for the common field shape: a single value with at most one level
+# of inner braces. Every alternative starts with a distinct character, so a
+# failed match gives up in time linear in what it consumed.
+SIMPLE_FIELD_PATTERN = re.compile(
+    r'\s*([^\s"#%\'(),={}]+)\s*=\s*'
+    r'(?:\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}|"([^"{}]*)"|([^\s"#%\'(),={}]+))'
+    r'\s*(?:,|(?=[})])|\Z)'
+)
+SIMPLE_KEY_PATTERN = re.compile(r'([^,{}()]*),')
+WHITESPACE_PATTERN = re.compile(r'\s*')
+BRACE_PATTERN = re.compile(r'[{}]')
+PAREN_PATTERN = re.compile(r'[{})]')
+QUOTE_PATTERN = re.compile(r'[{}"]')
+NEWLINE_PATTERN = re.compile(r'\n')
+NEWLINE_BYTES_PATTERN = re.compile(rb'\r\n?|\n')
+STRING_HEAD_BYTES_PATTERN = re.compile(rb'@\s*string\s*([{(])', re.IGNORECASE)
+# UTF-8 continuation bytes, which do not start a character
+CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+# Chunks smaller than this are not worth a worker process
+MIN_CHUNK_SIZE = 1 << 20
+
+# Bump whenever parsing results change, so cached parses are not reused.
+PARSER_VERSION = 1
+
+ENTRY_CLASSES = {
+    'article': Article,
+    'inproceedings': InProceedings,
+    'book': Book,
+}
+
+# A field value that has not been decoded yet: (start, end) offsets of its text.
+Span = Tuple[int, int]
+# Where a field is in the source: (name, start, end, value span); the field runs from the
+# whitespace after the previous comma through its own comma (or its value, for a last field
+# without one), and the value span is None unless the value is a single braced, quoted or
+# numeric part
+FieldSpan = Tuple[str, int, int, Optional[Span]]
+
+
+class Syntax:
+    """The tokenizer's patterns and delimiters, for str or for bytes sources."""
+
+    def __init__(self, literal):
+        def compile_pattern(pattern: re.Pattern) -> re.Pattern:
+            return re.compile(literal(pattern.pattern))
+
+        self.entry_head = compile_pattern(ENTRY_HEAD_PATTERN)
+        self.field_key = compile_pattern(FIELD_KEY_PATTERN)
+        self.bare_value = compile_pattern(BARE_VALUE_PATTERN)
+        self.simple_field = compile_pattern(SIMPLE_FIELD_PATTERN)
+        self.simple_key = compile_pattern(SIMPLE_KEY_PATTERN)
+        self.whitespace = compile_pattern(WHITESPACE_PATTERN)
+        self.brace = compile_pattern(BRACE_PATTERN)
+        self.paren = compile_pattern(PAREN_PATTERN)
+        self.quote = compile_pattern(QUOTE_PATTERN)
+
+        self.at = literal('@')
+        self.line_at = literal('\n@')
+        self.comma = literal(',')
+        self.hash = literal('#')
+        self.open_brace = literal('{')
+        self.close_brace = literal('}')
+        self.close_paren = literal(')')
+        self.double_quote = literal('"')
+
+
+STR_SYNTAX = Syntax(lambda text: text)
+_BYTES_SYNTAX: Optional[Syntax] = None
+
+
+def bytes_syntax() -> Syntax:
+    """The Syntax of bytes sources, compiled the first time a file is parsed lazily."""
+    global _BYTES_SYNTAX
+    if _BYTES_SYNTAX is None:
+        _BYTES_SYNTAX = Syntax(lambda text: text.encode())
+    return _BYTES_SYNTAX
+
+
+class LineIndex:
+    """
+    Map source offsets to 1-based line and column numbers.
+
+    The start offset of every line is stored once in a compact array, so any
+    offset is resolved with a binary search in O(log lines). For byte sources
+    (lazy parsing) offsets and columns are in bytes.
+    """
+
+    def __init__(self, content: Union[str, bytes, mmap.mmap]):
+        # The line starts are only collected on first use
+        self._content = content
+        self._line_starts: Optional[array] = None
+
+    @classmethod
+    def from_line_starts(cls, line_starts: array) -> 'LineIndex':
+        """Build an index from already known line start offsets."""
+        line_index = cls.__new__(cls)
+        line_index._content = None
+        line_index._line_starts = line_starts
+        return line_index
+
+    @property
+    def line_starts(self) -> array:
+        if self._line_starts is None:
+            pattern = NEWLINE_PATTERN if isinstance(self._content, str) else NEWLINE_BYTES_PATTERN
+            self._line_starts = array('q', [0])
+            self._line_starts.extend(map(re.Match.end, pattern.finditer(self._content)))
+            self._content = None
+        return self._line_starts
+
+    def __len__(self) -> int:
+        return len(self.line_starts)
+
+    def line_of(self, offset: int) -> int:
+        """Return the line number (1-based) containing `offset`."""
+        return bisect_right(self.line_starts, offset)
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """Return (line, column), both 1-based, for `offset`."""
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def offset_of(self, line: int, column: int = 1) -> int:
+        """Return the offset of a 1-based (line, column) position."""
+        return self.line_starts[line - 1] + column - 1
+
+
+class ParseResult(list):
+    """List of parsed entries plus the file-level data collected while parsing."""
+
+    def __init__(self, entries=(), strings: Optional[Dict[str, str]] = None, preambles: Optional[List[str]] = None,
+                 line_index: Optional[LineIndex] = None, source: Union[str, bytes, mmap.mmap, None] = None):
+        super().__init__(entries)
+        self.strings: Dict[str, str] = strings if strings is not None else {}
+        self.preambles: List[str] = preambles if preambles is not None else []
+        self.line_index: Optional[LineIndex] = line_index
+        # The parsed text, or the memory map that lazy entries decode their fields from
+        self.source = source
+
+
+class LazyFields(Mapping):
+    """
+    Read-only field mapping of a lazily parsed entry.
+
+    Only the offsets of the entry body are kept until a field is first
+    needed. The body is then scanned once: field names go into a layout
+    shared by every entry with the same fields, value spans into a flat
+    array, and each value is decoded and unbraced the first time it is
+    looked up.
+    """
+
+    __slots__ = ('_tokenizer', '_start', '_end', '_layout', '_spans', '_values')
+
+    def __init__(self, tokenizer: 'BibTokenizer', start: int, end: int):
+        self._tokenizer = tokenizer
+        self._start = start
+        self._end = end
+        self._layout: Optional[Dict[str, int]] = None
+        self._spans: Optional[array] = None
+        self._values: Optional[List[Optional[str]]] = None
+
+    def _load(self) -> Dict[str, int]:
+        if self._layout is None:
+            fields = self._tokenizer._parse_fields(self._start, self._end)
+            self._layout = self._tokenizer._field_layout(tuple(fields))
+            self._spans = array('q')
+            self._values = [None] * len(fields)
+            for slot, value in enumerate(fields.values()):
+                if type(value) is tuple:
+                    self._spans.extend(value)
+                else:
+                    # Values assembled from @string macros are already text
+                    self._spans.extend((-1, -1))
+                    self._values[slot] = value
+        return self._layout
+
+    def __getitem__(self, key: str) -> str:
+        slot = self._load()[key]
+        value = self._values[slot]
+        if value is None:
+            value = self._values[slot] = self._tokenizer._value(self._spans[2 * slot], self._spans[2 * slot + 1])
+        return value
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        if key in self._load():
+            return self[key]
+        return default
+
+    def __contains__(self, key) -> bool:
+        return key in self._load()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    @property
+    def span(self) -> Span:
+        """Offsets of the entry's fields in the source, after the citation key's comma."""
+        return self._start, self._end
+
+
+class BibTokenizer:
+    """
+    Single-pass, brace-aware BibTeX tokenizer.
+
+    The source is scanned left to right: top-level '@' markers are located with
+    str.find, and an entry whose fields all have a simple shape is read in one
+    go with an anchored, backtracking-free pattern. Any other entry body is
+    first delimited by counting braces (and parentheses for '(' entries) and
+    then read field by field. No character is visited more than a constant
+    number of times, so the cost is O(n) in the size of the input. Braces may
+    nest to any depth, an '@' inside a field value does not start a new entry,
+    and @string, @preamble and @comment blocks are understood.
+
+    The source may also be UTF-8 bytes or a memory map. With `lazy` set, only
+    entry boundaries are found up front and every entry gets a LazyFields
+    mapping over its body instead of a dict of decoded values.
+
+    Throughput target: at least 10 MB/s of .bib source on one core with
+    CPython 3.11 (about 15 MB/s on a synthetic 20 MB, 60k-entry export).
+    """
+
+    def __init__(self, content: Union[str, bytes, mmap.mmap], lazy: bool = False, strings: Optional[Dict[str, str]] = None):
+        self.content = content
+        self.is_text = isinstance(content, str)
+        self.syntax = STR_SYNTAX if self.is_text else bytes_syntax()
+        self.lazy = lazy
+        # @string macros, optionally seeded with those defined before `content`
+        self.strings: Dict[str, str] = dict(strings) if strings else {}
+        self.preambles: List[str] = []
+        # Matching '}' of every '{' after the first unclosed entry (see _match_braces)
+        self._brace_matches: Optional[Dict[int, int]] = None
+        # Field name -> slot maps shared between lazy entries (see LazyFields)
+        self._layouts: Dict[Tuple[str, ...], Dict[str, int]] = {}
+        # Field name as written -> interned lowercase name
+        self._names: Dict[Union[str, bytes], str] = {}
+
+    def tokenize(self):
+        """
+        Yield (start, entry_type, citation_key, fields) for every regular entry.
+
+        `start` is the offset of the entry's '@'. @string definitions are
+        stored in self.strings and expanded in later field values, @preamble
+        contents are stored in self.preambles, and @comment blocks are skipped.
+        """
+        content = self.content
+        syntax = self.syntax
+        end = len(content)
+        pos = content.find(syntax.at)
+        while pos != -1:
+            head = syntax.entry_head.match(content, pos + 1)
+            if head is None:
+                # A stray '@' in the free text between entries
+                pos = content.find(syntax.at, pos + 1)
+                continue
+
+            entry_type = self._text(*head.span('entry_type')).lower()
+            delim = head.group('delim')
+            body_start = head.end()
+            if not self.lazy and entry_type not in ('comment', 'preamble', 'string'):
+                closer = syntax.close_brace if delim == syntax.open_brace else syntax.close_paren
+                simple = self._parse_simple_entry(body_start, closer)
+                if simple is not None:
+                    citation_key, fields, body_end = simple
+                    yield pos, entry_type, citation_key, fields
+                    pos = content.find(syntax.at, body_end + 1)
+                    continue
+
+            body_end = self._find_entry_end(body_start, delim)
+            if body_end == -1:
+                # Unbalanced entry: recover at the next line starting with '@'
+                recover = content.find(syntax.line_at, body_start)
+                body_end = recover if recover != -1 else end
+                next_pos = body_end
+            else:
+                next_pos = body_end + 1
+
+            if entry_type == 'comment':
+                pass
+            elif entry_type == 'preamble':
+                self.preambles.append(self._resolve(self._parse_value(body_start, body_end)[0]))
+            elif entry_type == 'string':
+                fields = self._parse_fields(body_start, body_end)
+                self.strings.update((key, self._resolve(value)) for key, value in fields.items())
+            else:
+                comma = content.find(syntax.comma, body_start, body_end)
+                key_end = comma if comma != -1 else body_end
+                citation_key = self._text(body_start, key_end).strip()
+                if comma == -1:
+                    fields = {}
+                elif self.lazy:
+                    fields = LazyFields(self, key_end + 1, body_end)
+                else:
+                    fields = self._parse_fields(key_end + 1, body_end)
+                yield pos, entry_type, citation_key, fields
+
+            pos = content.find(syntax.at, next_pos)
+
+    def _text(self, start: int, end: int) -> str:
+        """Return the source text between two offsets."""
+        if self.is_text:
+            return self.content[start:end]
+        return self.content[start:end].decode('utf-8')
+
+    def _field_name(self, key: Union[str, bytes]) -> str:
+        """Return the interned, lowercase field name for a key as written."""
+        name = self._names.get(key)
+        if name is None:
+            text = key if self.is_text else key.decode('utf-8')
+            name = self._names[key] = sys.intern(text.lower())
+        return name
+
+    def _value(self, start: int, end: int) -> str:
+        """Return a field value from its span, with line breaks removed."""
+        if self.is_text:
+            return self.content[start:end].replace('\n', '')
+        return self.content[start:end].decode('utf-8').replace('\r', '').replace('\n', '')
+
+    def _field_layout(self, keys: Tuple[str, ...]) -> Dict[str, int]:
+        layout = self._layouts.get(keys)
+        if layout is None:
+            layout = self._layouts[keys] = {key: slot for slot, key in enumerate(keys)}
+        return layout
+
+    def _resolve(self, value: Union[str, Span, None]) -> Optional[str]:
+        return self._value(*value) if type(value) is tuple else value
+
+    def _parse_simple_entry(self, pos: int, closer) -> Optional[Tuple[str, Dict[str, str], int]]:
+        """
+        Read a whole entry body in one go when every field is simple.
+
+        Returns (citation_key, fields, body_end), or None as soon as anything
+        unusual shows up; the caller then delimits the body first and parses
+        it with the general field parser.
+        """
+        content = self.content
+        head = self.syntax.simple_key.match(content, pos)
+        if head is None:
+            return None
+
+        fields = {}
+        pos = self._read_simple_fields(head.end(), len(content), fields)
+        pos = self.syntax.whitespace.match(content, pos).end()
+        if content[pos:pos + 1] != closer:
+            return None
+        return self._text(*head.span(1)).strip(), fields, pos
+
+    def _read_simple_fields(self, pos: int, end: int, fields: Dict[str, Union[str, Span]]) -> int:
+        """Store consecutive simple fields from `pos` in `fields`; return where they stop."""
+        content = self.content
+        strings = self.strings
+        match = self.syntax.simple_field.match
+        names = self._names
+        simple = match(content, pos, end)
+        if self.is_text and not self.lazy:
+            while simple is not None:
+                key, braced, quoted, bare = simple.groups()
+                if braced is not None:
+                    value = braced
+                elif quoted is not None:
+                    value = quoted
+                else:
+                    value = strings.get(bare.lower(), bare)
+                name = names.get(key)
+                if name is None:
+                    name = names[key] = sys.intern(key.lower())
+                fields[name] = value.replace('\n', '')
+                pos = simple.end()
+                simple = match(content, pos, end)
+            return pos
+
+        # Byte or lazy sources: work with spans and decode values only when needed
+        while simple is not None:
+            key = self._field_name(simple.group(1))
+            if simple.start(2) != -1:
+                value = simple.span(2)
+            elif simple.start(3) != -1:
+                value = simple.span(3)
+            else:
+                bare = self._text(*simple.span(4)).lower()
+                value = strings[bare] if bare in strings else simple.span(4)
+            fields[key] = value if self.lazy else self._resolve(value)
+            pos = simple.end()
+            simple = match(content, pos, end)
+        return pos
+
+    def _find_entry_end(self, pos: int, delim) -> int:
+        """Return the offset of the delimiter closing the entry body at `pos`, or -1."""
+        content = self.content
+        syntax = self.syntax
+        if self._brace_matches is None:
+            if delim == syntax.open_brace:
+                body_end = self._find_closing(pos, len(content), syntax.brace, syntax.close_brace)
+            else:
+                body_end = self._find_closing(pos, len(content), syntax.paren, syntax.close_paren)
+            if body_end == -1:
+                self._brace_matches = self._match_braces(pos)
+            return body_end
+
+        # The file is known to be unbalanced from an earlier entry on
+        if delim == syntax.open_brace:
+            return self._brace_matches.get(pos - 1, -1)
+        bound = content.find(syntax.line_at, pos)
+        return self._find_closing(pos, bound if bound != -1 else len(content), syntax.paren, syntax.close_paren)
+
+    def _find_closing(self, pos: int, end: int, pattern: re.Pattern, closer) -> int:
+        """Return the offset of `closer` at brace depth 0 after `pos`, or -1."""
+        open_brace, close_brace = self.syntax.open_brace, self.syntax.close_brace
+        depth = 0
+        for match in pattern.finditer(self.content, pos, end):
+            char = match.group()
+            if char == open_brace:
+                depth += 1
+            elif char == close_brace:
+                if depth == 0:
+                    return match.start() if closer == close_brace else -1
+                depth -= 1
+            elif depth == 0:
+                return match.start()
+        return -1
+
+    def _match_braces(self, pos: int) -> Dict[int, int]:
+        """
+        Map every '{' after `pos` to the offset of its matching '}'.
+
+        Only needed once an entry cannot be closed: the entries recovered
+        after it are then delimited by lookup (or, for '(' entries, by the
+        next line starting with '@') instead of rescanning to the end of the
+        file each time, which keeps malformed input linear as well.
+        """
+        open_brace = self.syntax.open_brace
+        matches = {}
+        stack = []
+        for match in self.syntax.brace.finditer(self.content, pos):
+            if match.group() == open_brace:
+                stack.append(match.start())
+            elif stack:
+                matches[stack.pop()] = match.start()
+        return matches
+
+    def _parse_fields(self, pos: int, end: int) -> Dict[str, Union[str, Span]]:
+        content = self.content
+        syntax = self.syntax
+        fields = {}
+        while pos < end:
+            pos = self._read_simple_fields(pos, end, fields)
+            if pos >= end:
+                break
+
+            key_match = syntax.field_key.match(content, pos, end)
+            if key_match is None:
+                # Skip a malformed field (or trailing whitespace) up to the next comma
+                comma = content.find(syntax.comma, pos, end)
+                if comma == -1:
+                    break
+                pos = comma + 1
+                continue
+
+            value, pos = self._parse_value(key_match.end(), end)
+            if value is not None:
+                fields[self._field_name(key_match.group('key'))] = value
+
+            pos = syntax.whitespace.match(content, pos, end).end()
+            if pos < end and content[pos:pos + 1] == syntax.comma:
+                pos += 1
+            elif pos < end:
+                comma = content.find(syntax.comma, pos, end)
+                pos = comma + 1 if comma != -1 else end
+        return fields
+
+    def field_spans(self, pos: int, end: int) -> List[FieldSpan]:
+        """
+        Locate every field between `pos` and `end` (see LazyFields.span), for rewriting them in place.
+
+        Only for lazy tokenizers, whose single-part values are parsed as spans.
+        """
+        content = self.content
+        syntax = self.syntax
+        fields = []
+        while pos < end:
+            simple = syntax.simple_field.match(content, pos, end)
+            if simple is not None:
+                field_end = simple.end()
+                if content[field_end - 1:field_end] != syntax.comma:
+                    field_end = simple.start(1) + len(content[simple.start(1):field_end].rstrip())
+                group = 2 if simple.start(2) != -1 else 3 if simple.start(3) != -1 else 4
+                value = simple.span(group)
+                if group == 4 and not content[value[0]:value[0] + 1].isdigit():
+                    # An @string macro name
+                    value = None
+                fields.append((self._field_name(simple.group(1)), simple.start(), field_end, value))
+                pos = simple.end()
+                continue
+
+            key_match = syntax.field_key.match(content, pos, end)
+            if key_match is None:
+                comma = content.find(syntax.comma, pos, end)
+                if comma == -1:
+                    break
+                pos = comma + 1
+                continue
+
+            value, pos = self._parse_value(key_match.end(), end)
+            pos = syntax.whitespace.match(content, pos, end).end()
+            if pos < end and content[pos:pos + 1] == syntax.comma:
+                pos += 1
+                field_end = pos
+            else:
+                # The last field: it ends with its value, before the whitespace up to the closing delimiter
+                field_end = key_match.end() + len(content[key_match.end():pos].rstrip())
+            if type(value) is tuple and content[value[0] - 1:value[0]] not in (syntax.open_brace, syntax.double_quote) \
+                    and not content[value[0]:value[0] + 1].isdigit():
+                value = None
+            fields.append((self._field_name(key_match.group('key')), key_match.start(), field_end,
+                           value if type(value) is tuple else None))
+        return fields
+
+    def _parse_value(self, pos: int, end: int) -> Tuple[Union[str, Span, None], int]:
+        """
+        Parse a '#'-concatenated value starting at `pos` and return (value, next_pos).
+
+        In lazy mode a value made of a single braced, quoted or bare part is
+        returned as its span, to be decoded on first access.
+        """
+        content = self.content
+        syntax = self.syntax
+        parts = []
+        while True:
+            pos = syntax.whitespace.match(content, pos, end).end()
+            if pos >= end:
+                break
+            char = content[pos:pos + 1]
+            if char == syntax.open_brace:
+                close = self._find_closing(pos + 1, end, syntax.brace, syntax.close_brace)
+                if close == -1:
+                    return None, end
+                parts.append((pos + 1, close))
+                pos = close + 1
+            elif char == syntax.double_quote:
+                close = self._find_closing(pos + 1, end, syntax.quote, syntax.double_quote)
+                if close == -1:
+                    return None, end
+                parts.append((pos + 1, close))
+                pos = close + 1
+            else:
+                bare = syntax.bare_value.match(content, pos, end)
+                if bare is None:
+                    break
+                name = self._text(*bare.span()).lower()
+                parts.append(self.strings[name] if name in self.strings else bare.span())
+                pos = bare.end()
+
+            pos = syntax.whitespace.match(content, pos, end).end()
+            if pos < end and content[pos:pos + 1] == syntax.hash:
+                pos += 1
+                continue
+            break
+
+        if not parts:
+            return None, pos
+        if self.lazy and len(parts) == 1:
+            return parts[0], pos
+        return ''.join(self._resolve(part) for part in parts), pos
+
+
+def find_chunk_boundaries(data: bytes, num_chunks: int) -> List[int]:
+    """
+    Split a BibTeX source into about `num_chunks` ranges at safe entry starts.
+
+    A split point is an '@' at the start of a line where the brace depth is
+    0, so no entry or field straddles two chunks. Depths are computed with
+    bytes.count between consecutive candidates, which keeps the pre-pass at
+    C speed. Returns the chunk start offsets followed by len(data); a source
+    whose braces do not balance is left in a single chunk.
+
+    Args:
+        data: The raw file contents
+        num_chunks: The desired number of chunks
+
+    Returns:
+        Sorted offsets [0, ..., len(data)]
+    """
+    if num_chunks <= 1 or data.count(b'{') != data.count(b'}'):
+        return [0, len(data)]
+
+    boundaries = [0]
+    depth, counted = 0, 0
+    step = max(len(data) // num_chunks, 1)
+    target = step
+    while target < len(data):
+        candidate = data.find(b'\n@', target)
+        while candidate != -1:
+            depth += data.count(b'{', counted, candidate) - data.count(b'}', counted, candidate)
+            counted = candidate
+            if depth == 0:
+                break
+            candidate = data.find(b'\n@', candidate + 1)
+        if candidate == -1:
+            break
+        boundaries.append(candidate + 1)
+        target = candidate + 1 + step
+    boundaries.append(len(data))
+    return boundaries
+
+
+def collect_string_definitions(data: bytes) -> List[Tuple[int, str, str]]:
+    """
+    Return (offset, name, value) for every top-level @string definition, in order.
+
+    Lets every chunk of a parallel parse start with the macros that a serial
+    parse would have seen at that point of the file.
+    """
+    tokenizer = BibTokenizer(data)
+    definitions = []
+    depth, counted = 0, 0
+    for match in STRING_HEAD_BYTES_PATTERN.finditer(data):
+        depth += data.count(b'{', counted, match.start()) - data.count(b'}', counted, match.start())
+        counted = match.start()
+        if depth != 0:
+            continue
+        body_end = tokenizer._find_entry_end(match.end(), match.group(1))
+        if body_end == -1:
+            continue
+        for name, value in tokenizer._parse_fields(match.end(), body_end).items():
+            value = tokenizer._resolve(value)
+            tokenizer.strings[name] = value
+            definitions.append((match.start(), name, value))
+    return definitions
+
+
+def _parse_chunk(file_path: str, start: int, end: int, strings: Dict[str, str], line_offset: int, char_offset: int):
+    """Worker for BibParser.parse_parallel: parse bytes [start, end) of a file."""
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    result = BibParser.parse_bytes(data, strings=strings)
+    for entry in result:
+        entry.line_number += line_offset
+        entry.offset += char_offset
+    line_starts = array('q', (line_start + char_offset for line_start in result.line_index.line_starts[1:]))
+    return list(result), result.preambles, line_starts
+
+
+class BibParser:
+    """Parser for BibTeX files with line number tracking."""
+
+    @staticmethod
+    def parse_file(file_path: str = "input.bib", lazy: bool = False, jobs: int = 1,
+                   profile: Optional[Profile] = None) -> ParseResult:
+        """
+        Parse a BibTeX file and return a list of BibEntry objects.
+
+        Args:
+            file_path: Path to the BibTeX file (default: "input.bib")
+            lazy: Memory-map the file and decode field values on first access
+            jobs: Number of worker processes; ignored in lazy mode
+            profile: Where to record the 'read' and 'parse' phases
+
+        Returns:
+            ParseResult (a list of BibEntry objects with line number metadata)
+        """
+        if lazy:
+            with phase(profile, 'parse'):
+                return BibParser.parse_mapped(file_path)
+        if jobs > 1 and os.path.getsize(file_path) >= 2 * MIN_CHUNK_SIZE:
+            with phase(profile, 'parse'):
+                return BibParser.parse_parallel(file_path, jobs)
+
+        # Universal newlines already turn '\r\n' and '\r' into '\n'
+        with phase(profile, 'read'), open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+
+        with phase(profile, 'parse'):
+            return BibParser.parse_string(content)
+
+    @staticmethod
+    def parse_bytes(data: bytes, strings: Optional[Dict[str, str]] = None) -> ParseResult:
+        """
+        Decode UTF-8 file contents the way parse_file reads them and parse them.
+
+        Args:
+            data: Raw contents of a BibTeX file
+            strings: @string macros defined before `data`
+
+        Returns:
+            ParseResult (a list of BibEntry objects with line number metadata)
+        """
+        content = data.decode('utf-8')
+        if '\r' in content:
+            # Same line endings as universal newlines
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return BibParser.parse_string(content, strings=strings)
+
+    @staticmethod
+    def parse_mapped(file_path: str) -> ParseResult:
+        """
+        Parse a memory-mapped BibTeX file lazily.
+
+        Entries only record offsets into the map; their fields are LazyFields
+        that are scanned and decoded on first access. Offsets, and the columns
+        reported by the result's line_index, are in bytes.
+
+        Args:
+            file_path: Path to the BibTeX file
+
+        Returns:
+            ParseResult whose `source` is the memory map backing the entries
+        """
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return ParseResult()
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return BibParser.parse_string(buffer, lazy=True)
+
+    @staticmethod
+    def parse_parallel(file_path: str, jobs: int) -> ParseResult:
+        """
+        Parse a large BibTeX file in a pool of `jobs` worker processes.
+
+        The file is cut at top-level entry starts (see find_chunk_boundaries),
+        each chunk is parsed with the macros defined before it, and the chunks
+        are merged back in file order with global line numbers and offsets.
+        The entries are the same as those of a serial parse_file; `source` is
+        not kept.
+
+        Args:
+            file_path: Path to the BibTeX file
+            jobs: Number of worker processes
+
+        Returns:
+            ParseResult (a list of BibEntry objects with line number metadata)
+        """
+        with open(file_path, 'rb') as file:
+            data = file.read()
+
+        num_chunks = min(jobs * 4, max(len(data) // MIN_CHUNK_SIZE, 1))
+        boundaries = find_chunk_boundaries(data, num_chunks)
+        definitions = collect_string_definitions(data)
+
+        tasks = []
+        strings, next_definition = {}, 0
+        line_offset, char_offset = 0, 0
+        for start, end in zip(boundaries, boundaries[1:]):
+            while next_definition < len(definitions) and definitions[next_definition][0] < start:
+                _, name, value = definitions[next_definition]
+                strings[name] = value
+                next_definition += 1
+            tasks.append((start, end, dict(strings), line_offset, char_offset))
+
+            # Lines and (decoded, newline-normalized) characters before the next chunk
+            chunk = data[start:end]
+            crlf = chunk.count(b'\r\n')
+            line_offset += chunk.count(b'\n') + chunk.count(b'\r') - crlf
+            char_offset += len(chunk.translate(None, CONTINUATION_BYTES)) - crlf
+        del data, chunk
+        strings.update((name, value) for _, name, value in definitions[next_definition:])
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        entries, preambles = [], []
+        line_index = LineIndex('')
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_parse_chunk, file_path, *task) for task in tasks]
+            for future in futures:
+                chunk_entries, chunk_preambles, line_starts = future.result()
+                entries.extend(chunk_entries)
+                preambles.extend(chunk_preambles)
+                line_index.line_starts.extend(line_starts)
+
+        return ParseResult(entries, strings=strings, preambles=preambles, line_index=line_index)
+
+    @staticmethod
+    def parse_string(content: Union[str, bytes, mmap.mmap], lazy: bool = False,
+                     strings: Optional[Dict[str, str]] = None) -> ParseResult:
+        """
+        Parse BibTeX source text and return a list of BibEntry objects.
+
+        Args:
+            content: BibTeX source with '\\n' line endings, or its UTF-8 bytes
+            lazy: Decode field values on first access instead of up front
+            strings: @string macros defined before `content`
+
+        Returns:
+            ParseResult (a list of BibEntry objects with line number metadata)
+        """
+        tokenizer = BibTokenizer(content, lazy=lazy, strings=strings)
+        line_index = LineIndex(content)
+        entries = []
+
+        for start, entry_type, citation_key, fields in tokenizer.tokenize():
+            line_number = line_index.line_of(start)
+
+            # Create appropriate entry object with line number
+            entry_class = ENTRY_CLASSES.get(entry_type)
+            if entry_class is not None:
+                entries.append(entry_class(citation_key, fields, line_number, offset=start))
+            else:
+                # You can add more BibEntry types here if needed
+                pass
+
+        return ParseResult(entries, strings=tokenizer.strings, preambles=tokenizer.preambles, line_index=line_index,
+                           source=content)
+
+
+class IncrementalParser:
+    """
+    Re-parse successive versions of a BibTeX source, redoing only the blocks that changed.
+
+    The source is split at every line starting with '@' and the pieces are
+    grouped into blocks that start at brace depth 0, as in
+    find_chunk_boundaries. Each block is tokenized on its own with the
+    @string macros in effect before it, and block parses are cached under
+    (macros, text), so after an edit only the touched blocks are tokenized
+    again. The entries of an unchanged block are the objects returned for it
+    last time, moved in place to their new line numbers and offsets, so a
+    result is only valid until the next call. If an entry
+    of some block cannot be closed, it might have reached into the next
+    block in a whole-file parse, so that version is parsed in one piece
+    instead. Either way the result is the same as parse_string.
+    """
+
+    def __init__(self):
+        self._blocks: Dict[tuple, tuple] = {}
+        self._depths: Dict[str, int] = {}
+        self._macro_ids: Dict[tuple, int] = {(): 0}
+        # Number of blocks tokenized by the last parse
+        self.num_reparsed = 0
+
+    @staticmethod
+    def _parse_block(text: str, strings: Dict[str, str]) -> Optional[tuple]:
+        """
+        Parse one block with `strings` defined before it.
+
+        Returns:
+            (entries, local positions, preambles, strings after the block or None
+            if unchanged, newline count), or None if an entry does not close in the block
+        """
+        tokenizer = BibTokenizer(text, strings=strings)
+        line_index = LineIndex(text)
+        entries, positions = [], []
+        for start, entry_type, citation_key, fields in tokenizer.tokenize():
+            entry_class = ENTRY_CLASSES.get(entry_type)
+            if entry_class is not None:
+                line_number = line_index.line_of(start)
+                entries.append(entry_class(citation_key, fields, line_number, offset=start))
+                positions.append((line_number, start))
+        if tokenizer._brace_matches is not None:
+            return None
+        defined = tokenizer.strings if tokenizer.strings != strings else None
+        return entries, positions, tokenizer.preambles, defined, text.count('\n')
+
+    def _group_pieces(self, content: str, pieces: List[str]) -> List[int]:
+        """Return the indices of the pieces that start a block, followed by len(pieces)."""
+        if content.count('{') != content.count('}'):
+            return [0, len(pieces)]
+
+        previous = self._depths
+        self._depths = depths = {}
+        starts = [0]
+        depth = 0
+        for index, piece in enumerate(pieces, 1):
+            change = previous.get(piece)
+            if change is None:
+                change = piece.count('{') - piece.count('}')
+            depths[piece] = change
+            depth += change
+            if depth == 0:
+                starts.append(index)
+        if starts[-1] != len(pieces):
+            starts.append(len(pieces))
+        return starts
+
+    def parse(self, content: str) -> ParseResult:
+        """
+        Parse the current version of the source.
+
+        Args:
+            content: BibTeX source with '\\n' line endings
+
+        Returns:
+            ParseResult (a list of BibEntry objects with line number metadata)
+        """
+        previous = self._blocks
+        blocks = {}
+        self.num_reparsed = 0
+
+        entries, preambles = [], []
+        strings: Dict[str, str] = {}
+        macro_id, line_offset, position = 0, 0, 0
+        pieces = content.split('\n@')
+        starts = self._group_pieces(content, pieces)
+        last = len(pieces)
+        for first, stop in zip(starts, starts[1:]):
+            body = '\n@'.join(pieces[first:stop])
+            key = (macro_id, body, first == 0, stop == last)
+            block = blocks.get(key)
+            if block is not None:
+                # The same text again: its entries need objects of their own
+                block_entries = [type(entry)(entry.citation_key, entry.fields, 0) for entry in block[0]]
+                block = (block_entries, *block[1:])
+            else:
+                block = previous.get(key)
+            if block is None:
+                text = body if first == 0 else '@' + body
+                block = self._parse_block(text if stop == last else text + '\n', strings)
+                if block is None:
+                    self.num_reparsed = len(starts) - 1
+                    return BibParser.parse_string(content)
+                self.num_reparsed += 1
+            blocks.setdefault(key, block)
+
+            block_entries, positions, block_preambles, defined, lines = block
+            start = position - 1 if first else 0
+            for entry, (line_number, offset) in zip(block_entries, positions):
+                entry.line_number = line_number + line_offset
+                entry.offset = offset + start
+            entries.extend(block_entries)
+            preambles.extend(block_preambles)
+            if defined is not None:
+                strings = defined
+                macro_id = self._macro_ids.setdefault(tuple(strings.items()), len(self._macro_ids))
+            line_offset += lines
+            position += len(body) + 2
+
+        self._blocks = blocks
+        return ParseResult(entries, strings=dict(strings), preambles=preambles, line_index=LineIndex(content),
+                           source=content)
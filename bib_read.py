@@ -1,15 +1,23 @@
-from typing import Dict, List, Optional
+from typing import List, Mapping, Optional, Sequence
+
+# Shared by every entry without issues; add_issues gives an entry its own list.
+NO_ISSUES: Sequence = ()
 
 
 class BibEntry:
     """Abstract base class for all BibTeX entry types."""
+
+    __slots__ = ('entry_type', 'citation_key', 'fields', 'line_number', 'offset', 'issues')
+    # Field holding the journal/conference name, if the entry type has one
+    PUB_FIELD: Optional[str] = None
     
-    def __init__(self, entry_type: str, citation_key: str, fields: Dict[str, str], line_number: int):
+    def __init__(self, entry_type: str, citation_key: str, fields: Mapping[str, str], line_number: int, offset: Optional[int] = None):
         self.entry_type = entry_type
         self.citation_key = citation_key
-        self.fields = fields
+        self.fields = fields  # keys are lowercase, as produced by the parser
         self.line_number = line_number
-        self.issues: List = []
+        self.offset = offset  # offset of the entry's '@' in the source
+        self.issues: Sequence = NO_ISSUES
     
     def __str__(self) -> str:
         """Custom string representation of the entry."""
@@ -22,18 +30,19 @@ class BibEntry:
     
     def get_field(self, field_name: str, default: Optional[str] = None) -> Optional[str]:
         """Safely get a field value with case-insensitive lookup."""
-        field_name = field_name.lower()
-        for key, value in self.fields.items():
-            if key.lower() == field_name:
-                return value
-        return default
+        value = self.fields.get(field_name)
+        if value is None:
+            value = self.fields.get(field_name.lower(), default)
+        return value
     
-    def get_all_fields(self) -> Dict[str, str]:
+    def get_all_fields(self) -> Mapping[str, str]:
         """Get all fields as a dictionary."""
         return self.fields
     
     def add_issues(self, issue):
         assert issue.issue_level.code in [0, 1, 2]
+        if self.issues is NO_ISSUES:
+            self.issues = []
         self.issues.append(issue)
         
     def get_num_issues(self):
@@ -47,9 +56,12 @@ class BibEntry:
 
 class Article(BibEntry):
     """Class for @article entries."""
+
+    __slots__ = ()
+    PUB_FIELD = 'journal'
     
-    def __init__(self, citation_key: str, fields: Dict[str, str], line_number: int):
-        super().__init__("article", citation_key, fields, line_number)
+    def __init__(self, citation_key: str, fields: Mapping[str, str], line_number: int, offset: Optional[int] = None):
+        super().__init__("article", citation_key, fields, line_number, offset)
         
     def get_pub(self) -> Optional[str]:
         return self.journal
@@ -87,9 +99,12 @@ class Article(BibEntry):
 
 class InProceedings(BibEntry):
     """Class for @inproceedings entries."""
+
+    __slots__ = ()
+    PUB_FIELD = 'booktitle'
     
-    def __init__(self, citation_key: str, fields: Dict[str, str], line_number: int):
-        super().__init__("inproceedings", citation_key, fields, line_number)
+    def __init__(self, citation_key: str, fields: Mapping[str, str], line_number: int, offset: Optional[int] = None):
+        super().__init__("inproceedings", citation_key, fields, line_number, offset)
         
     def get_pub(self) -> Optional[str]:
         return self.booktitle
@@ -119,9 +134,11 @@ class InProceedings(BibEntry):
 
 class Book(BibEntry):
     """Class for @book entries."""
+
+    __slots__ = ()
     
-    def __init__(self, citation_key: str, fields: Dict[str, str], line_number: int):
-        super().__init__("book", citation_key, fields, line_number)
+    def __init__(self, citation_key: str, fields: Mapping[str, str], line_number: int, offset: Optional[int] = None):
+        super().__init__("book", citation_key, fields, line_number, offset)
     
     @property
     def author(self) -> Optional[str]:
@@ -145,6 +162,8 @@ class Book(BibEntry):
 
 class Others(BibEntry):
     """Class for all other BibTeX entry types."""
+
+    __slots__ = ()
     
-    def __init__(self, entry_type: str, citation_key: str, fields: Dict[str, str]):
+    def __init__(self, entry_type: str, citation_key: str, fields: Mapping[str, str]):
         super().__init__(entry_type, citation_key, fields)
\ No newline at end of file
@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, List, Optional, Set, Tuple
+
+from bib_parser import IncrementalParser
+from check_incremental import IncrementalChecker
+from html_show import EntryHtmlCache, html_save, open_in_browser, missing_citations_html
+from tex_scan import TexScanner, cross_check, add_unused_issues
+
+# Seconds between two scans of the polling watcher
+POLL_INTERVAL = 0.2
+# Changes closer together than this (an editor saving in several steps) give one refresh
+SETTLE_TIME = 0.02
+# Seconds after which the browser reloads a report written in watch mode
+REPORT_REFRESH = 2
+TEX_SUFFIX = '.tex'
+
+
+class PollingWatcher:
+    """
+    Detect changes by comparing the modification time and size of the watched files.
+
+    Works everywhere; used when inotify is not available.
+    """
+
+    def __init__(self, files: List[str], directories: List[str] = (), interval: float = POLL_INTERVAL):
+        self.files = [os.path.abspath(path) for path in files]
+        self.directories = [os.path.abspath(path) for path in directories]
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        paths = list(self.files)
+        for directory in self.directories:
+            for root, _, names in os.walk(directory):
+                paths.extend(os.path.join(root, name) for name in names if name.endswith(TEX_SUFFIX))
+
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until a watched file changes (True) or `timeout` seconds pass (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            delay = self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detect changes with Linux inotify, called through ctypes.
+
+    The directories holding the watched files are watched rather than the
+    files themselves, so editors that save by writing a new file and
+    renaming it over the old one are followed. Directory trees are watched
+    recursively for .tex files, including subdirectories created later.
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, files: List[str], directories: List[str] = ()):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Watch descriptor -> (directory, watched file names or None for every .tex file below it)
+        self._watches: Dict[int, Tuple[str, Optional[Set[str]]]] = {}
+        try:
+            for path in files:
+                directory, name = os.path.split(os.path.abspath(path))
+                self._add_watch(directory, {name})
+            for tree in directories:
+                for root, _, _ in os.walk(os.path.abspath(tree)):
+                    self._add_watch(root, None)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str, names: Optional[Set[str]]) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch '{directory}'")
+        if wd in self._watches:
+            # Same directory as an earlier file: merge what is watched in it
+            known = self._watches[wd][1]
+            names = None if known is None or names is None else known | names
+        self._watches[wd] = (directory, names)
+
+    def _relevant(self, data: bytes) -> bool:
+        changed = False
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+            name = os.fsdecode(data[pos + self.EVENT.size:pos + self.EVENT.size + length].rstrip(b'\0'))
+            pos += self.EVENT.size + length
+            if wd not in self._watches:
+                continue
+
+            directory, names = self._watches[wd]
+            if names is None:
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        for root, _, _ in os.walk(os.path.join(directory, name)):
+                            self._add_watch(root, None)
+                    changed = True
+                elif name.endswith(TEX_SUFFIX):
+                    changed = True
+            elif name in names:
+                changed = True
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until a watched file changes (True) or `timeout` seconds pass (False)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._relevant(os.read(self._fd, 64 * 1024)):
+                return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(files: List[str], directories: List[str] = ()):
+    """Return an InotifyWatcher, or a PollingWatcher where inotify cannot be used."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(files, directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(files, directories)
+
+
+class WatchSession:
+    """
+    Keep the HTML report of a .bib file up to date while it is being edited.
+
+    Parsing, checking and rendering all reuse the previous run: only the
+    changed blocks of the file are tokenized again (IncrementalParser), only
+    changed entries go through the per-entry rules (IncrementalChecker),
+    only changed .tex files are read again (TexScanner) and only changed
+    report blocks are rendered again (EntryHtmlCache). The report
+    is replaced atomically and the browser is opened only for the first one,
+    if `open_browser`.
+    """
+
+    def __init__(self, input_path: str, output_path: str, tex: Optional[str] = None, open_browser: bool = True):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.tex = tex
+        self.open_browser = open_browser
+        self.parser = IncrementalParser()
+        self.checker = IncrementalChecker()
+        self.html_cache = EntryHtmlCache()
+        self.tex_scanner = TexScanner() if tex is not None else None
+
+    def refresh(self, open_browser: bool = False) -> float:
+        """Re-check the input and rewrite the report; return the time it took in seconds."""
+        start = time.perf_counter()
+        # Universal newlines, as BibParser.parse_file reads it
+        with open(self.input_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        parsed = list(self.parser.parse(content))
+        entries = self.checker.check(parsed)
+        header = ""
+        if self.tex_scanner is not None:
+            missing, unused = cross_check(self.tex_scanner.scan(self.tex), parsed)
+            add_unused_issues(entries, unused)
+            header = missing_citations_html(missing)
+        file_path = html_save(entries, self.output_path, cache=self.html_cache, refresh=REPORT_REFRESH, header=header)
+        elapsed = time.perf_counter() - start
+        if open_browser:
+            open_in_browser(file_path)
+        return elapsed
+
+    def run(self) -> None:
+        """Write the first report, then refresh it after every change until interrupted."""
+        directories = []
+        if self.tex is not None:
+            directories.append(self.tex if os.path.isdir(self.tex) else os.path.dirname(os.path.abspath(self.tex)))
+        watcher = open_watcher([self.input_path], directories)
+
+        try:
+            elapsed = self.refresh(open_browser=self.open_browser)
+            print(f"Watching '{self.input_path}' with {type(watcher).__name__} "
+                  f"(first check took {elapsed * 1000:.0f} ms); press Ctrl+C to stop.")
+            while True:
+                watcher.wait()
+                # Let a multi-step save finish before reading the file
+                while watcher.wait(SETTLE_TIME):
+                    pass
+                try:
+                    elapsed = self.refresh()
+                except (OSError, UnicodeDecodeError) as error:
+                    print(f"Error: cannot check '{self.input_path}': {error}")
+                    continue
+                print(f"Updated '{self.output_path}' in {elapsed * 1000:.0f} ms "
+                      f"({self.parser.num_reparsed} blocks parsed, {self.checker.num_rechecked} entries checked).")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
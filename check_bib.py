@@ -1,446 +1,557 @@
 import re
-import datetime
-from collections import Counter
-from typing import Dict, List, Optional, Tuple
+import time
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from bib_read import BibEntry, Article, InProceedings, Book, Others
-from html_show import search_paper
+from check_engine import RuleRegistry, PUB
+from entry_table import EntryTable
+from profiler import Profile
+from duplicate_index import DUPLICATE_KINDS, DuplicateKeys, canonical_title, collision_groups, duplicate_keys, duplicate_keys_table
+from title_similarity import TITLE_SIMILARITY, TitleIndex, find_similar_titles
+from venue_db import venue_database
 from issue import *
 
+class CheckSettings(NamedTuple):
+    """
+    The settings of the checks made from the command line (main.py), to be sent to worker processes.
+
+    Workers started with the spawn start method (the default on macOS and
+    Windows) import the modules afresh, so without apply() they would check
+    with the default settings.
+    """
+    title_threshold: Optional[float]
+    title_verify: str
+    venue_files: Tuple[str, ...]
+
+    @classmethod
+    def current(cls) -> 'CheckSettings':
+        return cls(TITLE_SIMILARITY.threshold, TITLE_SIMILARITY.verify, tuple(venue_database().paths))
+
+    def apply(self) -> None:
+        """Set these settings in this process (the initializer of worker processes)."""
+        TITLE_SIMILARITY.threshold = self.title_threshold
+        TITLE_SIMILARITY.verify = self.title_verify
+        database = venue_database()
+        added = [path for path in self.venue_files if path not in database.paths]
+        for path in added:
+            database.add_file(path)
+        if added:
+            venue_analysis.cache_clear()
+
+# Every check, in the order its issues are reported; see check()
+RULES = RuleRegistry('check_bib:RULES', settings=CheckSettings.current)
+
+MUST_KEYS = ('title', 'author', 'pages', 'year')
+MUST_KEYS_JOURNAL = MUST_KEYS + ('journal',)
+MUST_KEYS_CONFERENCE = MUST_KEYS + ('booktitle',)
+SELECTED_KEYS = ('volume', 'number')
+MUST_KEY_SETS = {keys: frozenset(keys) for keys in (MUST_KEYS_JOURNAL, MUST_KEYS_CONFERENCE, SELECTED_KEYS)}
+ALLOWED_KEYS_JOURNAL = frozenset(MUST_KEYS_JOURNAL + SELECTED_KEYS)
+ALLOWED_KEYS_CONFERENCE = frozenset(MUST_KEYS_CONFERENCE + SELECTED_KEYS)
+
+# standard begin-end page pair, like 1--10 or 1-10.
+PAGE_RANGE_PATTERN = re.compile(r'(\d+)[-–—]{1,2}(\d+)')
+# One match per line: the begin and end pages of a line with a page range, or two empty strings
+PAGE_RANGE_LINE_PATTERN = re.compile(r'^(?:(\d+)[-–—]{1,2}(\d+)|.*)$', re.MULTILINE)
+# 4-digit years (1900-2099)
+YEAR_PATTERN = re.compile(r'(?<!\d)(19|20)\d{2}(?!\d)')
+# ordinal indicators (41st, 62nd, 3rd etc.)
+ORDINAL_PATTERN = re.compile(r'\b\d{1,4}(st|nd|rd|th)\b', re.IGNORECASE)
+
+# Common English prepositions and articles
+PREPOSITIONS = frozenset({
+    'a', 'an', 'the', 'and', 'but', 'or', 'for', 'nor', 'as', 'at', 'by',
+    'for', 'from', 'in', 'into', 'of', 'on', 'onto', 'to', 'with', 'is',
+    'are', 'was', 'were', 'am', 'be', 'been', 'being', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'shall', 'should', 'can', 'could',
+    'may', 'might', 'must', 'not', 'its',
+    # permited words:
+    'preprint'
+})
+# Words that need no capital: ordinals, arXiv (with numbers), numbers
+CAPITALIZATION_EXEMPT_PATTERN = re.compile(r'\d+(st|nd|rd|th)|arxiv(:\d{4}\.\d{4,5})?|[\d.,]+', re.IGNORECASE)
+
+# 会议/期刊缩写词（多个大写字母组成的单词）
+ABBREVIATION_PATTERN = re.compile(r'\b(?:[A-Z]{2,}|[A-Za-z]*[A-Z]{2,}[A-Za-z]*)\b')
+# 要排除的通用缩写（如ACM、IEEE等）
+EXCLUDED_ABBREVIATIONS = frozenset({'ACM', 'IEEE', 'SIAM'}) # TODO
+
+# Distinct journal/booktitle strings whose analysis is kept (a bibliography seldom has more than a few hundred)
+VENUE_CACHE_SIZE = 4096
+
 # FUNCTION: 条目必须有：article有7个必须条目，inproceedings有5个必须条目
-def check_must_keys(entries: List[BibEntry]) -> List[BibEntry]:
-    MUST_KEYS = ['title', 'author', 'pages', 'year']
-    MUST_KEYS_JOURNAL = MUST_KEYS + ['journal']
-    MUST_KEYS_CONFERENCE = MUST_KEYS + ['booktitle']
-    SELECTED_KEYS = ['volume', 'number']
+@RULES.entry_rule(Article, InProceedings)
+def must_keys(entry: BibEntry) -> List[Issue]:
+    fields = entry.get_all_fields()
+    issues = []
     
-    def find_not_included_keys(entry: BibEntry, must_fields: List[str], issue_level: IssueLevel) -> Optional[Issue]:
-        fields = entry.get_all_fields()
-        not_included_keys_l = []
-        for key in must_fields:
-            if key not in fields.keys():
-                not_included_keys_l.append(key)
-        
-        if len(not_included_keys_l) > 0:
-            issue = IssueNotIncludedKeys(entry=entry, issue_level=issue_level, not_included_keys=not_included_keys_l)
-        else:
-            issue = None
-        return issue
+    ''' not included keys '''
+    if isinstance(entry, Article):
+        journal = entry.journal
+        if (journal is None or 'arxiv' not in journal.lower()) and not MUST_KEY_SETS[SELECTED_KEYS].issubset(fields):
+            missing = [key for key in SELECTED_KEYS if key not in fields]
+            issues.append(IssueNotIncludedKeys(entry=entry, issue_level=IssueLevel.NOTICE, not_included_keys=missing))
+        must_fields, allowed_fields = MUST_KEYS_JOURNAL, ALLOWED_KEYS_JOURNAL
+    else:
+        must_fields, allowed_fields = MUST_KEYS_CONFERENCE, ALLOWED_KEYS_CONFERENCE
     
-    def find_redundant_keys(entry: BibEntry, must_fields: List[str], issue_level: IssueLevel) -> Optional[str]:
-        # TODO: similar codes
-        fields = entry.get_all_fields()
-        redundant_keys_l = []
-        for key in fields.keys():
-            if key not in must_fields:
-                redundant_keys_l.append(key)
-        
-        if len(redundant_keys_l) > 0:
-            issue = IssueRedundantKeys(entry=entry, issue_level=issue_level, redundant_keys=redundant_keys_l)
+    if not MUST_KEY_SETS[must_fields].issubset(fields):
+        missing = [key for key in must_fields if key not in fields]
+        issues.append(IssueNotIncludedKeys(entry=entry, issue_level=IssueLevel.ERROR, not_included_keys=missing))
+    
+    ''' redundant keys '''
+    if not allowed_fields.issuperset(fields):
+        redundant = [key for key in fields if key not in allowed_fields]
+        issues.append(IssueRedundantKeys(entry=entry, issue_level=IssueLevel.ERROR, redundant_keys=redundant))
+    
+    return issues
+
+@RULES.batch_rule(must_keys)
+def must_keys_batch(table: EntryTable, rows: int) -> Dict[int, List[Issue]]:
+    """must_keys for all the rows at once: the missing and redundant fields only depend on the layout of an entry."""
+    # Per layout: the missing volume/number, missing required fields and redundant fields, each None if there are none
+    layout_keys = []
+    for entry_class, names in table.layouts:
+        selected = None
+        if issubclass(entry_class, Article):
+            selected = [key for key in SELECTED_KEYS if key not in names] or None
+            must_fields, allowed_fields = MUST_KEYS_JOURNAL, ALLOWED_KEYS_JOURNAL
         else:
-            issue = None
-        return issue
+            must_fields, allowed_fields = MUST_KEYS_CONFERENCE, ALLOWED_KEYS_CONFERENCE
+        missing = [key for key in must_fields if key not in names] or None
+        redundant = [key for key in names if key not in allowed_fields] or None
+        layout_keys.append((selected, missing, redundant))
     
-    for entry in entries:
-        ''' not included keys '''
-        notice, error = None, None
-        if isinstance(entry, Article):
-            if entry.journal is not None:
-                if 'arxiv' in entry.journal.lower():
-                    error = find_not_included_keys(entry, MUST_KEYS_JOURNAL, issue_level=IssueLevel.ERROR)
-                else:
-                    notice = find_not_included_keys(entry, SELECTED_KEYS, issue_level=IssueLevel.NOTICE)
-                    error = find_not_included_keys(entry, MUST_KEYS_JOURNAL, issue_level=IssueLevel.ERROR)
-            else:
-                notice = find_not_included_keys(entry, SELECTED_KEYS, issue_level=IssueLevel.NOTICE)
-                error = find_not_included_keys(entry, MUST_KEYS_JOURNAL, issue_level=IssueLevel.ERROR)
-        elif isinstance(entry, InProceedings):
-            error = find_not_included_keys(entry, MUST_KEYS_CONFERENCE, issue_level=IssueLevel.ERROR)
-        elif isinstance(entry, Book):
-            pass
-        elif isinstance(entry, Others):
-            pass
-        
-        if notice is not None:
-            entry.add_issues(notice)
-        if error is not None:
-            entry.add_issues(error)
-        
-        ''' redundant keys '''
-        # TODO: similar codes
-        error = None
-        if isinstance(entry, Article):
-            error = find_redundant_keys(entry, MUST_KEYS_JOURNAL + SELECTED_KEYS, issue_level=IssueLevel.ERROR)
-        elif isinstance(entry, InProceedings):
-            error = find_redundant_keys(entry, MUST_KEYS_CONFERENCE + SELECTED_KEYS, issue_level=IssueLevel.ERROR)
-        elif isinstance(entry, Book):
-            pass
-        elif isinstance(entry, Others):
-            pass
-        
-        if error is not None:
-            entry.add_issues(error)
+    hits = rows & table.bitmap(table.layout_codes, [any(keys) for keys in layout_keys], table.narrow_layout_codes)
+    journal = table.column('journal')
+    arxiv_journals = [1 if 'arxiv' in value.lower() else 0 for value in journal.values] + [0]
+    found = {}
+    for row in table.rows(hits):
+        selected, missing, redundant = layout_keys[table.layout_codes[row]]
+        entry = table.entries[row]
+        issues = []
+        if selected is not None and not arxiv_journals[journal.codes[row]]:
+            issues.append(IssueNotIncludedKeys(entry=entry, issue_level=IssueLevel.NOTICE, not_included_keys=selected))
+        if missing is not None:
+            issues.append(IssueNotIncludedKeys(entry=entry, issue_level=IssueLevel.ERROR, not_included_keys=missing))
+        if redundant is not None:
+            issues.append(IssueRedundantKeys(entry=entry, issue_level=IssueLevel.ERROR, redundant_keys=redundant))
+        if issues:
+            found[row] = issues
+    return found
+
+def duplicate_issue(kind: str, value: str) -> Issue:
+    """The issue shared by all entries with the same `value` of one of DUPLICATE_KINDS."""
+    if kind == 'key':
+        return IssueMultipleEntryKey(entry=None, issue_level=IssueLevel.ERROR, cit_key=value)
+    if kind == 'title':
+        return IssueMultipleTitle(entry=None, issue_level=IssueLevel.ERROR, title=value)
+    if kind == 'doi':
+        return IssueMultipleDOI(entry=None, issue_level=IssueLevel.ERROR, doi=value)
+    return IssueMultipleArxiv(entry=None, issue_level=IssueLevel.ERROR, arxiv_id=value)
+
+# FUNCTION: .bib文件内部是否有重复的论文？（引用键、规范化标题、DOI、arXiv编号）
+@RULES.corpus_rule(Article, InProceedings)
+class DuplicateEntries:
+    @staticmethod
+    def collect(entry: BibEntry) -> DuplicateKeys:
+        return duplicate_keys(entry)
     
-    return entries
+    @staticmethod
+    def reduce(entries: List[BibEntry], summaries: List[DuplicateKeys]) -> Dict[int, Sequence[Issue]]:
+        found: Dict[int, List[Issue]] = {}
+        for kind, groups in zip(DUPLICATE_KINDS, collision_groups(summaries)):
+            for value, group in groups.items():
+                issue = duplicate_issue(kind, value)
+                for idx in group:
+                    found.setdefault(idx, []).append(issue)
+        return found
 
-# FUNCTION: .bib文件内部是否有重复的论文？
-def check_redundant(entries: List[BibEntry]) -> List[BibEntry]:
-    def find_duplicates(lst: List) -> Dict:
-        count = Counter(lst)
-        duplicate_items = [item for item, cnt in count.items() if cnt > 1]
-        
-        duplicate_dict = {}
-        for idx, title in enumerate(lst):
-            if title in duplicate_items:
-                duplicate_dict[title] = duplicate_dict.get(title, []) + [idx]
-                
-        return duplicate_dict
+@RULES.batch_rule(DuplicateEntries)
+def duplicate_entries_batch(table: EntryTable, rows: int) -> List[DuplicateKeys]:
+    return duplicate_keys_table(table, table.rows(rows))
+
+def similar_title_issue(index: TitleIndex, title: str) -> Optional[Issue]:
+    """The IssueSimilarTitle of the normalized `title` in `index`, or None when no other title is similar."""
+    similar = index.similar(title)
+    if not similar:
+        return None
+    similar_titles = sorted(similar.items(), key=lambda item: (-item[1], item[0]))
+    return IssueSimilarTitle(entry=None, issue_level=IssueLevel.WARNING, similar_titles=similar_titles)
+
+# FUNCTION: 标题几乎相同（大小写、括号、标点、LaTeX重音或副标题不同）的论文也可能是重复的
+@RULES.corpus_rule(Article, InProceedings)
+class NearDuplicateTitles:
+    @staticmethod
+    def collect(entry: BibEntry) -> Optional[str]:
+        return canonical_title(entry.title)
     
-    ''' Duplicate citation_key '''
-    cit_key_l = [entry.citation_key for entry in entries]
-    duplicate_cit_key_dict = find_duplicates(cit_key_l)
+    @staticmethod
+    def reduce(entries: List[BibEntry], summaries: List[Optional[str]]) -> Dict[int, Sequence[Issue]]:
+        if not TITLE_SIMILARITY.enabled:
+            return {}
+        index = find_similar_titles((title for title in summaries if title is not None), TITLE_SIMILARITY)
+        
+        title_issues: Dict[str, Optional[Issue]] = {}
+        found = {}
+        for idx, title in enumerate(summaries):
+            if title is None:
+                continue
+            if title not in title_issues:
+                title_issues[title] = similar_title_issue(index, title)
+            if title_issues[title] is not None:
+                found[idx] = (title_issues[title],)
+        return found
+
+@RULES.batch_rule(NearDuplicateTitles)
+def near_duplicate_titles_batch(table: EntryTable, rows: int) -> List[Optional[str]]:
+    # The same normalized titles as duplicate_entries_batch, computed once
+    titles = table.row_values('title', canonical_title)
+    return list(map(titles.__getitem__, table.rows(rows)))
+
+# FUNCTION: 假设pages字段存在，检查是否符合规范，必须是"起--止"
+@RULES.entry_rule(Article, InProceedings, fields=('pages',))
+def pages_format(entry: BibEntry, pages_str: str) -> Tuple[Issue, ...]:
+    pages_str = pages_str.strip() # stripe spaces
     
-    for cit_key, v_indices in duplicate_cit_key_dict.items():
-        error_msg = IssueMultipleEntryKey(entry=None, issue_level=IssueLevel.ERROR, cit_key=cit_key)
-        for idx in v_indices:
-            entries[idx].add_issues(error_msg)
-
-    ''' Duplicate titles '''
-    title_l = [entry.title.lower() for entry in entries]
-    duplicate_title_dict = find_duplicates(title_l)
+    # 1. standard begin-end page pair, like 1--10 or 1-10.
+    range_match = PAGE_RANGE_PATTERN.fullmatch(pages_str)
+    if range_match:
+        start_page = int(range_match.group(1))
+        end_page = int(range_match.group(2))
+        if start_page <= end_page:
+            return ()
+        return (IssueBiggerBeginPage(entry=None, issue_level=IssueLevel.ERROR, start_page=start_page, end_page=end_page),)
     
-    for title, v_indices in duplicate_title_dict.items():
-        error_msg = IssueMultipleTitle(entry=None, issue_level=IssueLevel.ERROR, title=title)
-        for idx in v_indices:
-            entries[idx].add_issues(error_msg)
+    # 2. single number
+    if pages_str.isdigit():
+        return (IssueOnlyOnePage(entry=None, issue_level=IssueLevel.WARNING, page_num=int(pages_str)),)
     
-    return entries
+    # 3. Other formats
+    return (IssueWrongPageFormat(entry=None, issue_level=IssueLevel.ERROR, pages_str=pages_str),)
+
+@RULES.batch_rule(pages_format)
+def pages_format_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    """pages_format for all the rows at once: the distinct values are parsed together, one per line of a single string."""
+    column = table.column('pages')
+    pages_strs = list(map(str.strip, column.values))
+    text = '\n'.join(pages_strs)
+    if text.count('\n') != len(pages_strs) - 1:
+        # A value on several lines
+        return table.map_values('pages', rows, lambda pages_str: pages_format.func(None, pages_str))
     
-# FUNCTION: 假设pages字段存在，检查是否符合规范，必须是"起--止"
-def check_pages(entries: List[BibEntry]) -> List[BibEntry]:
-    def analyze_pages(pages_str: str) -> Optional[str]:
-        pages_str = pages_str.strip() # stripe spaces
-        
-        # 1. standard begin-end page pair, like 1--10 or 1-10.
-        range_match = re.fullmatch(r'(\d+)[-–—]{1,2}(\d+)', pages_str)
-        if range_match:
-            start_page = int(range_match.group(1))
-            end_page = int(range_match.group(2))
+    results = []
+    for pages_str, (start, end) in zip(pages_strs, PAGE_RANGE_LINE_PATTERN.findall(text)):
+        if start:
+            start_page, end_page = int(start), int(end)
             if start_page <= end_page:
-                return None
+                results.append(())
             else:
-                return IssueBiggerBeginPage(entry=None, issue_level=IssueLevel.ERROR, start_page=start_page, end_page=end_page)
-        
-        # 2. single number
-        if pages_str.isdigit():
-            page_num = int(pages_str)
-            return IssueOnlyOnePage(entry=None, issue_level=IssueLevel.WARNING, page_num=page_num)
-        
-        # 3. Other formats
-        return IssueWrongPageFormat(entry=None, issue_level=IssueLevel.ERROR, pages_str=pages_str)
+                results.append((IssueBiggerBeginPage(entry=None, issue_level=IssueLevel.ERROR, start_page=start_page, end_page=end_page),))
+        elif pages_str.isdigit():
+            results.append((IssueOnlyOnePage(entry=None, issue_level=IssueLevel.WARNING, page_num=int(pages_str)),))
+        else:
+            results.append((IssueWrongPageFormat(entry=None, issue_level=IssueLevel.ERROR, pages_str=pages_str),))
+    hits = rows & table.column_bitmap(column, results)
+    codes = column.codes
+    return {row: results[codes[row]] for row in table.rows(hits)}
 
-    pages_l = [entry.pages for entry in entries]
-    for idx, pages_str in enumerate(pages_l):
-        if pages_str is None: # assume the entry has the key 'page'.
-            continue
-        error_msg = analyze_pages(pages_str)
-        if error_msg is not None:
-            entries[idx].add_issues(error_msg)
-    
-    return entries
+class VenueAnalysis:
+    """
+    Everything the publication-name rules find in one journal/booktitle string.
+
+    A bibliography has far fewer distinct venues than entries, so each
+    string is analyzed once (see venue_analysis) and its issues are shared
+    by every entry with that venue; they point to no entry.
+    """
+
+    __slots__ = ('is_arxiv', 'ordinal', 'year', 'non_cap_words', 'starts_with_proceedings', 'starts_with_advances',
+                 'abbrs', 'capitalization_issues', 'abbreviation_issues', '_year_issues')
+
+    def __init__(self, pub: str):
+        # the journal name of arxiv paper orginally contain year number
+        self.is_arxiv = 'arxiv' in pub.lower()
+        ordinal_match = ORDINAL_PATTERN.search(pub)
+        self.ordinal = ordinal_match.group() if ordinal_match else None
+        year_match = YEAR_PATTERN.search(pub)
+        self.year = year_match.group() if year_match else None
+        non_cap_words = find_improperly_capitalized_words(pub)
+        self.non_cap_words = [word for word, _ in non_cap_words] if non_cap_words is not None else None
+        # 去除首尾空格并转换为小写比较
+        lower_title = pub.strip().lower()
+        self.starts_with_proceedings = lower_title.startswith('proceedings of')
+        self.starts_with_advances = lower_title.startswith('advances in')
+        self.abbrs = [abbr for abbr in ABBREVIATION_PATTERN.findall(pub) if abbr not in EXCLUDED_ABBREVIATIONS]
+
+        self.capitalization_issues: Tuple[Issue, ...] = ()
+        if self.non_cap_words is not None:
+            self.capitalization_issues = (IssueTitleCapitalization(entry=None, issue_level=IssueLevel.NOTICE,
+                                                                   non_cap_words_str=', '.join(self.non_cap_words)),)
+        self.abbreviation_issues: Tuple[Issue, ...] = ()
+        if self.abbrs:
+            venues = venue_database()
+            full_names = {}
+            for abbr in self.abbrs:
+                full_name = venues.full_name(abbr)
+                if full_name is not None:
+                    full_names[abbr] = full_name
+            self.abbreviation_issues = (IssueAbbreviation(entry=None, issue_level=IssueLevel.NOTICE, abbrs=self.abbrs,
+                                                          full_names=full_names),)
+        # Year and ordinal issues by pub_type ('journal' or 'booktitle'), made on first use
+        self._year_issues: Dict[str, Tuple[Issue, ...]] = {}
+
+    def year_issues(self, pub_type: str) -> Tuple[Issue, ...]:
+        issues = self._year_issues.get(pub_type)
+        if issues is None:
+            issues = ()
+            if not self.is_arxiv:
+                if self.ordinal is not None:
+                    issues += (IssueTitleContainsOrdinal(entry=None, issue_level=IssueLevel.NOTICE, pub_type=pub_type, ordinal=self.ordinal),)
+                if self.year is not None:
+                    issues += (IssueTitleContainsYear(entry=None, issue_level=IssueLevel.ERROR, pub_type=pub_type, year=self.year),)
+            self._year_issues[pub_type] = issues
+        return issues
+
+@lru_cache(maxsize=VENUE_CACHE_SIZE)
+def venue_analysis(pub: str) -> VenueAnalysis:
+    """
+    The analysis of the venue `pub`, shared by year_in_pub, pub_capitalization, ProceedingsPrefix and pub_abbreviation.
+
+    The cache keeps the VENUE_CACHE_SIZE most recently used venues;
+    venue_analysis.cache_info() gives its hits and misses.
+    """
+    return VenueAnalysis(pub)
 
 # FUNCTION: 年份只能有year这个字段有，article/booktitle就不要带年份了
 # FUNCTION: st, th是否要有？ # TODO: 感觉这个要全过一遍，看是否是统一了
 # TODO: more info like address 'Austria'
-def check_year(entries: List[BibEntry]) -> List[BibEntry]:
+@RULES.entry_rule(Article, InProceedings, fields=(PUB,))
+def year_in_pub(entry: BibEntry, pub: str) -> Tuple[Issue, ...]:
     """
-    Check if publication names (journal/booktitle) contain year numbers or ordinal indicators.
+    Check if the publication name (journal/booktitle) contains year numbers or ordinal indicators.
     
     Rules:
     1. No plain year numbers (e.g., 2023, 2015) allowed in journal/booktitle
     2. No ordinal indicators (e.g., 41st, 62nd) allowed in journal/booktitle
     3. Year should only appear in the 'year' field
-    
-    Args:
-        entries: List of BibEntry objects
-        
-    Returns:
-        List of BibEntry objects with error messages added for violations
     """
-    def analyze_year_in_pub(pub: str, pub_type: str) -> Optional[str]:
-        """
-        Analyze publication name for year-related patterns.
-        
-        Args:
-            pub: Journal or booktitle string
-            
-        Returns:
-            Error message if year pattern found, None otherwise
-        """
-        if not pub:
-            return None, None
-        
-        notice, error = None, None
-        # Check for 4-digit years (1900-2099)
-        year_match = re.search(r'(?<!\d)(19|20)\d{2}(?!\d)', pub)
-        if year_match:
-            error = IssueTitleContainsYear(entry=None, issue_level=IssueLevel.ERROR, pub_type=pub_type, year_match=year_match)
-            
-        # Check for ordinal indicators (41st, 62nd, 3rd etc.)
-        ordinal_match = re.search(r'\b\d{1,4}(st|nd|rd|th)\b', pub, re.IGNORECASE)
-        if ordinal_match:
-            notice = IssueTitleContainsOrdinal(entry=None, issue_level=IssueLevel.NOTICE, pub_type=pub_type, ordinal_match=ordinal_match)
-            
-        return notice, error
+    return venue_analysis(pub).year_issues(entry.get_pub_type())
 
-    for entry in entries:
-        pub = entry.get_pub()
-        pub_type = entry.get_pub_type()
-        
-        if pub is None: # assume that the entry has a pub key but may have wrongs
-            continue
-        if 'arxiv' in pub.lower(): # the journal name of arxiv paper orginally contain year number
-            continue
-            
-        notice, error = analyze_year_in_pub(pub, pub_type)
-        if notice is not None:
-            entry.add_issues(notice)
-        if error is not None:
-            entry.add_issues(error)
-    
-    return entries
+@RULES.batch_rule(year_in_pub)
+def year_in_pub_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    """year_in_pub for all the rows at once, looking for years and ordinals once per entry type and venue."""
+    found = {}
+    for entry_class in year_in_pub.entry_types:
+        class_rows = rows & table.rows_with(entry_types=(entry_class,))
+        if class_rows:
+            pub_type = table.entries[table.first(class_rows)].get_pub_type()
+            found.update(table.map_values(PUB, class_rows, lambda pub: venue_analysis(pub).year_issues(pub_type)))
+    return found
 
 # FUNCTION: 是还没录用的arxiv论文。arxiv论文是否有已经录用的版本？生成一下自动查找的url吧. arxiv必须是article
-def check_arxiv(entries: List[BibEntry]) -> List[BibEntry]:
-    today_year = datetime.datetime.today().year
+@RULES.entry_rule(Article, fields=('journal', 'year'))
+def arxiv_article(entry: BibEntry, journal: str, year: str) -> Tuple[Issue, ...]:
+    if 'arxiv' not in journal.lower():
+        return ()
+    # newly arxiv is ok to not be accepted in a journal/conf, old arxiv is not ok
+    if int(year) < time.localtime().tm_year - 1:
+        return (IssueArxivPaper(entry=None, issue_level=IssueLevel.WARNING),)
+    return (IssueArxivPaper(entry=None, issue_level=IssueLevel.NOTICE),)
+
+@RULES.batch_rule(arxiv_article)
+def arxiv_article_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    """arxiv_article for all the rows at once: the arXiv journals, then the years before last year, as bitmaps."""
+    journal, year = table.column('journal'), table.column('year')
+    arxiv_rows = rows & table.column_bitmap(journal, ['arxiv' in value.lower() for value in journal.values])
+    if not arxiv_rows:
+        return {}
+    # Only the years of arXiv papers are read as numbers, as in arxiv_article
+    old_years = [False] * len(year.values)
+    last_year = time.localtime().tm_year - 1
+    for code in {year.codes[row] for row in table.rows(arxiv_rows)}:
+        old_years[code] = int(year.values[code]) < last_year
+    old_rows = arxiv_rows & table.column_bitmap(year, old_years)
+    found = dict.fromkeys(table.rows(arxiv_rows & ~old_rows), (IssueArxivPaper(entry=None, issue_level=IssueLevel.NOTICE),))
+    found.update(dict.fromkeys(table.rows(old_rows), (IssueArxivPaper(entry=None, issue_level=IssueLevel.WARNING),)))
+    return found
+
+@RULES.entry_rule(InProceedings, fields=('booktitle',))
+def arxiv_inproceedings(entry: BibEntry, booktitle: str) -> Tuple[Issue, ...]:
+    if 'arxiv' in booktitle:
+        return (IssueArxivWithInproceddings(entry=None, issue_level=IssueLevel.ERROR),)
+    return ()
+
+@RULES.batch_rule(arxiv_inproceedings)
+def arxiv_inproceedings_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    return table.map_values('booktitle', rows, lambda booktitle: arxiv_inproceedings.func(None, booktitle))
+
+def find_improperly_capitalized_words(sentence: str) -> Optional[List[Tuple[str, int]]]:
+    """
+    Find words that violate title capitalization rules (excluding prepositions and allowed patterns)
     
-    for entry in entries:
-        if isinstance(entry, Article):
-            if entry.journal is not None and 'arxiv' in entry.journal.lower() and entry.year is not None:
-                # TODO: msg should not be html. html should be transfered latter.
-                # newly arxiv is ok to not be accepted in a journal/conf, old arxiv is not ok
-                if int(entry.year) < today_year - 1:
-                    entry.add_issues(IssueArxivPaper(entry=None, issue_level=IssueLevel.WARNING))
-                else:
-                    entry.add_issues(IssueArxivPaper(entry=None, issue_level=IssueLevel.NOTICE))
-            else: # assume that the entry has a year key
-                continue
-        elif isinstance(entry, InProceedings):
-            if 'arxiv' in entry.booktitle:
-                entry.add_issues(IssueArxivWithInproceddings(entry=None, issue_level=IssueLevel.ERROR))
-        else:
-            assert False
+    Args:
+        sentence: Input sentence to check
         
-    return entries
+    Returns:
+        - None if all words are properly capitalized
+        - List of tuples (word, index) for words violating rules
         
+    Rules:
+        1. First word of sentence must be capitalized
+        2. Non-preposition words must be capitalized
+        3. Preposition words can be lowercase
+        4. Allowed patterns:
+        - Numbers (23, 45.6)
+        - Ordinal numbers (23rd, 33rd)
+        - arXiv (standalone or with numbers: arXiv:2312.15478)
+    """
+    violations = []
     
-# FUNCTION: 期刊会议名称，是否是首字母大写的
-def check_pub_captialization(entries: List[BibEntry]) -> List[BibEntry]:
-    def find_improperly_capitalized_words(sentence: str) -> Optional[List[Tuple[str, int]]]:
-        """
-        Find words that violate title capitalization rules (excluding prepositions and allowed patterns)
+    for i, word in enumerate(sentence.split()):
+        # Most words start with a capital (or are prepositions): nothing else to check
+        if word[0].isupper() or (i > 0 and word.lower() in PREPOSITIONS):
+            continue
         
-        Args:
-            sentence: Input sentence to check
-            
-        Returns:
-            - None if all words are properly capitalized
-            - List of tuples (word, index) for words violating rules
+        # Skip allowed patterns
+        if CAPITALIZATION_EXEMPT_PATTERN.fullmatch(word):
+            continue
             
-        Rules:
-            1. First word of sentence must be capitalized
-            2. Non-preposition words must be capitalized
-            3. Preposition words can be lowercase
-            4. Allowed patterns:
-            - Numbers (23, 45.6)
-            - Ordinal numbers (23rd, 33rd)
-            - arXiv (standalone or with numbers: arXiv:2312.15478)
-        """
-        # Common English prepositions and articles
-        prepositions = {
-            'a', 'an', 'the', 'and', 'but', 'or', 'for', 'nor', 'as', 'at', 'by', 
-            'for', 'from', 'in', 'into', 'of', 'on', 'onto', 'to', 'with', 'is',
-            'are', 'was', 'were', 'am', 'be', 'been', 'being', 'have', 'has', 'had',
-            'do', 'does', 'did', 'will', 'would', 'shall', 'should', 'can', 'could',
-            'may', 'might', 'must', 'not', 'its',
-            # permited words:
-            'preprint'
-        }
-        
-        ignored_words = prepositions
-        
-        # Patterns to allow (ordinals, arXiv with numbers)
-        ordinal_pattern = re.compile(r'^\d+(st|nd|rd|th)$', re.IGNORECASE)
-        arxiv_pattern = re.compile(r'^arxiv(:\d{4}\.\d{4,5})?$', re.IGNORECASE)
-        number_pattern = re.compile(r'^[\d.,]+$')
-        
-        violations = []
-        words = sentence.split()
-        
-        for i, word in enumerate(words):
-            if not word:  # Skip empty strings
-                continue
-                
-            # Skip allowed patterns
-            if (arxiv_pattern.fullmatch(word) or 
-                ordinal_pattern.fullmatch(word) or 
-                number_pattern.fullmatch(word)):
-                continue
-                
-            # Find first alphabetic character (skip leading non-letters)
-            first_letter = None
-            for char in word:
-                if char.isalpha():
-                    first_letter = char
-                    break
-                    
-            # Skip if no letters found (all numbers/punctuation)
-            if first_letter is None:
-                continue
+        # Find first alphabetic character (skip leading non-letters)
+        first_letter = None
+        for char in word:
+            if char.isalpha():
+                first_letter = char
+                break
                 
-            # Check capitalization rules
-            if i == 0:  # First word must be capitalized
-                if not first_letter.isupper():
-                    violations.append((word, i))
-            else:  # Non-first words
-                lower_word = word.lower()
-                if lower_word not in ignored_words and not first_letter.isupper():
-                    violations.append((word, i))
-                    
-        return violations if violations else None
-    
-    for entry in entries:
-        pub = entry.get_pub()
-        if pub is None:
+        # Skip if no letters found (all numbers/punctuation)
+        if first_letter is None or first_letter.isupper():
             continue
-        
-        non_cap_words = find_improperly_capitalized_words(pub)
-        if non_cap_words is not None:
-            non_cap_words_str = ', '.join([word for word, _ in non_cap_words])
-            entry.add_issues(IssueTitleCapitalization(entry=None, issue_level=IssueLevel.NOTICE, non_cap_words_str=non_cap_words_str))
+            
+        violations.append((word, i))
+                
+    return violations if violations else None
 
-    return entries
+# FUNCTION: 期刊会议名称，是否是首字母大写的
+@RULES.entry_rule(Article, InProceedings, fields=(PUB,))
+def pub_capitalization(entry: BibEntry, pub: str) -> Tuple[Issue, ...]:
+    return venue_analysis(pub).capitalization_issues
+
+@RULES.batch_rule(pub_capitalization)
+def pub_capitalization_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    return table.map_values(PUB, rows, lambda pub: venue_analysis(pub).capitalization_issues)
+
+def pub_title_prefixes(title: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Check whether a journal/booktitle starts with 'Proceedings of' or 'Advances in'.
+
+    Returns:
+        (starts_with_proceedings, starts_with_advances)
+    """
+    if not title:
+        return False, False
+    analysis = venue_analysis(title)
+    return analysis.starts_with_proceedings, analysis.starts_with_advances
+
+def find_proceedings_advances_issue(entry: BibEntry, starts_with_proceedings: bool, starts_with_advances: bool,
+                                    num_proceeding: int, num_advances: int) -> Optional[Issue]:
+    """Return the issue of an @inproceedings entry that does not follow the majority prefix, if any."""
+    if num_proceeding == 0 and num_advances == 0: # ???
+        return None
+    if num_proceeding > num_advances and starts_with_proceedings:
+        return None
+    if num_proceeding <= num_advances and starts_with_advances:
+        return None
+
+    return IssueProceedingsOfAdvancesIn(entry=entry, issue_level=IssueLevel.NOTICE, starts_with_proceedings=starts_with_proceedings, starts_with_advances=starts_with_advances, num_proceeding=num_proceeding, num_advances=num_advances)
 
 # FUNCTION: 会议以Proceedings of还是Advances in。article里的journal里必须是期刊名(不能是Proceedings of或者Advances in)，inproceedings里的booktitle必须是会议. 
-def check_pre_pf_conf(entries: List[BibEntry]) -> List[BibEntry]:
-    def check_pub_title(title: str) -> dict:
-        """
-        检查期刊/会议标题是否符合规范
-        
-        Args:
-            title: 要检查的标题字符串
-            
-        Returns:
-            包含检查结果的字典，例如：
-            {
-                'starts_with_proceedings': bool,
-                'starts_with_advances': bool,
-                'is_valid': bool
-            }
-        """
-        if not title:
-            return {
-                'starts_with_proceedings': False,
-                'starts_with_advances': False,
-                'is_valid': False
-            }
-        
-        # 去除首尾空格并转换为小写比较
-        lower_title = title.strip().lower()
-        
-        starts_with_proceedings = lower_title.startswith('proceedings of')
-        starts_with_advances = lower_title.startswith('advances in')
-        
-        return {
-            'starts_with_proceedings': starts_with_proceedings,
-            'starts_with_advances': starts_with_advances,
-        }
-    
-    pub_info_l = [check_pub_title(entry.get_pub()) for entry in entries]
-    starts_with_proceedings_l = [pub_info['starts_with_proceedings'] for pub_info in pub_info_l]
-    starts_with_advances_l = [pub_info['starts_with_advances'] for pub_info in pub_info_l]
-    
-    # Compare the number of starts_with_proceedings and starts_with_advances
-    num_proceeding = sum(starts_with_proceedings_l)
-    num_advances = sum(starts_with_advances_l)
-    
-    
-    for entry, starts_with_proceedings, starts_with_advances, in zip(entries, starts_with_proceedings_l, starts_with_advances_l):
-        if isinstance(entry, Article):
-            if starts_with_proceedings or starts_with_advances:
-                entry.add_issues(IssueArticleWithProceddingsOf(entry=None, issue_level=IssueLevel.ERROR))
-            else:
-                continue
-        elif isinstance(entry, InProceedings):
-            if num_proceeding == 0 and num_advances == 0: # ???
-                continue
-            if num_proceeding > num_advances and starts_with_proceedings:
-                continue
-            if num_proceeding <= num_advances and starts_with_advances:
-                continue
-            
-            entry.add_issues(IssueProceedingsOfAdvancesIn(entry=entry, issue_level=IssueLevel.NOTICE, starts_with_proceedings=starts_with_proceedings, starts_with_advances=starts_with_advances, num_proceeding=num_proceeding, num_advances=num_advances))
-                
-    return entries
+@RULES.corpus_rule(Article, InProceedings)
+class ProceedingsPrefix:
+    @staticmethod
+    def collect(entry: BibEntry) -> Tuple[bool, bool]:
+        return pub_title_prefixes(entry.get_pub())
     
+    @staticmethod
+    def reduce(entries: List[BibEntry], summaries: List[Tuple[bool, bool]]) -> Dict[int, Sequence[Issue]]:
+        # Compare the number of starts_with_proceedings and starts_with_advances
+        num_proceeding = sum(starts_with_proceedings for starts_with_proceedings, _ in summaries)
+        num_advances = sum(starts_with_advances for _, starts_with_advances in summaries)
+        
+        found = {}
+        for idx, (entry, (starts_with_proceedings, starts_with_advances)) in enumerate(zip(entries, summaries)):
+            if isinstance(entry, Article):
+                if starts_with_proceedings or starts_with_advances:
+                    found[idx] = (IssueArticleWithProceddingsOf(entry=None, issue_level=IssueLevel.ERROR),)
+            elif isinstance(entry, InProceedings):
+                issue = find_proceedings_advances_issue(entry, starts_with_proceedings, starts_with_advances, num_proceeding, num_advances)
+                if issue is not None:
+                    found[idx] = (issue,)
+        return found
+
+@RULES.batch_rule(ProceedingsPrefix)
+def proceedings_prefix_batch(table: EntryTable, rows: int) -> List[Tuple[bool, bool]]:
+    prefixes = table.row_values(PUB, pub_title_prefixes, missing=(False, False))
+    return list(map(prefixes.__getitem__, table.rows(rows)))
+
 # FUNCTION: 会议名、期刊名是都缩写还是都全称
+@RULES.entry_rule(Article, InProceedings, fields=(PUB,))
+def pub_abbreviation(entry: BibEntry, pub: str) -> Tuple[Issue, ...]:
+    """检测字符串中的会议/期刊缩写词, 跳过ACM、IEEE等更大的词汇"""
+    return venue_analysis(pub).abbreviation_issues
+
+@RULES.batch_rule(pub_abbreviation)
+def pub_abbreviation_batch(table: EntryTable, rows: int) -> Dict[int, Tuple[Issue, ...]]:
+    return table.map_values(PUB, rows, lambda pub: venue_analysis(pub).abbreviation_issues)
+
+# Single-rule entry points: each adds the issues of its rule to the entries
+def check_must_keys(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((must_keys,), entries)
+
+def check_redundant(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((DuplicateEntries,), entries)
+
+def check_similar_titles(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((NearDuplicateTitles,), entries)
+
+def check_pages(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((pages_format,), entries)
+
+def check_year(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((year_in_pub,), entries)
+
+def check_arxiv(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((arxiv_article, arxiv_inproceedings), entries)
+
+def check_pub_captialization(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((pub_capitalization,), entries)
+
+def check_pre_pf_conf(entries: List[BibEntry]) -> List[BibEntry]:
+    return RULES.apply((ProceedingsPrefix,), entries)
+
 def check_pub_abbreviation(entries: List[BibEntry]) -> List[BibEntry]:
-    def detect_conference_abbreviations(pub: str) -> Optional[List[str]]:
-        """
-        检测字符串中的会议/期刊缩写词（多个大写字母组成的单词）
-        跳过ACM、IEEE等更大的词汇
-        
-        参数:
-            text (str): 要检查的文本
-            
-        返回:
-            tuple: (bool是否包含目标缩写词, list找到的所有目标缩写词)
-        """
-        # 定义要检测的目标缩写模式（3个或更多连续大写字母）
-        target_pattern = r'\b(?:[A-Z]{2,}|[A-Za-z]*[A-Z]{2,}[A-Za-z]*)\b'
-        
-        # 定义要排除的通用缩写（如ACM、IEEE等）
-        excluded_abbrs = {'ACM', 'IEEE', 'SIAM'} # TODO
-        
-        # 找到所有匹配的缩写词
-        all_abbrs = re.findall(target_pattern, pub)
-        
-        # 过滤出目标缩写词（排除通用缩写）
-        target_abbrs = [abbr for abbr in all_abbrs if abbr not in excluded_abbrs]
-        
-        # 返回结果
-        if len(target_abbrs) == 0:
-            target_abbrs = None
-        return target_abbrs
-    
-    for entry in entries:
-        pub = entry.get_pub()
-        if pub is None:
-            continue # assume the paper has a pub (journal/conf) key
-        abbrs = detect_conference_abbreviations(pub)
-        if abbrs is not None:
-            entry.add_issues(IssueAbbreviation(entry=entry, issue_level=IssueLevel.NOTICE, abbrs=abbrs))
-        
-    return entries
+    return RULES.apply((pub_abbreviation,), entries)
 
-# TODO: .tex中，未引用的，和引用不存在的
 
-# TODO: generating modified .bib file!
-        
-def check(entries: List[BibEntry]):
+def check(entries: List[BibEntry], jobs: int = 1, stats: Optional[IssueStats] = None, profile: Optional[Profile] = None):
     # filter unneeded entries
     entries = [entry for entry in entries if not isinstance(entry, Others) and not isinstance(entry, Book)]
     
     init_entries_len = len(entries)
     
-    entries = check_must_keys(entries)
-    entries = check_redundant(entries)
-    entries = check_pages(entries)
-    entries = check_year(entries)
-    entries = check_arxiv(entries)
-    entries = check_pub_captialization(entries)
-    entries = check_pre_pf_conf(entries)
-    entries = check_pub_abbreviation(entries)
+    if profile is None and jobs <= 1:
+        # The rules with a batch version over the columns of all entries, the others in one pass over them
+        entries = RULES.run_columnar(entries, stats=stats)
+    elif profile is None:
+        # All rules in one pass over the entries (sharded over `jobs` workers), then the corpus-level reduce steps
+        entries = RULES.run_parallel(entries, jobs, stats)
+    else:
+        # Same pass in this process, with every rule timed
+        before = venue_analysis.cache_info()
+        with profile.phase('check'):
+            entries = profile.run_rules(RULES, entries, stats)
+        after = venue_analysis.cache_info()
+        profile.add_cache('venue_analysis', after.hits - before.hits, after.misses - before.misses, after.currsize)
     
     # no entries are ignored or not returned
     assert entries is not None and init_entries_len == len(entries)
@@ -0,0 +1,421 @@
+import importlib
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from bib_read import BibEntry, NO_ISSUES
+from entry_table import EntryTable, PUB
+from issue import IssueStats
+
+# Fewer entries than this per shard are not worth a worker
+MIN_SHARD_ENTRIES = 2000
+# Below this many entries, pickling them costs more than a process pool saves; they are checked serially
+PROCESS_MIN_ENTRIES = 50000
+
+
+class EntryRule:
+    """
+    A rule that looks at one entry at a time.
+
+    `func(entry, *values)` is called with the values of `fields`, in order,
+    and only when all of them are present; it returns the issues it found
+    (an empty sequence or None when there are none).
+
+    A rule may also have a batch version (see RuleRegistry.batch_rule),
+    `batch(table, rows)`, that checks all the `rows` of an EntryTable at
+    once and returns {row: issues} like func would for each of them.
+    """
+
+    __slots__ = ('name', 'func', 'entry_types', 'fields', 'batch')
+
+    def __init__(self, func: Callable, entry_types: Tuple[Type[BibEntry], ...], fields: Tuple[str, ...]):
+        self.name = func.__name__
+        self.func = func
+        self.entry_types = entry_types
+        self.fields = fields
+        self.batch: Optional[Callable[[EntryTable, int], Dict[int, Sequence]]] = None
+
+
+class CorpusRule:
+    """
+    A rule whose outcome for an entry depends on the other entries.
+
+    It is given as a class with two static methods: `collect(entry)`
+    returns a small summary of one entry, and `reduce(entries, summaries)`
+    returns {index: issues} for the entries (and their summaries, in the
+    same order) the rule applies to.
+
+    A batch version of collect (see RuleRegistry.batch_rule),
+    `batch(table, rows)`, returns the summaries of all the `rows` of an
+    EntryTable, in order.
+    """
+
+    __slots__ = ('name', 'collect', 'reduce', 'entry_types', 'batch')
+
+    def __init__(self, rule_class: type, entry_types: Tuple[Type[BibEntry], ...]):
+        self.name = rule_class.__name__
+        self.collect: Callable[[BibEntry], Hashable] = rule_class.collect
+        self.reduce: Callable[[List[BibEntry], List[Hashable]], Dict[int, Sequence]] = rule_class.reduce
+        self.entry_types = entry_types
+        self.batch: Optional[Callable[[EntryTable, int], List[Hashable]]] = None
+
+
+class RulePlan:
+    """
+    The rules of a registry that apply to one entry class, laid out for the dispatcher.
+
+    `fields` are the distinct field names the entry rules read, fetched once
+    per entry. Each step is (func, args, corpus position): an entry rule
+    with args None (no fields), the index of its only field, or a tuple of
+    indices; or, with func None, the place of a corpus rule's issues.
+    """
+
+    __slots__ = ('fields', 'steps', 'corpus')
+
+    def __init__(self, fields: Tuple[str, ...], steps: List[tuple], corpus: List[int]):
+        self.fields = fields
+        self.steps = steps
+        # Indices (into RuleRegistry.corpus_rules) of the corpus rules that apply
+        self.corpus = corpus
+
+
+class ShardResult(NamedTuple):
+    """Output of the map phase for a slice of the entries; indices are relative to the slice."""
+    # Issues of each entry, without those of corpus rules
+    found: List[list]
+    # Per entry: where the issues of each corpus rule that applies to it go in its list
+    marks: List[List[int]]
+    # Per corpus rule: the entries it applies to, and their summaries
+    members: List[List[int]]
+    summaries: List[List[Hashable]]
+
+
+class RuleRegistry:
+    """
+    Ordered collection of check rules, and the dispatcher that runs them.
+
+    Rules are registered with the entry_rule and corpus_rule decorators and
+    report their issues in registration order. run() makes a single pass
+    over the entries in which every entry rule is applied and every corpus
+    rule collects its summary, then one reduce step per corpus rule.
+
+    Rules may read module-level settings (set from the command line in the
+    main process). `settings`, if given, returns a picklable snapshot of
+    them whose apply() sets them again in a worker process, which may have
+    imported the modules afresh (the spawn start method).
+    """
+
+    def __init__(self, import_path: Optional[str] = None, settings: Optional[Callable[[], object]] = None):
+        # 'module:name' where worker processes find this registry
+        self.import_path = import_path
+        self.settings = settings
+        self.rules: List[object] = []
+        self._plans: Dict[type, RulePlan] = {}
+        # Registries of rule subsets, for run(entries, rules)
+        self._subsets: Dict[tuple, 'RuleRegistry'] = {}
+
+    @property
+    def corpus_rules(self) -> List[CorpusRule]:
+        return [rule for rule in self.rules if isinstance(rule, CorpusRule)]
+
+    def entry_rule(self, *entry_types: Type[BibEntry], fields: Sequence[str] = ()):
+        """Register the decorated function as an EntryRule for `entry_types` reading `fields`."""
+        def register(func: Callable) -> EntryRule:
+            rule = EntryRule(func, entry_types, tuple(fields))
+            self.rules.append(rule)
+            self._plans.clear()
+            self._subsets.clear()
+            return rule
+        return register
+
+    def corpus_rule(self, *entry_types: Type[BibEntry]):
+        """Register the decorated class as a CorpusRule for `entry_types`."""
+        def register(rule_class: type) -> CorpusRule:
+            rule = CorpusRule(rule_class, entry_types)
+            self.rules.append(rule)
+            self._plans.clear()
+            self._subsets.clear()
+            return rule
+        return register
+
+    def batch_rule(self, rule: object):
+        """Register the decorated function as the batch version of the registered `rule` (or its collect), used by run_columnar."""
+        def register(batch: Callable[[EntryTable, int], object]) -> Callable:
+            rule.batch = batch
+            return batch
+        return register
+
+    def plan(self, entry_class: type) -> RulePlan:
+        """Return (and cache) the rules that apply to `entry_class`, with PUB resolved."""
+        plan = self._plans.get(entry_class)
+        if plan is not None:
+            return plan
+
+        fields: List[str] = []
+        steps, corpus = [], []
+        position = 0
+        for rule in self.rules:
+            if isinstance(rule, CorpusRule):
+                if issubclass(entry_class, rule.entry_types):
+                    corpus.append(position)
+                    steps.append((None, None, position))
+                position += 1
+                continue
+            if not issubclass(entry_class, rule.entry_types):
+                continue
+            names = [entry_class.PUB_FIELD if name == PUB else name for name in rule.fields]
+            if None in names:
+                continue
+            for name in names:
+                if name not in fields:
+                    fields.append(name)
+            args = tuple(fields.index(name) for name in names)
+            steps.append((rule.func, None if not args else args[0] if len(args) == 1 else args, None))
+
+        plan = self._plans[entry_class] = RulePlan(tuple(fields), steps, corpus)
+        return plan
+
+    def _subset(self, rules: Optional[Sequence[object]]) -> 'RuleRegistry':
+        if rules is None:
+            return self
+        key = tuple(rule for rule in self.rules if rule in rules)
+        registry = self._subsets.get(key)
+        if registry is None:
+            registry = self._subsets[key] = RuleRegistry()
+            registry.rules = list(key)
+        return registry
+
+    def run(self, entries: List[BibEntry], rules: Optional[Sequence[object]] = None,
+            stats: Optional[IssueStats] = None) -> List[BibEntry]:
+        """
+        Check `entries` in place and return them.
+
+        Args:
+            entries: Entries to check; their issues are replaced
+            rules: Only run these registered rules (default: all of them)
+            stats: Counts to add the issues found to
+
+        Returns:
+            The same list, with the issues of every entry in rule order
+        """
+        registry = self._subset(rules)
+        return registry.reduce(entries, [(0, registry.map(entries))], stats)
+
+    def run_columnar(self, entries: List[BibEntry], table: Optional[EntryTable] = None,
+                     rules: Optional[Sequence[object]] = None, stats: Optional[IssueStats] = None) -> List[BibEntry]:
+        """
+        Like run(), with the entry rules that have a batch version run over the columns of an EntryTable.
+
+        Each batch version checks all the rows its rule applies to at once
+        (the rows of its entry types having all its fields), or collects
+        the summaries of a corpus rule from the columns. The other corpus
+        rules collect theirs in one pass over the entries, and entry rules
+        without a batch version are run on their own. The issues of every
+        rule are then put together in rule order, touching only the entries
+        that have some, so the result is the same as run().
+
+        Args:
+            entries: Entries to check; their issues are replaced
+            table: EntryTable of `entries` (default: made here)
+            rules: Only run these registered rules (default: all of them)
+            stats: Counts to add the issues found to
+        """
+        registry = self._subset(rules)
+        if table is None:
+            table = EntryTable(entries)
+        collected = [rule for rule in registry.corpus_rules if rule.batch is None]
+        shard = self._subset(collected).map(entries) if collected else None
+
+        # {index: issues} of every rule, in rule order
+        parts: List[Dict[int, Sequence]] = []
+        for rule in registry.rules:
+            if isinstance(rule, CorpusRule):
+                if rule.batch is not None:
+                    rows = table.rows_with((), rule.entry_types)
+                    indices, summaries = table.rows(rows), rule.batch(table, rows)
+                else:
+                    position = collected.index(rule)
+                    indices, summaries = shard.members[position], shard.summaries[position]
+                found = rule.reduce([entries[index] for index in indices], summaries)
+                parts.append({indices[member]: issues for member, issues in found.items()})
+            elif rule.batch is not None:
+                parts.append(rule.batch(table, table.rows_with(rule.fields, rule.entry_types)))
+            else:
+                self._subset((rule,)).run(entries)
+                parts.append({index: entry.issues for index, entry in enumerate(entries) if entry.issues})
+
+        found: Dict[int, list] = {}
+        for part in parts:
+            for index, issues in part.items():
+                if index in found:
+                    found[index] += issues
+                else:
+                    found[index] = list(issues)
+        for index, entry in enumerate(entries):
+            issues = found.get(index)
+            if issues:
+                entry.issues = issues
+                if stats is not None:
+                    stats.add(issues)
+            else:
+                entry.issues = NO_ISSUES
+        return entries
+
+    def map(self, entries: List[BibEntry]) -> ShardResult:
+        """
+        Map phase: run the entry rules on `entries` and collect the corpus rules' summaries.
+
+        Entries are independent here, so any contiguous slice of a
+        bibliography can be mapped on its own (see run_parallel).
+        """
+        corpus_rules = self.corpus_rules
+        collectors = [rule.collect for rule in corpus_rules]
+        # Per corpus rule: indices of the entries it applies to, and their summaries
+        members: List[List[int]] = [[] for _ in corpus_rules]
+        summaries: List[List[Hashable]] = [[] for _ in corpus_rules]
+        # Per entry: its issues so far, and where each corpus rule's issues go in them
+        found: List[list] = []
+        marks: List[List[int]] = []
+
+        plans = self._plans
+        for index, entry in enumerate(entries):
+            plan = plans.get(entry.__class__)
+            if plan is None:
+                plan = self.plan(entry.__class__)
+
+            values = list(map(entry.fields.get, plan.fields))
+            issues = []
+            entry_marks = []
+            for func, args, position in plan.steps:
+                if func is None:
+                    members[position].append(index)
+                    summaries[position].append(collectors[position](entry))
+                    entry_marks.append(len(issues))
+                    continue
+                if args is None:
+                    result = func(entry)
+                elif args.__class__ is int:
+                    value = values[args]
+                    if value is None:
+                        continue
+                    result = func(entry, value)
+                else:
+                    arg_values = [values[arg] for arg in args]
+                    if None in arg_values:
+                        continue
+                    result = func(entry, *arg_values)
+                if result:
+                    issues += result
+            found.append(issues)
+            marks.append(entry_marks)
+
+        return ShardResult(found, marks, members, summaries)
+
+    def reduce(self, entries: List[BibEntry], shards: List[Tuple[int, ShardResult]],
+               stats: Optional[IssueStats] = None) -> List[BibEntry]:
+        """
+        Reduce phase: run the corpus rules over the summaries of all shards and set every entry's issues.
+
+        Args:
+            entries: All the entries that were mapped
+            shards: (offset of the shard's first entry, its map result), in entry order
+            stats: Counts to add the issues found to
+
+        Returns:
+            `entries`
+        """
+        corpus_rules = self.corpus_rules
+        found: List[list] = []
+        marks: List[List[int]] = []
+        members: List[List[int]] = [[] for _ in corpus_rules]
+        summaries: List[List[Hashable]] = [[] for _ in corpus_rules]
+        for offset, shard in shards:
+            found += shard.found
+            marks += shard.marks
+            for position in range(len(corpus_rules)):
+                members[position] += (offset + index for index in shard.members[position])
+                summaries[position] += shard.summaries[position]
+
+        # Insert each corpus rule's issues at its place (the plans may only have been made in worker processes)
+        plan = self.plan
+        pending: Dict[int, List[Tuple[int, Sequence]]] = {}
+        for position, (rule, indices) in enumerate(zip(corpus_rules, members)):
+            for member, issues in rule.reduce([entries[index] for index in indices], summaries[position]).items():
+                index = indices[member]
+                mark = marks[index][plan(entries[index].__class__).corpus.index(position)]
+                pending.setdefault(index, []).append((mark, issues))
+        for index, inserts in pending.items():
+            issues = found[index]
+            for mark, corpus_issues in reversed(inserts):
+                issues[mark:mark] = corpus_issues
+
+        for entry, issues in zip(entries, found):
+            if issues:
+                entry.issues = issues
+                if stats is not None:
+                    stats.add(issues)
+            else:
+                entry.issues = NO_ISSUES
+
+        return entries
+
+    def run_parallel(self, entries: List[BibEntry], jobs: int, stats: Optional[IssueStats] = None) -> List[BibEntry]:
+        """
+        Like run(), with the map phase split into contiguous shards run by `jobs` workers.
+
+        Large inputs are mapped in a process pool: the workers send back
+        each entry's issues (without the entry itself) and the compact
+        corpus summaries, and the reduce phase runs here over all of them
+        in entry order, so the result is the same as run(). The workers
+        start with the registry's settings applied. Smaller inputs, lazily
+        parsed entries (which cannot be pickled) and registries without an
+        import_path are checked serially: the rules are pure Python, so
+        threads would not run them any faster.
+        """
+        num_shards = min(jobs * 4, len(entries) // MIN_SHARD_ENTRIES)
+        if (jobs <= 1 or num_shards <= 1 or self.import_path is None or len(entries) < PROCESS_MIN_ENTRIES
+                or not all(entry.fields.__class__ is dict for entry in entries)):
+            return self.run(entries, stats=stats)
+
+        # Only runs that use workers pay for importing concurrent.futures
+        from concurrent.futures import ProcessPoolExecutor
+
+        step = -(-len(entries) // num_shards)
+        offsets = range(0, len(entries), step)
+        settings = self.settings() if self.settings is not None else None
+        initializer = settings.apply if settings is not None else None
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initializer) as executor:
+            futures = [executor.submit(_map_shard, self.import_path, entries[offset:offset + step])
+                       for offset in offsets]
+            shards = []
+            for offset, future in zip(offsets, futures):
+                shard, owned = future.result()
+                # Issues that referred to the worker's copy of their entry
+                for index, position in owned:
+                    shard.found[index][position].entry = entries[offset + index]
+                shards.append((offset, shard))
+
+        return self.reduce(entries, shards, stats)
+
+    def apply(self, rules: Sequence[object], entries: List[BibEntry]) -> List[BibEntry]:
+        """Run only `rules` and add their issues to those the entries already have."""
+        previous = [entry.issues for entry in entries]
+        self.run(entries, rules)
+        for entry, issues in zip(entries, previous):
+            if issues:
+                entry.issues = [*issues, *entry.issues]
+        return entries
+
+
+def _map_shard(import_path: str, entries: List[BibEntry]) -> Tuple[ShardResult, List[Tuple[int, int]]]:
+    """Worker for RuleRegistry.run_parallel: map one shard in a separate process."""
+    module_name, name = import_path.split(':')
+    registry = getattr(importlib.import_module(module_name), name)
+    shard = registry.map(entries)
+
+    # Do not send the entries back with the issues that refer to them
+    owned = []
+    for index, (entry, issues) in enumerate(zip(entries, shard.found)):
+        for position, issue in enumerate(issues):
+            if issue.entry is entry:
+                issue.entry = None
+                owned.append((index, position))
+    return shard, owned
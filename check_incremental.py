@@ -0,0 +1,218 @@
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from bib_read import BibEntry, Article, InProceedings, Book, Others, NO_ISSUES
+from check_bib import (RULES, DuplicateEntries, NearDuplicateTitles, ProceedingsPrefix, pub_title_prefixes,
+                       find_proceedings_advances_issue, similar_title_issue, duplicate_issue)
+from check_engine import CorpusRule, RuleRegistry
+from duplicate_index import DUPLICATE_KINDS, DuplicateIndex, duplicate_keys
+from issue import *
+from title_similarity import TITLE_SIMILARITY
+
+# Corpus-level rules whose state IncrementalChecker updates entry by entry; any other one runs in full on every check
+INCREMENTAL_RULES = (DuplicateEntries, NearDuplicateTitles, ProceedingsPrefix)
+
+
+def rule_layout(registry: RuleRegistry) -> List[object]:
+    """The rules of `registry` in order, each run of consecutive entry rules as one tuple, corpus rules on their own."""
+    layout = []
+    for rule in registry.rules:
+        if isinstance(rule, CorpusRule):
+            layout.append(rule)
+        elif layout and isinstance(layout[-1], tuple):
+            layout[-1] += (rule,)
+        else:
+            layout.append((rule,))
+    return layout
+
+
+def entry_fingerprint(entry: BibEntry) -> Hashable:
+    """Everything the checks read from an entry; equal fingerprints give equal issues."""
+    return (entry.entry_type, entry.citation_key, tuple(entry.fields.items()))
+
+
+class EntryState:
+    """Results of the per-entry rules for one entry, plus its keys into the corpus-level state."""
+
+    __slots__ = ('fingerprint', 'entry', 'fields', 'entry_issues', 'article_prefix', 'duplicate_keys',
+                 'normalized_title', 'starts_with_proceedings', 'starts_with_advances', 'assembled')
+
+    def __init__(self, entry: BibEntry, fingerprint: Hashable, registry: RuleRegistry, layout: Sequence[object]):
+        self.fingerprint = fingerprint
+        # Issues of each group of entry rules of the layout (see rule_layout), in order
+        self.entry_issues = tuple(self._run(registry, entry, rules) for rules in layout if isinstance(rules, tuple))
+        self.duplicate_keys = duplicate_keys(entry)
+        self.normalized_title = self.duplicate_keys[1]
+        self.starts_with_proceedings, self.starts_with_advances = pub_title_prefixes(entry.get_pub())
+
+        self.article_prefix: Tuple[Issue, ...] = ()
+        if isinstance(entry, Article) and (self.starts_with_proceedings or self.starts_with_advances):
+            self.article_prefix = (IssueArticleWithProceddingsOf(entry=None, issue_level=IssueLevel.ERROR),)
+
+        # The entry the issues point to, its fields, and what its issue list was last built from
+        self.entry = entry
+        self.fields = entry.fields
+        self.assembled = None
+
+    @staticmethod
+    def _run(registry: RuleRegistry, entry: BibEntry, rules) -> Tuple[Issue, ...]:
+        registry.run([entry], rules)
+        return tuple(entry.issues)
+
+    def adopt(self, entry: BibEntry) -> None:
+        """Point the cached issues at `entry`, an unchanged copy of the entry they were made for."""
+        for issues in self.entry_issues:
+            for issue in issues:
+                if issue.entry is not None:
+                    issue.entry = entry
+        self.entry = entry
+        self.fields = entry.fields
+        self.assembled = None
+
+
+class IncrementalChecker:
+    """
+    Re-check a bibliography after edits, redoing only what changed.
+
+    Entries are matched with the previous run by content fingerprint, or
+    directly when the same entry object (with the same fields mapping) is
+    passed again, as IncrementalParser does for unchanged blocks; fields
+    must therefore not be modified in place between runs. The per-entry
+    rules only run on added or changed entries; the corpus-level state
+    (citation key, title, DOI and arXiv counts for DuplicateEntries, the
+    index of normalized titles for NearDuplicateTitles, the 'Proceedings
+    of'/'Advances in' counts for ProceedingsPrefix) is updated
+    by removing the entries that disappeared and adding the new ones. Issues
+    that depend on that state are then rebuilt from it for every entry whose
+    inputs changed, so the result is the same as a full check().
+
+    The rules and their order are taken from `registry`. A corpus-level
+    rule not in INCREMENTAL_RULES is run over all the entries on every
+    check, and every entry's issues are then put together again.
+    """
+
+    def __init__(self, registry: RuleRegistry = RULES):
+        self._registry = registry
+        self._layout = rule_layout(registry)
+        self._full_rules = [rule for rule in self._layout
+                            if isinstance(rule, CorpusRule) and rule not in INCREMENTAL_RULES]
+        self._states: Dict[Hashable, List[EntryState]] = {}
+        self._entry_states: Dict[BibEntry, EntryState] = {}
+        self._duplicates = DuplicateIndex()
+        self._settings = None
+        self._title_index = None
+        self.num_proceeding = 0
+        self.num_advances = 0
+        # Number of entries whose per-entry rules ran in the last check
+        self.num_rechecked = 0
+
+    def _count(self, state: EntryState, sign: int) -> None:
+        title = state.normalized_title if self._title_index is not None else None
+        if sign > 0:
+            self._duplicates.add(state.duplicate_keys)
+            if title is not None:
+                self._title_index.add(title)
+        else:
+            self._duplicates.remove(state.duplicate_keys)
+            if title is not None:
+                self._title_index.remove(title)
+        self.num_proceeding += sign * state.starts_with_proceedings
+        self.num_advances += sign * state.starts_with_advances
+
+    def check(self, entries: List[BibEntry]) -> List[BibEntry]:
+        """Check `entries` (a new parse of the same file) and return them, like check()."""
+        # filter unneeded entries
+        entries = [entry for entry in entries if not isinstance(entry, Others) and not isinstance(entry, Book)]
+
+        settings = (TITLE_SIMILARITY.threshold, TITLE_SIMILARITY.verify, TITLE_SIMILARITY.num_perm, TITLE_SIMILARITY.shingle_size)
+        if settings != self._settings:
+            # Build the title index again, from the entries of the previous run
+            self._settings = settings
+            self._title_index = TITLE_SIMILARITY.new_index() if TITLE_SIMILARITY.enabled else None
+            for states in self._states.values():
+                for state in states:
+                    state.assembled = None
+                    if self._title_index is not None and state.normalized_title is not None:
+                        self._title_index.add(state.normalized_title)
+
+        previous = self._states
+        previous_entries = self._entry_states
+        self._states = {}
+        self._entry_states = {}
+        states = []
+        self.num_rechecked = 0
+        for entry in entries:
+            state = previous_entries.pop(entry, None)
+            if state is not None and state.entry is entry and state.fields is entry.fields:
+                previous[state.fingerprint].remove(state)
+            else:
+                fingerprint = entry_fingerprint(entry)
+                reusable = previous.get(fingerprint)
+                if reusable:
+                    state = reusable.pop()
+                    state.adopt(entry)
+                else:
+                    state = EntryState(entry, fingerprint, self._registry, self._layout)
+                    self._count(state, +1)
+                    self.num_rechecked += 1
+            self._states.setdefault(state.fingerprint, []).append(state)
+            self._entry_states[entry] = state
+            states.append(state)
+
+        # Entries that were removed or edited leave the corpus-level state
+        for stale in previous.values():
+            for state in stale:
+                self._count(state, -1)
+
+        # Issues of the corpus-level rules without incremental state, run over all the entries
+        full_issues = []
+        for rule in self._full_rules:
+            self._registry.run(entries, (rule,))
+            full_issues.append([entry.issues for entry in entries])
+
+        duplicate_issues: Dict[Tuple[str, str], Issue] = {}
+        similar_issues: Dict[str, Optional[Issue]] = {}
+        title_index = self._title_index
+        majority = (self.num_proceeding, self.num_advances)
+        for index, (entry, state) in enumerate(zip(entries, states)):
+            duplicated = self._duplicates.duplicated(state.duplicate_keys)
+            is_proceedings = isinstance(entry, InProceedings)
+            title = state.normalized_title if title_index is not None else None
+            similar_version = title_index.version(title) if title is not None else None
+            assembled = (duplicated, similar_version, majority if is_proceedings else None)
+            if assembled == state.assembled and not full_issues:
+                # Nothing this entry's issues depend on has changed since the last run
+                continue
+            state.assembled = assembled
+
+            issues = []
+            entry_issues = iter(state.entry_issues)
+            full = iter(full_issues)
+            for rule in self._layout:
+                if isinstance(rule, tuple):
+                    issues.extend(next(entry_issues))
+                elif rule is DuplicateEntries:
+                    for kind, value, is_duplicate in zip(DUPLICATE_KINDS, state.duplicate_keys, duplicated):
+                        if is_duplicate:
+                            if (kind, value) not in duplicate_issues:
+                                duplicate_issues[kind, value] = duplicate_issue(kind, value)
+                            issues.append(duplicate_issues[kind, value])
+                elif rule is NearDuplicateTitles:
+                    if title is not None:
+                        if title not in similar_issues:
+                            similar_issues[title] = similar_title_issue(title_index, title)
+                        if similar_issues[title] is not None:
+                            issues.append(similar_issues[title])
+                elif rule is ProceedingsPrefix:
+                    if is_proceedings:
+                        issue = find_proceedings_advances_issue(entry, state.starts_with_proceedings,
+                                                                state.starts_with_advances, self.num_proceeding,
+                                                                self.num_advances)
+                        if issue is not None:
+                            issues.append(issue)
+                    else:
+                        issues.extend(state.article_prefix)
+                else:
+                    issues.extend(next(full)[index])
+            entry.issues = issues if issues else NO_ISSUES
+
+        return entries
@@ -0,0 +1,126 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bib_read import BibEntry
+from entry_table import EntryTable
+from title_similarity import normalize_title
+
+# What two entries may have in common to be duplicates, in the order their issues are reported
+DUPLICATE_KINDS = ('key', 'title', 'doi', 'arxiv')
+
+DOI_PREFIX_PATTERN = re.compile(r'^\s*(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+# New-style (1905.00001v2) and old-style (hep-th/9901001) arXiv identifiers, without the version
+ARXIV_ID_PATTERN = re.compile(r'(?<![\d.])(\d{4}\.\d{4,5}|[a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7})(?:v\d+)?(?!\d)', re.IGNORECASE)
+
+# Values of one entry, one per kind (None when it has none)
+DuplicateKeys = Tuple[Optional[str], ...]
+
+
+def canonical_doi(doi: str) -> Optional[str]:
+    """The DOI without resolver prefix, lowercased (DOIs are case-insensitive); None if empty."""
+    doi = DOI_PREFIX_PATTERN.sub('', doi).strip().lower()
+    return doi or None
+
+
+def canonical_title(title: str) -> Optional[str]:
+    """The normalized title (see normalize_title); None if empty."""
+    return normalize_title(title) or None if title else None
+
+
+def arxiv_id_in(text: str) -> Optional[str]:
+    """The first arXiv identifier in `text`, lowercased, if any."""
+    match = ARXIV_ID_PATTERN.search(text)
+    return match.group(1).lower() if match else None
+
+
+def arxiv_journal_id(journal: str) -> Optional[str]:
+    """The arXiv identifier in the journal field of a preprint (none for other journals)."""
+    return arxiv_id_in(journal) if 'arxiv' in journal.lower() else None
+
+
+def arxiv_id(entry: BibEntry) -> Optional[str]:
+    """The arXiv identifier in the entry's eprint field or, for preprints, its journal field."""
+    fields = entry.fields
+    eprint = fields.get('eprint')
+    if eprint:
+        match = ARXIV_ID_PATTERN.search(eprint)
+        if match:
+            return match.group(1).lower()
+    journal = fields.get('journal')
+    if journal and 'arxiv' in journal.lower():
+        match = ARXIV_ID_PATTERN.search(journal)
+        if match:
+            return match.group(1).lower()
+    return None
+
+
+def duplicate_keys(entry: BibEntry) -> DuplicateKeys:
+    """The citation key, canonical title, DOI and arXiv identifier of `entry`."""
+    title = entry.fields.get('title')
+    doi = entry.fields.get('doi')
+    return (entry.citation_key,
+            canonical_title(title),
+            canonical_doi(doi) if doi else None,
+            arxiv_id(entry))
+
+
+def duplicate_keys_table(table: EntryTable, rows: List[int]) -> List[DuplicateKeys]:
+    """duplicate_keys of the `rows` of `table`, normalizing every distinct title, DOI and arXiv identifier once."""
+    entries = table.entries
+    titles = table.row_values('title', canonical_title)
+    dois = table.row_values('doi', canonical_doi)
+    eprint_ids = table.row_values('eprint', arxiv_id_in)
+    journal_ids = table.row_values('journal', arxiv_journal_id)
+    return [(entries[row].citation_key, titles[row], dois[row], eprint_ids[row] or journal_ids[row]) for row in rows]
+
+
+class DuplicateIndex:
+    """
+    Counts of every citation key, canonical title, DOI and arXiv identifier.
+
+    One dict per kind, so adding, removing and looking up an entry are O(1)
+    and finding all collisions among n entries is O(n).
+    """
+
+    def __init__(self):
+        self._counts: List[Dict[str, int]] = [{} for _ in DUPLICATE_KINDS]
+
+    def add(self, keys: DuplicateKeys) -> None:
+        for counts, value in zip(self._counts, keys):
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+
+    def remove(self, keys: DuplicateKeys) -> None:
+        for counts, value in zip(self._counts, keys):
+            if value is not None:
+                count = counts[value] - 1
+                if count:
+                    counts[value] = count
+                else:
+                    del counts[value]
+
+    def duplicated(self, keys: DuplicateKeys) -> Tuple[bool, ...]:
+        """For each kind, whether another entry has the same value."""
+        return tuple(value is not None and counts[value] > 1 for counts, value in zip(self._counts, keys))
+
+
+def collision_groups(summaries: Iterable[DuplicateKeys]) -> List[Dict[str, List[int]]]:
+    """
+    Per kind, the values shared by several entries, with the indices of those entries.
+
+    Args:
+        summaries: duplicate_keys() of each entry, in order
+
+    Returns:
+        One {value: indices} dict per kind in DUPLICATE_KINDS, in order of first occurrence
+    """
+    members: List[Dict[str, List[int]]] = [{} for _ in DUPLICATE_KINDS]
+    for idx, keys in enumerate(summaries):
+        for kind_members, value in zip(members, keys):
+            if value is not None:
+                group = kind_members.get(value)
+                if group is None:
+                    kind_members[value] = [idx]
+                else:
+                    group.append(idx)
+    return [{value: group for value, group in kind_members.items() if len(group) > 1} for kind_members in members]
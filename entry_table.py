@@ -0,0 +1,209 @@
+from array import array
+from itertools import repeat
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from bib_read import BibEntry
+
+# Pseudo field name: the publication field of the entry type (journal or booktitle, see BibEntry.PUB_FIELD)
+PUB = 'pub'
+# Smaller tables are not worth importing numpy for
+NUMPY_MIN_ROWS = 100000
+# Row flags (one byte per row) to the digits of a bitmap
+_BIT_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+_numpy = None
+
+
+def numpy_module():
+    """numpy, imported on first use (it takes longer to import than the checker), or None if it is not installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def narrow(codes: array, count: int) -> Optional[bytes]:
+    """Codes below `count` (or -1) one byte per row, as code + 1, if `count` is small enough for it."""
+    if count >= 255:
+        return None
+    return bytes(map((1).__add__, codes))
+
+
+class StringColumn:
+    """
+    The values of one field in every row of an EntryTable.
+
+    Each distinct value is kept once, in `values`, and `codes` has the
+    number of each row's value in it (-1 where the row lacks the field).
+    """
+
+    __slots__ = ('name', 'values', 'codes', 'narrow_codes')
+
+    def __init__(self, name: str, values: List[str], codes: array):
+        self.name = name
+        self.values = values
+        self.codes = codes
+        self.narrow_codes = narrow(codes, len(values))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def value(self, row: int) -> Optional[str]:
+        code = self.codes[row]
+        return None if code < 0 else self.values[code]
+
+
+class EntryTable:
+    """
+    Entries stored by field rather than by entry, for rules that look at a whole column at once.
+
+    Rows are the entries, in order. Every row has a layout: its entry class
+    and the names of its fields, in order; a bibliography has few distinct
+    layouts, so what depends only on them (which fields are present, the
+    entry type) is worked out once per layout. Sets of rows are bitmaps
+    held in Python ints, bit i standing for row i, so they are combined
+    with &, | and ~ and turned back into rows with rows(). Field values are
+    read into a StringColumn the first time a column is asked for.
+
+    With numpy installed, bitmaps of wide columns are gathered and
+    unpacked with it; otherwise with bytes operations, which also run at C
+    speed but take a little longer. By default (`use_numpy` None) numpy is
+    only used for tables of at least NUMPY_MIN_ROWS rows.
+    """
+
+    def __init__(self, entries: Sequence[BibEntry], use_numpy: Optional[bool] = None):
+        self.entries = entries
+        if use_numpy is None:
+            use_numpy = len(entries) >= NUMPY_MIN_ROWS and numpy_module() is not None
+        self.numpy = numpy_module() if use_numpy else None
+        if use_numpy and self.numpy is None:
+            raise ImportError("numpy is not installed")
+
+        # Distinct (entry class, field names) and each row's one
+        layout_numbers: Dict[Tuple[Type[BibEntry], Tuple[str, ...]], int] = {}
+        setdefault = layout_numbers.setdefault
+        self.layout_codes = array('q', [setdefault((entry.__class__, tuple(entry.fields)), len(layout_numbers))
+                                        for entry in entries])
+        self.layouts: List[Tuple[Type[BibEntry], Tuple[str, ...]]] = list(layout_numbers)
+        self.narrow_layout_codes = narrow(self.layout_codes, len(self.layouts))
+        self._fields = [entry.fields for entry in entries]
+        # Parsed in full: the fields are dicts and can be read with dict.get
+        self._plain = all(fields.__class__ is dict for fields in self._fields)
+        self.all_rows = (1 << len(entries)) - 1
+        self._columns: Dict[str, StringColumn] = {}
+        self._masks: Dict[tuple, int] = {}
+        self._derived: Dict[tuple, list] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def column(self, name: str) -> StringColumn:
+        """The values of the field `name` (or of PUB) in every row."""
+        column = self._columns.get(name)
+        if column is None:
+            if name == PUB:
+                pub_fields = [entry_class.PUB_FIELD for entry_class, _ in self.layouts]
+                keys = map(pub_fields.__getitem__, self.layout_codes)
+            else:
+                keys = repeat(name)
+            if self._plain:
+                values = list(map(dict.get, self._fields, keys))
+            else:
+                values = [fields.get(key) if key is not None else None for fields, key in zip(self._fields, keys)]
+            # Number the distinct values in order of appearance
+            numbers = dict.fromkeys(values)
+            numbers.pop(None, None)
+            distinct = list(numbers)
+            numbers = dict(zip(distinct, range(len(distinct))))
+            numbers[None] = -1
+            column = self._columns[name] = StringColumn(name, distinct, array('q', map(numbers.__getitem__, values)))
+        return column
+
+    def bitmap(self, codes: array, flags: Sequence[int], narrow_codes: Optional[bytes] = None) -> int:
+        """
+        The rows whose code (into `flags`; -1 for none) has a true flag.
+
+        `narrow_codes`, the same codes as made by narrow(), if any, are
+        looked up faster.
+        """
+        if not len(codes):
+            return 0
+        flag_bytes = bytes(1 if flag else 0 for flag in flags)
+        if narrow_codes is not None:
+            row_flags = narrow_codes.translate((b'\x00' + flag_bytes).ljust(256, b'\x00'))
+        else:
+            np = self.numpy
+            if np is not None:
+                row_flags = np.frombuffer(flag_bytes + b'\x00', np.uint8)[np.frombuffer(codes, np.int64)]
+                return int.from_bytes(np.packbits(row_flags, bitorder='little').tobytes(), 'little')
+            row_flags = bytes(map((flag_bytes + b'\x00').__getitem__, codes))
+        return int(row_flags.translate(_BIT_DIGITS)[::-1], 2)
+
+    def column_bitmap(self, column: StringColumn, flags: Sequence[int]) -> int:
+        """The rows whose value in `column` has a true flag (by its number in column.values)."""
+        return self.bitmap(column.codes, flags, column.narrow_codes)
+
+    def rows(self, mask: int) -> List[int]:
+        """The rows in the bitmap `mask`, in order."""
+        if not mask:
+            return []
+        np = self.numpy
+        if np is not None:
+            data = np.frombuffer(mask.to_bytes((len(self.entries) + 7) // 8, 'little'), np.uint8)
+            return np.flatnonzero(np.unpackbits(data, bitorder='little')).tolist()
+        digits = bin(mask)[:1:-1]
+        rows = []
+        row = digits.find('1')
+        while row >= 0:
+            rows.append(row)
+            row = digits.find('1', row + 1)
+        return rows
+
+    @staticmethod
+    def first(mask: int) -> int:
+        """The first row in the (non-empty) bitmap `mask`."""
+        return (mask & -mask).bit_length() - 1
+
+    def row_values(self, name: str, func: Optional[Callable[[str], object]] = None, missing: object = None) -> list:
+        """
+        The value of the field `name` in every row, or `missing` where there is none.
+
+        With `func`, func(value) instead of each value: it is called once per
+        distinct value, and the result is kept for other callers with the
+        same field and function.
+        """
+        key = (name, func)
+        derived = self._derived.get(key)
+        if derived is None:
+            values = self.column(name).values
+            derived = self._derived[key] = values if func is None else list(map(func, values))
+        codes = self.column(name).codes
+        return list(map((derived + [missing]).__getitem__, codes))
+
+    def rows_with(self, fields: Sequence[str] = (), entry_types: Optional[Tuple[Type[BibEntry], ...]] = None) -> int:
+        """The rows of `entry_types` (default: any) that have all of `fields` (PUB: the entry type's own)."""
+        key = (tuple(fields), entry_types)
+        mask = self._masks.get(key)
+        if mask is None:
+            flags = [(entry_types is None or issubclass(entry_class, entry_types))
+                     and all((entry_class.PUB_FIELD if name == PUB else name) in names for name in fields)
+                     for entry_class, names in self.layouts]
+            mask = self._masks[key] = self.bitmap(self.layout_codes, flags, self.narrow_layout_codes)
+        return mask
+
+    def map_values(self, name: str, mask: int, func: Callable[[str], Sequence]) -> Dict[int, Sequence]:
+        """
+        Apply `func` to the field `name` of the rows in `mask` (which must all have it), once per distinct value.
+
+        Returns:
+            {row: func(value)} for the rows where the result is not empty
+        """
+        column = self.column(name)
+        results = [func(value) for value in column.values]
+        hits = mask & self.column_bitmap(column, results)
+        codes = column.codes
+        return {row: results[codes[row]] for row in self.rows(hits)}
@@ -1,9 +1,17 @@
-import webbrowser
+import os
+import html
+import json
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
 from enum import Enum
 
-from issue import IssueLevel, get_issue_legend
+from issue import ISSUE_CODES, ISSUE_TYPES, IssueLevel, IssueStats, IssueStore, get_issue_legend
+from profiler import Profile, format_bytes, phase
 
 class Color(Enum):
     BLOCK = '#f6f6f6'
@@ -12,191 +20,517 @@ class Color(Enum):
     ERROR = '#FF0000'
     HYPERLINK = '#88A3E2'
 
-def add_html_settings(content: str, entries: List) -> str:
-    """生成一个简单的 HTML 文件，包含自定义内容"""
-    html_template = f"""
+NUM_LEVELS = len(IssueLevel)
+REPORT_DATA_START = b'<script type="application/json" id="report-data">'
+REPORT_DATA_END = b'</script>'
+
+def html_page_parts(stats: IssueStats, refresh: Optional[int] = None) -> Tuple[str, str]:
+    """报告页面在条目数据之前和之后的部分; `stats` 是检查时统计的问题数, `refresh` 秒后浏览器自动重新加载"""
+    refresh_meta = f'<meta http-equiv="refresh" content="{refresh}">' if refresh else ''
+    head = f"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        {refresh_meta}
         <title>Bib File Checker</title>
         <style>
             body {{ font-family: Arial, sans-serif; padding: 20px; }}
             .content {{ background: {Color.BLOCK.value}; padding: 15px; border-radius: 5px; }}
+            .bib-entry {{ display: flow-root; padding-bottom: 16px; }}
+            .bib-entry .content {{ white-space: pre-wrap; tab-size: 4; }}
+            #entry-list {{ overflow-anchor: none; }}
         </style>
     </head>
-    {control_html(entries)}
-    {content}
-    </html>
+    {control_html(stats)}
     """
-    return html_template
-
-def issue_html_div(header: str, entry_title: str, content: str, entry_id: int) -> str:
-    html_content = f"""
-    <div class="bib-entry" data-entry-id="{entry_id}">
-        <h1>{header}</h1>
-        {search_paper(entry_title)}
-        <div class="content">
-            {content}
-        </div>
-    </div>
+    tail = f"""
+    <div id="entry-list"><div id="list-top"></div><div id="list-items"></div><div id="list-bottom"></div></div>
+    <script>
+    const HYPERLINK_COLOR = '{Color.HYPERLINK.value}';
+    {REPORT_SCRIPT}
+    </script>
+    </html>
     """
-    return html_content
+    return head, tail
 
-def control_html(entries: List) -> str:
-    issues = [issue.get_issue_type() for entry in entries for issue in entry.issues]
-    problems = set(issues)
-    problems = [(p, get_issue_legend(p)) for p in problems]
+def control_html(stats: IssueStats) -> str:
+    # 问题类型按第一次出现的顺序, 每次生成的报告相同
+    problems = [(p, get_issue_legend(p), count) for p, count in stats.types.items()]
     problem_str = [f'''
         <div>
-            <input type="checkbox" class="type-filter" data-type="{value}" checked> <b>[{text}]</b>
+            <input type="checkbox" class="type-filter" data-type="{value}" checked> <b>[{text}]</b> ({count})
         </div>
-    ''' for value, text in problems]
+    ''' for value, text, count in problems]
     problems = "".join(problem_str)
-    
+
     control_str = f'''
     <!-- Filter -->
     <div id="filter-panel">
         <h3>Filtering Errors or Warnings</h3>
-        
+
         <div class="filter-group">
             <div>
-                <input type="checkbox" class="level-filter" data-level="error" checked> <font color={Color.ERROR.value} class="error">[Error]</font>
+                <input type="checkbox" class="level-filter" data-level="error" checked> <font color={Color.ERROR.value} class="error">[Error]</font> ({stats.levels[IssueLevel.ERROR]})
             </div>
             <div>
-                <input type="checkbox" class="level-filter" data-level="warning" checked> <font color={Color.WARNING.value} class="warning">[Warning]</font>
+                <input type="checkbox" class="level-filter" data-level="warning" checked> <font color={Color.WARNING.value} class="warning">[Warning]</font> ({stats.levels[IssueLevel.WARNING]})
             </div>
             <div>
-                <input type="checkbox" class="level-filter" data-level="notice" checked> <font color={Color.NOTICE.value} class="notice">[Notice]</font>
+                <input type="checkbox" class="level-filter" data-level="notice" checked> <font color={Color.NOTICE.value} class="notice">[Notice]</font> ({stats.levels[IssueLevel.NOTICE]})
             </div>
         </div>
-        
+
         <h3>Filtering by Problems</h3>
         <div class="filter-group">
             {problems}
         </div>
+        <p id="entry-count"></p>
     </div>
-
-    <script>
-    // 过滤功能实现
-    document.querySelectorAll('.level-filter, .type-filter').forEach(filter => {{
-        filter.addEventListener('change', updateDisplay);
-    }});
-
-    function updateDisplay() {{
-        // 获取选中的过滤条件
-        const showErrors = document.querySelector('.level-filter[data-level="error"]').checked;
-        const showWarnings = document.querySelector('.level-filter[data-level="warning"]').checked;
-        const showNotices = document.querySelector('.level-filter[data-level="notice"]').checked;
-        const selectedTypes = new Set(
-            [...document.querySelectorAll('.type-filter:checked')].map(f => f.dataset.type)
-        );
-        
-        // 遍历所有问题
-        document.querySelectorAll('.issue').forEach(issueEl => {{
-            const level = issueEl.dataset.level;
-            const type = issueEl.dataset.type;
-            
-            // 检查是否应该显示
-            const shouldShow = (
-                ((level === 'error' && showErrors) || 
-                (level === 'warning' && showWarnings) ||
-                (level === 'notice' && showNotices)) &&
-                selectedTypes.has(type)
-            );
-            
-            issueEl.style.display = shouldShow ? 'block' : 'none';
-        }});
-        
-        // 新增：检查每个论文条目是否有可见的错误/警告
-        document.querySelectorAll('.bib-entry').forEach(entryDiv => {{
-            // 查找该条目中所有可见的问题元素
-            const visibleIssues = entryDiv.querySelectorAll('.issue[style="display: block;"]');
-            
-            // 如果有至少一个可见的问题，显示整个条目；否则隐藏
-            if (visibleIssues.length > 0) {{
-                entryDiv.style.display = 'block';
-            }} else {{
-                entryDiv.style.display = 'none';
-            }}
-        }});
-    }}
-    updateDisplay();
-    </script>
     '''
-    
+
     return control_str
 
-def save_and_open_html(html_str: str, filename: str):
-    """保存 HTML 并自动用浏览器打开"""
+# 报告页面的脚本: 条目从 JSON 数据中按需生成, 只有滚动到的条目才在 DOM 中;
+# 过滤时只遍历倒排索引中选中的 (问题类型, 级别) 对应的条目
+REPORT_SCRIPT = r'''
+    (function () {
+        const data = JSON.parse(document.getElementById('report-data').textContent);
+        const entries = data.entries;
+        const levels = data.levels;
+        const numLevels = levels.length;
+        const searchSites = [
+            ['Google Scholar', 'https://scholar.google.com/scholar?q=', ''],
+            ['DBLP', 'https://dblp.org/search?q=', ''],
+            ['Semantic Scholar', 'https://www.semanticscholar.org/search?q=', ''],
+            ['Google', 'https://www.google.com/search?q=', ''],
+            ['Github', 'https://github.com/search?q=', '&type=repositories'],
+        ];
+        // 视口上下多生成的高度 (像素)
+        const overscan = 1500;
+
+        const list = document.getElementById('entry-list');
+        const listTop = document.getElementById('list-top');
+        const listItems = document.getElementById('list-items');
+        const listBottom = document.getElementById('list-bottom');
+        const entryCount = document.getElementById('entry-count');
+
+        // 每个条目的高度: 生成过的是实际高度, 否则是估计值 (0 表示还没有估计)
+        const heights = new Float64Array(entries.length);
+        // 过滤时给条目去重用
+        const stamps = new Uint32Array(entries.length);
+        let generation = 0;
+        let selected = new Uint8Array(data.types.length * numLevels);
+        // 当前显示的条目 (在 entries 中的位置, 升序) 和它们的累计高度
+        let visible = new Int32Array(0);
+        let offsets = new Float64Array(1);
+        let rendered = new Map();
+        let pending = false;
+
+        function height(position) {
+            if (!heights[position]) {
+                const entry = entries[position];
+                heights[position] = 110 + 20 * (entry[4].split('\n').length + entry[5].length);
+            }
+            return heights[position];
+        }
+
+        function layout() {
+            offsets = new Float64Array(visible.length + 1);
+            for (let i = 0; i < visible.length; i++) {
+                offsets[i + 1] = offsets[i] + height(visible[i]);
+            }
+        }
+
+        function block(position) {
+            const [id, line, file, title, text, issues] = entries[position];
+            const div = document.createElement('div');
+            div.className = 'bib-entry';
+            div.dataset.entryId = id;
+            const header = document.createElement('h1');
+            header.textContent = (file >= 0 ? data.files[file] + ', ' : '') + 'Line ' + line;
+            div.append(header, 'Search this paper in ');
+            searchSites.forEach(([name, url, suffix], i) => {
+                const link = document.createElement('a');
+                link.target = '_blank';
+                link.style.color = HYPERLINK_COLOR;
+                link.href = url + encodeURIComponent(title) + suffix;
+                link.textContent = name;
+                div.append(link, i + 1 < searchSites.length ? ', ' : '.');
+            });
+            const content = document.createElement('div');
+            content.className = 'content';
+            content.append(text);
+            for (const [key, message] of issues) {
+                if (!selected[key]) {
+                    continue;
+                }
+                const [level, label, color] = levels[key % numLevels];
+                const issue = document.createElement('div');
+                issue.className = 'issue ' + level;
+                const prefix = document.createElement('font');
+                prefix.color = color;
+                prefix.className = level;
+                prefix.textContent = '[' + label + ']';
+                const legend = document.createElement('b');
+                legend.textContent = '[' + data.types[Math.floor(key / numLevels)][1] + ']';
+                issue.append(prefix, ' ', legend, ' ', message);
+                content.append(issue);
+            }
+            div.append(content);
+            return div;
+        }
+
+        function render() {
+            pending = false;
+            const start = list.getBoundingClientRect().top + window.scrollY;
+            const top = window.scrollY - start - overscan;
+            const bottom = window.scrollY - start + window.innerHeight + overscan;
+            // 第一个底部在 top 之下的条目
+            let low = 0, high = visible.length;
+            while (low < high) {
+                const middle = (low + high) >> 1;
+                if (offsets[middle + 1] <= top) low = middle + 1; else high = middle;
+            }
+            const first = low;
+            let last = first;
+            while (last < visible.length && offsets[last] < bottom) {
+                last++;
+            }
+
+            const blocks = new Map();
+            for (let i = first; i < last; i++) {
+                const position = visible[i];
+                blocks.set(position, rendered.get(position) || block(position));
+            }
+            rendered = blocks;
+            listItems.replaceChildren(...blocks.values());
+
+            // 用实际高度代替估计值
+            let changed = false;
+            for (const [position, div] of blocks) {
+                const actual = div.offsetHeight;
+                if (actual !== heights[position]) {
+                    heights[position] = actual;
+                    changed = true;
+                }
+            }
+            if (changed) {
+                layout();
+            }
+            listTop.style.height = offsets[first] + 'px';
+            listBottom.style.height = (offsets[visible.length] - offsets[last]) + 'px';
+        }
+
+        function schedule() {
+            if (!pending) {
+                pending = true;
+                requestAnimationFrame(render);
+            }
+        }
+
+        function updateDisplay() {
+            // 获取选中的过滤条件
+            const types = new Set([...document.querySelectorAll('.type-filter:checked')].map(f => f.dataset.type));
+            const shownLevels = new Set([...document.querySelectorAll('.level-filter:checked')].map(f => f.dataset.level));
+            selected = new Uint8Array(data.types.length * numLevels);
+            data.types.forEach(([type], t) => {
+                if (types.has(type)) {
+                    levels.forEach(([level], l) => {
+                        if (shownLevels.has(level)) selected[t * numLevels + l] = 1;
+                    });
+                }
+            });
+
+            // 合并选中的键的条目列表
+            generation++;
+            const found = [];
+            for (const key in data.index) {
+                if (!selected[key]) {
+                    continue;
+                }
+                for (const position of data.index[key]) {
+                    if (stamps[position] !== generation) {
+                        stamps[position] = generation;
+                        found.push(position);
+                    }
+                }
+            }
+            visible = Int32Array.from(found).sort();
+            entryCount.textContent = visible.length + ' of ' + entries.length + ' entries with issues shown';
+            rendered = new Map();
+            layout();
+            render();
+        }
+
+        document.querySelectorAll('.level-filter, .type-filter').forEach(filter => {
+            filter.addEventListener('change', updateDisplay);
+        });
+        window.addEventListener('scroll', schedule, {passive: true});
+        window.addEventListener('resize', () => {
+            heights.fill(0);
+            layout();
+            schedule();
+        });
+        updateDisplay();
+    })();
+'''
+
+@lru_cache(maxsize=None)
+def issue_type_codes() -> Dict[str, int]:
+    """每种问题类型的编号 (issue.py 中注册的固定编号)"""
+    return {name: issue_type.code for name, issue_type in ISSUE_TYPES.items()}
+
+def json_for_script(value) -> str:
+    """紧凑的 JSON, 其中的 '<' 已转义, 可以直接放在 <script> 中"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('<', '\\u003c')
+
+def entry_record(entry) -> Tuple[bytes, Tuple[int, ...]]:
+    """
+    条目记录中不随位置变化的部分 (已编码), 以及它的问题的索引键.
+
+    记录是 [编号, 行号, 文件, 标题, 原文, [[键, 信息], ...]], 这里返回从标题开始的部分;
+    键 = 类型编号 * NUM_LEVELS + 级别编号
+    """
+    codes = issue_type_codes()
+    issues = []
+    for issue in entry.issues:
+        issues.append([codes[issue.get_issue_type()] * NUM_LEVELS + issue.issue_level.code, issue.message])
+    return encode_record(entry, issues)
+
+def encode_record(entry, issues: List[list]) -> Tuple[bytes, Tuple[int, ...]]:
+    """entry_record, 问题已经是 [[键, 信息], ...]"""
+    record = json_for_script([entry.title if entry.title is not None else "", str(entry), issues])
+    return record[1:].encode("utf-8"), tuple(sorted({key for key, _ in issues}))
+
+class EntryHtmlCache:
+    """
+    Encoded report records, kept between reports of successive versions of a file.
+
+    A record is cached per entry object and issue list, which
+    IncrementalParser and IncrementalChecker both keep as long as the entry
+    and its issues are unchanged. Its id and line number are written apart,
+    since those move whenever an entry above changes.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._previous = {}
+
+    def start(self) -> None:
+        """Begin a new report; records of entries not in it are dropped at the next start."""
+        self._previous = self._records
+        self._records = {}
+
+    def record(self, entry) -> Tuple[bytes, Tuple[int, ...]]:
+        """entry_record(entry), from the previous report if the entry and its issues are unchanged."""
+        cached = self._previous.get(entry)
+        if cached is None or cached[0] is not entry.issues:
+            cached = (entry.issues, *entry_record(entry))
+        self._records[entry] = cached
+        return cached[1], cached[2]
+
+class ReportPayload:
+    """
+    报告的 JSON 数据, 逐个条目写入文件, 不在内存中保留整个报告.
+
+    写完条目后写出倒排索引: 每个键 (问题类型和级别) -> 有这种问题的条目在记录列表中的位置 (升序),
+    页面过滤时只需要遍历选中的键对应的条目.
+    """
+
+    def __init__(self, file: BinaryIO, cache: Optional[EntryHtmlCache] = None):
+        self.file = file
+        self.cache = cache
+        self.index: Dict[int, List[int]] = {}
+        self.count = 0
+        if cache is not None:
+            cache.start()
+        file.write(REPORT_DATA_START + b'{"entries":[')
+
+    def add(self, entries, first_id: int = 0, file_index: int = -1, store: Optional[IssueStore] = None) -> None:
+        """
+        写入有问题的条目, 编号从 `first_id` 开始; `file_index` 是批量检查中文件的序号.
+
+        有 `store` (由 `entries` 建立) 时问题从它的列中读取, 不为每个问题创建对象
+        """
+        if store is not None:
+            for entry_index, records in groupby(store.records(entries), key=itemgetter(0)):
+                entry = entries[entry_index]
+                issues = [[issue_type.code * NUM_LEVELS + level.code, message]
+                          for _, issue_type, level, _, message in records]
+                self._write(first_id + entry_index, file_index, entry, *encode_record(entry, issues))
+            return
+
+        for i, entry in enumerate(entries, first_id):
+            if entry.get_num_issues() == 0:
+                continue
+            self._write(i, file_index, entry, *(self.cache.record(entry) if self.cache is not None else entry_record(entry)))
+
+    def _write(self, entry_id: int, file_index: int, entry, record: bytes, keys: Tuple[int, ...]) -> None:
+        index = self.index
+        self.file.write(b'%s[%d,%d,%d,' % (b',' if self.count else b'', entry_id, entry.line_number, file_index))
+        self.file.write(record)
+        for key in keys:
+            positions = index.get(key)
+            if positions is None:
+                index[key] = [self.count]
+            else:
+                positions.append(self.count)
+        self.count += 1
+
+    def finish(self, files: Sequence[str] = ()) -> None:
+        """写入问题类型, 级别, 文件名和倒排索引, 结束数据"""
+        # 按编号排列; 没有使用的编号留空
+        types = [["", ""]] * (max(ISSUE_CODES) + 1)
+        for code, issue_type in ISSUE_CODES.items():
+            types[code] = [issue_type.name, issue_type.legend]
+        levels = [[level.text.lower(), level.text.capitalize(), Color[level.name].value] for level in IssueLevel]
+        tables = json_for_script({"types": types, "levels": levels, "files": list(files), "index": self.index})
+        self.file.write(b'],' + tables[1:].encode("utf-8") + REPORT_DATA_END)
+
+@contextmanager
+def atomic_output(filename: str) -> Iterator[BinaryIO]:
+    """以二进制写入的临时文件, 正常结束时替换 `filename`, 出错时删除"""
     file_path = Path(filename)
-    file_path.write_text(html_str, encoding="utf-8")
-    
+    descriptor, temp_path = tempfile.mkstemp(dir=file_path.absolute().parent, suffix='.tmp')
+    try:
+        # mkstemp creates the file readable by its owner only
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        with os.fdopen(descriptor, 'wb') as file:
+            yield file
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def open_in_browser(file_path: Path) -> None:
+    # Imported here: it starts slowly, and only opening a report needs it
+    import webbrowser
     webbrowser.open(f"file://{file_path.absolute()}")
 
-def issue_to_div(issue) -> str:
-    if issue.issue_level == IssueLevel.NOTICE:
-        prefix = f'<font color={Color.NOTICE.value} class="notice">[Notice]</font> <b>[{issue.legend}]</b>'
-    elif issue.issue_level == IssueLevel.WARNING:
-        prefix = f'<font color={Color.WARNING.value} class="warning">[Warning]</font> <b>[{issue.legend}]</b>'
-    elif issue.issue_level == IssueLevel.ERROR:
-        prefix = f'<font color={Color.ERROR.value} class="error">[Error]</font> <b>[{issue.legend}]</b>'
-    else:
-        assert False
-        
-    return f'''\
-        <div class="issue {issue.issue_level.text.lower()}" data-type="{issue.get_issue_type()}" data-level="{issue.issue_level.text.lower()}"> \
-            {prefix} {issue.message} \
-        </div> \
-    '''
-    
-def issue_convert_html(entries) -> str:
-    html_str = ""
-    
-    for i, entry in enumerate(entries):
-        if entry.get_num_issues() == 0:
+def missing_citations_html(missing) -> str:
+    """.tex 中引用了但 .bib 中没有的条目, 以及引用的位置"""
+    if not missing:
+        return ""
+    rows = []
+    for key, places in missing.items():
+        where = ', '.join(f'{path}:{line}' for path, line in places)
+        rows.append(f'<div><font color={Color.ERROR.value} class="error">[Error]</font> <b>{html.escape(key)}</b>: cited in {html.escape(where)}</div>')
+    return f"""
+    <div class="missing-citations">
+        <h1>Cited but not in the .bib file ({len(missing)})</h1>
+        <div class="content">
+            {''.join(rows)}
+        </div>
+    </div>
+    """
+
+def profile_html(profile: Profile) -> str:
+    """--profile 的各阶段耗时表 (报告生成之前的阶段), 以及同样内容的 JSON"""
+    rows = []
+    for stats in profile.phases.values():
+        cells = [stats.name, stats.calls, f"{stats.seconds * 1000:.1f} ms", stats.entries, stats.issues, format_bytes(stats.peak_bytes)]
+        rows.append('<tr>' + ''.join(f'<td>{html.escape("-" if cell is None else str(cell))}</td>' for cell in cells) + '</tr>')
+    return f"""
+    <details class="profile">
+        <summary>Profile (peak memory {html.escape(format_bytes(profile.peak_bytes))})</summary>
+        <table>
+            <tr><th>Phase</th><th>Calls</th><th>Time</th><th>Entries</th><th>Issues</th><th>Peak memory</th></tr>
+            {''.join(rows)}
+        </table>
+    </details>
+    <script type="application/json" id="profile-data">{json_for_script(profile.as_dict())}</script>
+    """
+
+def write_html_report(file: BinaryIO, entries, stats: Optional[IssueStats] = None, refresh: Optional[int] = None,
+                      header: str = "", cache: Optional[EntryHtmlCache] = None,
+                      store: Optional[IssueStore] = None) -> None:
+    """
+    Write the report to the binary `file` in one pass: page head and filter panel, `header`, entry data, tail.
+
+    Args:
+        file: Where the encoded HTML goes
+        entries: Checked entries; only those with issues are shown
+        stats: Issue counts gathered while checking, for the filter panel (counted from `entries` if None)
+        refresh: Seconds after which the browser reloads the report
+        header: HTML put before the entries
+        cache: Records of a previous report to reuse
+        store: The issues of `entries`, read instead of the entries' issue lists
+    """
+    if stats is None:
+        stats = store.stats() if store is not None else IssueStats.from_entries(entries)
+    head, tail = html_page_parts(stats, refresh=refresh)
+    file.write(head.encode("utf-8"))
+    file.write(header.encode("utf-8"))
+    payload = ReportPayload(file, cache)
+    payload.add(entries, store=store)
+    payload.finish()
+    file.write(tail.encode("utf-8"))
+
+def html_open(entries, file_name, header: str = "", stats: Optional[IssueStats] = None,
+              profile: Optional[Profile] = None, store: Optional[IssueStore] = None) -> None:
+    open_in_browser(html_save(entries, file_name, header=header, stats=stats, profile=profile, store=store))
+
+def html_save(entries, file_name, cache: Optional[EntryHtmlCache] = None, refresh: Optional[int] = None, header: str = "",
+              stats: Optional[IssueStats] = None, profile: Optional[Profile] = None,
+              store: Optional[IssueStore] = None) -> Path:
+    """Write the report like html_open, without opening a browser; with a profile, as the 'render' and 'write' phases."""
+    with phase(profile, 'render'), atomic_output(file_name) as file:
+        if profile is not None:
+            file = profile.timed_file(file)
+        write_html_report(file, entries, stats=stats, refresh=refresh, header=header, cache=cache, store=store)
+    return Path(file_name)
+
+def batch_summary_html(results) -> str:
+    """批量检查的汇总表: 每个文件的条目数和各级别问题数"""
+    rows = []
+    for result in results:
+        path = html.escape(result.path)
+        if result.error is not None:
+            rows.append(f'<tr><td>{path}</td><td colspan="4"><font color={Color.ERROR.value}>{html.escape(result.error)}</font></td></tr>')
             continue
-        
-        entry_str = str(entry)
-        for issue in entry.issues:
-            entry_str += issue_to_div(issue)
-        
-        entry_str = entry_str.replace("\n", "<br>").replace("\t", "&emsp;&emsp;")
-        
-        entry_title = entry.title if entry.title is not None else ""
-        
-        html_str += issue_html_div(f'Line {entry.line_number}', entry_title, entry_str, i)
-    
-    return html_str
-
-def search_paper(paper_title: str) -> str:
-    search_html_str = f'''Search this paper in \
-        <a target="_blank" style="color:{Color.HYPERLINK.value}" href="https://scholar.google.com/scholar?q={paper_title.replace(' ', '+')}">Google Scholar</a>, \
-        <a target="_blank" style="color:{Color.HYPERLINK.value}" href="https://dblp.org/search?q={paper_title.replace(' ', '%20')}">DBLP</a>, \
-        <a target="_blank" style="color:{Color.HYPERLINK.value}" href="https://www.semanticscholar.org/search?q={paper_title.replace(' ', '%20')}">Semantic Scholar</a>, \
-        <a target="_blank" style="color:{Color.HYPERLINK.value}" href="https://www.google.com/search?q={paper_title.replace(' ', '+')}">Google</a>, \
-        <a target="_blank" style="color:{Color.HYPERLINK.value}" href="https://github.com/search?q={paper_title.replace(' ', '%20')}&type=repositories">Github</a>. \
-    '''
-    
-    return search_html_str
-    
-def html_open(entries, file_name) -> None:
-    warning_error_html_str = issue_convert_html(entries)
-    html_content = add_html_settings(warning_error_html_str, entries)
-    save_and_open_html(html_content, file_name)
+        counts = result.count_issues()
+        rows.append(f'<tr><td>{path}</td><td>{len(result.entries)}</td><td>{counts[IssueLevel.ERROR]}</td>'
+                    f'<td>{counts[IssueLevel.WARNING]}</td><td>{counts[IssueLevel.NOTICE]}</td></tr>')
+    return f"""
+    <h2>{len(results)} files</h2>
+    <table>
+        <tr><th>File</th><th>Entries</th><th>Errors</th><th>Warnings</th><th>Notices</th></tr>
+        {''.join(rows)}
+    </table>
+    """
 
-if __name__ == "__main__":
-    python_str = """
-    <p>这是 Python 字符串生成的 HTML！</p>
-    <ul>
-        <li>列表项 1</li>
-        <li>列表项 2</li>
-        <li>列表项 3</li>
-    </ul>
+def html_batch_open(results, file_name, open_browser: bool = True) -> None:
     """
-    
-    html_content = issue_html_div('Python-Generated HTML', python_str)
-    html_content = html_content + html_content
-    html_content = add_html_settings(html_content)
-    save_and_open_html(html_content)
\ No newline at end of file
+    一个报告包含一批文件的所有问题; 条目编号在所有文件中唯一, 每个条目标出所在的文件.
+
+    每个文件的问题写入前存入 IssueStore, 条目的问题列表随之清空
+    """
+    stats = IssueStats()
+    for result in results:
+        stats.update(result.stats)
+    head, tail = html_page_parts(stats)
+    with atomic_output(file_name) as file:
+        file.write(head.encode("utf-8"))
+        file.write(batch_summary_html(results).encode("utf-8"))
+        payload = ReportPayload(file)
+        entry_id = 0
+        for i, result in enumerate(results):
+            payload.add(result.entries, entry_id, i, store=IssueStore.from_entries(result.entries, release=True))
+            entry_id += len(result.entries)
+        payload.finish([result.path for result in results])
+        file.write(tail.encode("utf-8"))
+    if open_browser:
+        open_in_browser(Path(file_name))
+
+if __name__ == "__main__":
+    from bib_parser import BibParser
+    from check_bib import check
+
+    stats = IssueStats()
+    entries = check(BibParser.parse_file("input.bib"), stats=stats)
+    html_open(entries, "output.html", stats=stats)
@@ -1,7 +1,8 @@
+from array import array
 from enum import Enum
-from typing import List
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
-from bib_read import BibEntry
+from bib_read import BibEntry, NO_ISSUES
 
 class IssueLevel(Enum):
     NOTICE = (0, 'NOTICE')
@@ -12,11 +13,70 @@ class IssueLevel(Enum):
         self.code = code
         self.text = text
     
+class IssueType(NamedTuple):
+    """What is registered for an Issue subclass: its stable code, legend, usual level and fields."""
+    code: int
+    name: str
+    cls: type
+    legend: str
+    level: IssueLevel
+    # Names of the values an issue of this type carries besides its entry and level, in order
+    fields: Tuple[str, ...]
+
+# Every issue type by class name, in the order they are defined, and by code; see Issue.__init_subclass__
+ISSUE_TYPES: Dict[str, IssueType] = {}
+ISSUE_CODES: Dict[int, IssueType] = {}
+
 class Issue:
+    """
+    A problem found in an entry.
+
+    Subclasses register themselves with class keywords:
+
+        class IssueX(Issue, code=..., legend='...', level=IssueLevel.ERROR):
+            __slots__ = ('value',)
+
+    The code identifies the type in reports and exports and must not change
+    nor be reused once released. The level is the one issues of the type
+    usually have; a check may still report a given issue at another one.
+    Instances keep only their entry, level and fields (no __dict__), and
+    their message is formatted when it is read.
+    """
+    __slots__ = ('entry', 'issue_level')
+    # Set on every registered subclass
+    legend: str = None
+    issue_type: IssueType = None
+    
+    def __init_subclass__(cls, code: Optional[int] = None, legend: Optional[str] = None,
+                          level: Optional[IssueLevel] = None, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if code is None:
+            return
+        if code in ISSUE_CODES:
+            raise ValueError(f"{cls.__name__} and {ISSUE_CODES[code].name} have the same issue code {code}")
+        fields = tuple(name for klass in reversed(cls.__mro__) if klass is not Issue and issubclass(klass, Issue)
+                       for name in klass.__dict__.get('__slots__', ()))
+        cls.legend = legend
+        cls.issue_type = ISSUE_TYPES[cls.__name__] = ISSUE_CODES[code] = IssueType(code, cls.__name__, cls, legend, level, fields)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel):
         self.entry: BibEntry = entry
         self.issue_level: IssueLevel = issue_level
-        self.legend = get_issue_legend(self.__class__.__name__)
+    
+    def assign(self, entry: BibEntry, issue_level: IssueLevel, args: Sequence) -> 'Issue':
+        """Make this the issue of `entry` with `args` as its fields, in the order of its type's `fields` (see IssueStore)."""
+        self.entry = entry
+        self.issue_level = issue_level
+        for name, value in zip(self.issue_type.fields, args):
+            setattr(self, name, value)
+        return self
+    
+    def args(self) -> tuple:
+        """Values of the fields of the issue's type, in order."""
+        return tuple(getattr(self, name) for name in self.issue_type.fields)
+    
+    def fields(self) -> Dict[str, object]:
+        return dict(zip(self.issue_type.fields, self.args()))
     
     @property
     def message(self) -> str:
@@ -28,7 +88,9 @@ class Issue:
     def __str__(self) -> str:
         return self.message
     
-class IssueNotIncludedKeys(Issue):
+class IssueNotIncludedKeys(Issue, code=0, legend='Not included keys', level=IssueLevel.ERROR):
+    __slots__ = ('not_included_keys',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, not_included_keys: List[str]):
         super().__init__(entry, issue_level)
         self.not_included_keys = not_included_keys
@@ -37,7 +99,9 @@ class IssueNotIncludedKeys(Issue):
     def message(self):
         return f"This {self.entry.entry_type} paper does not have fields: {', '.join(self.not_included_keys)}."
 
-class IssueRedundantKeys(Issue):
+class IssueRedundantKeys(Issue, code=1, legend='Include redundant keys', level=IssueLevel.ERROR):
+    __slots__ = ('redundant_keys',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, redundant_keys: List[str]):
         super().__init__(entry, issue_level)
         self.redundant_keys = redundant_keys
@@ -46,7 +110,9 @@ class IssueRedundantKeys(Issue):
     def message(self):
         return f"This {self.entry.entry_type} paper have redundant fields: {', '.join(self.redundant_keys)}."
 
-class IssueMultipleEntryKey(Issue):
+class IssueMultipleEntryKey(Issue, code=2, legend='Mulitple entry key', level=IssueLevel.ERROR):
+    __slots__ = ('cit_key',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, cit_key: str):
         super().__init__(entry, issue_level)
         self.cit_key = cit_key
@@ -55,7 +121,9 @@ class IssueMultipleEntryKey(Issue):
     def message(self):
         return f"Multiple papers have the same citation key '{self.cit_key}'."
     
-class IssueMultipleTitle(Issue):
+class IssueMultipleTitle(Issue, code=3, legend='Mulitple paper title', level=IssueLevel.ERROR):
+    __slots__ = ('title',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, title: str):
         super().__init__(entry, issue_level)
         self.title = title
@@ -64,7 +132,77 @@ class IssueMultipleTitle(Issue):
     def message(self):
         return f"Multiple papers have the same title '{self.title}'."
     
-class IssueBiggerBeginPage(Issue):
+class IssueMultipleDOI(Issue, code=4, legend='Mulitple DOI', level=IssueLevel.ERROR):
+    __slots__ = ('doi',)
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, doi: str):
+        super().__init__(entry, issue_level)
+        self.doi = doi
+    
+    @property
+    def message(self):
+        return f"Multiple papers have the same DOI '{self.doi}'."
+    
+class IssueMultipleArxiv(Issue, code=5, legend='Mulitple arXiv identifier', level=IssueLevel.ERROR):
+    __slots__ = ('arxiv_id',)
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, arxiv_id: str):
+        super().__init__(entry, issue_level)
+        self.arxiv_id = arxiv_id
+    
+    @property
+    def message(self):
+        return f"Multiple papers have the same arXiv identifier '{self.arxiv_id}'."
+    
+class IssueCrossFileEntryKey(Issue, code=6, legend='Entry key in other files', level=IssueLevel.NOTICE):
+    __slots__ = ('cit_key', 'other_files')
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, cit_key: str, other_files: List[str]):
+        super().__init__(entry, issue_level)
+        self.cit_key = cit_key
+        self.other_files = other_files
+    
+    @property
+    def message(self):
+        return f"The citation key '{self.cit_key}' is also used in: {', '.join(self.other_files)}."
+    
+class IssueCrossFileTitle(Issue, code=7, legend='Paper title in other files', level=IssueLevel.NOTICE):
+    __slots__ = ('title', 'other_files')
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, title: str, other_files: List[str]):
+        super().__init__(entry, issue_level)
+        self.title = title
+        self.other_files = other_files
+    
+    @property
+    def message(self):
+        return f"A paper titled '{self.title}' is also in: {', '.join(self.other_files)}."
+    
+class IssueUnusedEntry(Issue, code=8, legend='Not cited', level=IssueLevel.NOTICE):
+    __slots__ = ()
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel):
+        super().__init__(entry, issue_level)
+    
+    @property
+    def message(self):
+        return "This paper is not cited in the LaTeX project."
+    
+class IssueSimilarTitle(Issue, code=9, legend='Similar paper title', level=IssueLevel.WARNING):
+    __slots__ = ('similar_titles',)
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, similar_titles: List[Tuple[str, float]]):
+        super().__init__(entry, issue_level)
+        self.similar_titles = similar_titles
+    
+    @property
+    def message(self):
+        titles = ', '.join(f"'{title}' ({similarity:.2f})" for title, similarity in self.similar_titles)
+        return f"Other papers have nearly the same title (similarity in parentheses): {titles}."
+    
+class IssueBiggerBeginPage(Issue, code=10, legend='Bigger begin page', level=IssueLevel.ERROR):
+    __slots__ = ('start_page', 'end_page')
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, start_page: int, end_page: int):
         super().__init__(entry, issue_level)
         self.start_page = start_page
@@ -74,7 +212,9 @@ class IssueBiggerBeginPage(Issue):
     def message(self):
         return f"The begin page '{self.start_page}' is bigger than the end page '{self.end_page}'."
     
-class IssueOnlyOnePage(Issue):
+class IssueOnlyOnePage(Issue, code=11, legend='Only one page', level=IssueLevel.WARNING):
+    __slots__ = ('page_num',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, page_num: int):
         super().__init__(entry, issue_level)
         self.page_num = page_num
@@ -83,7 +223,9 @@ class IssueOnlyOnePage(Issue):
     def message(self):
         return f"The page number contain only a begin page '{self.page_num}' without an end page."
     
-class IssueWrongPageFormat(Issue):
+class IssueWrongPageFormat(Issue, code=12, legend='Wrong page format', level=IssueLevel.ERROR):
+    __slots__ = ('pages_str',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, pages_str: int):
         super().__init__(entry, issue_level)
         self.pages_str = pages_str
@@ -92,27 +234,33 @@ class IssueWrongPageFormat(Issue):
     def message(self):
         return f"Unrecognized page format: '{self.pages_str}', should be like '1--20'."
 
-class IssueTitleContainsYear(Issue):
-    def __init__(self, entry: BibEntry, issue_level: IssueLevel, pub_type: str, year_match: List):
+class IssueTitleContainsYear(Issue, code=13, legend='Title contains year', level=IssueLevel.ERROR):
+    __slots__ = ('pub_type', 'year')
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, pub_type: str, year: str):
         super().__init__(entry, issue_level)
         self.pub_type = pub_type
-        self.year_match = year_match
+        self.year = year
             
     @property
     def message(self):
-        return f"Publication name at key '{self.pub_type}' contains year number '{self.year_match.group()}'. Year number should only appear in the 'year' field."
+        return f"Publication name at key '{self.pub_type}' contains year number '{self.year}'. Year number should only appear in the 'year' field."
 
-class IssueTitleContainsOrdinal(Issue):
-    def __init__(self, entry: BibEntry, issue_level: IssueLevel, pub_type: str, ordinal_match: List):
+class IssueTitleContainsOrdinal(Issue, code=14, legend='Title contains ordinal number', level=IssueLevel.NOTICE):
+    __slots__ = ('pub_type', 'ordinal')
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, pub_type: str, ordinal: str):
         super().__init__(entry, issue_level)
         self.pub_type = pub_type
-        self.ordinal_match = ordinal_match
+        self.ordinal = ordinal
             
     @property
     def message(self):
-        return f"Publication name at key '{self.pub_type}' contains ordinal number '{self.ordinal_match.group()}'."
+        return f"Publication name at key '{self.pub_type}' contains ordinal number '{self.ordinal}'."
+    
+class IssueArxivPaper(Issue, code=15, legend='Arxiv papers', level=IssueLevel.WARNING):
+    __slots__ = ()
     
-class IssueArxivPaper(Issue):
     def __init__(self, entry: BibEntry, issue_level: IssueLevel):
         super().__init__(entry, issue_level)
     
@@ -120,7 +268,9 @@ class IssueArxivPaper(Issue):
     def message(self):
         return "Is this arxiv paper accepted by a journal/conference?"
     
-class IssueArxivWithInproceddings(Issue):
+class IssueArxivWithInproceddings(Issue, code=16, legend='Arxiv as conf paper', level=IssueLevel.ERROR):
+    __slots__ = ()
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel):
         super().__init__(entry, issue_level)
     
@@ -128,7 +278,9 @@ class IssueArxivWithInproceddings(Issue):
     def message(self):
         return f"arxiv papers should use '@article', rather than '@inproceedings'"
     
-class IssueTitleCapitalization(Issue):
+class IssueTitleCapitalization(Issue, code=17, legend='Title not capitalized', level=IssueLevel.NOTICE):
+    __slots__ = ('non_cap_words_str',)
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, non_cap_words_str: str):
         super().__init__(entry, issue_level)
         self.non_cap_words_str = non_cap_words_str
@@ -137,7 +289,9 @@ class IssueTitleCapitalization(Issue):
     def message(self):
         return f"The journal/conference name is not correctly capitalized: {self.non_cap_words_str}."
 
-class IssueArticleWithProceddingsOf(Issue):
+class IssueArticleWithProceddingsOf(Issue, code=18, legend='Acticle has "Proceedings of"', level=IssueLevel.ERROR):
+    __slots__ = ()
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel):
         super().__init__(entry, issue_level)
     
@@ -145,15 +299,20 @@ class IssueArticleWithProceddingsOf(Issue):
     def message(self):
         return f"The journal begins with 'Proceedings of' or 'Advances in', you may change '@article' to '@inproceddings' and change keys for this bib entry."
 
-class IssueProceedingsOfAdvancesIn(Issue):
+class IssueProceedingsOfAdvancesIn(Issue, code=19, legend='Inconsistency of "Proceedings of" and "Advances in"', level=IssueLevel.NOTICE):
+    __slots__ = ('starts_with_proceedings', 'starts_with_advances', 'num_proceeding', 'num_advances')
+    
     def __init__(self, entry: BibEntry, issue_level: IssueLevel, starts_with_proceedings: bool, starts_with_advances: bool, num_proceeding: int, num_advances: int):
         super().__init__(entry, issue_level)
-        self.compare_proceeding_advances = num_proceeding > num_advances
         self.starts_with_proceedings = starts_with_proceedings
         self.starts_with_advances = starts_with_advances
         self.num_proceeding = num_proceeding
         self.num_advances = num_advances
     
+    @property
+    def compare_proceeding_advances(self) -> bool:
+        return self.num_proceeding > self.num_advances
+    
     @property
     def message(self):
         if self.compare_proceeding_advances and self.starts_with_advances: # proceeding > advances
@@ -168,51 +327,135 @@ class IssueProceedingsOfAdvancesIn(Issue):
             
         return msg
 
-class IssueAbbreviation(Issue):
-    def __init__(self, entry: BibEntry, issue_level: IssueLevel, abbrs: List[str]):
+class IssueAbbreviation(Issue, code=20, legend='Journal/Booktitle contains abbreviations', level=IssueLevel.NOTICE):
+    __slots__ = ('abbrs', 'full_names')
+    
+    def __init__(self, entry: BibEntry, issue_level: IssueLevel, abbrs: List[str],
+                 full_names: Optional[Dict[str, str]] = None):
         super().__init__(entry, issue_level)
         self.abbrs = abbrs
+        # Suggested fix: the full names of the abbreviations found in the venue database
+        self.full_names = full_names if full_names is not None else {}
     
     @property
     def message(self):
         # TODO: not sure
-        return f"The journal/conference of the paper contain abberiviations: {self.abbrs}."
-
-def get_issue_legend(issue_name: str):
-    if issue_name == 'IssueNotIncludedKeys':
-        issue_legend = 'Not included keys'
-    elif issue_name == 'IssueRedundantKeys':
-        issue_legend = 'Include redundant keys'
-    elif issue_name == 'IssueMultipleEntryKey':
-        issue_legend = 'Mulitple entry key'
-    elif issue_name == 'IssueMultipleTitle':
-        issue_legend = 'Mulitple paper title'
-    elif issue_name == 'IssueBiggerBeginPage':
-        issue_legend = 'Bigger begin page'
-    elif issue_name == 'IssueOnlyOnePage':
-        issue_legend = 'Only one page'
-    elif issue_name == 'IssueWrongPageFormat':
-        issue_legend = 'Wrong page format'
-    elif issue_name == 'IssueTitleContainsYear':
-        issue_legend = 'Title contains year'
-    elif issue_name == 'IssueTitleContainsOrdinal':
-        issue_legend = 'Title contains ordinal number'
-    elif issue_name == 'IssueArxivPaper':
-        issue_legend = 'Arxiv papers'
-    elif issue_name == 'IssueArxivWithInproceddings':
-        issue_legend = 'Arxiv as conf paper'
-    elif issue_name == 'IssueTitleCapitalization':
-        issue_legend = 'Title not capitalized'
-    elif issue_name == 'IssueArticleWithProceddingsOf':
-        issue_legend = 'Acticle has "Proceedings of"'
-    elif issue_name == 'IssueProceedingsOfAdvancesIn':
-        issue_legend = 'Inconsistency of "Proceedings of" and "Advances in"'
-    elif issue_name == 'IssueAbbreviation':
-        issue_legend = 'Journal/Booktitle contains abbreviations'
-    else:
-        assert False
-        
-    return issue_legend
+        message = f"The journal/conference of the paper contain abberiviations: {self.abbrs}."
+        if self.full_names:
+            message += " Full name: " + "; ".join(f"{abbr} = {name}" for abbr, name in self.full_names.items()) + "."
+        return message
+
+class IssueStats:
+    """Number of issues by type (in the order types are first seen) and by level."""
+    def __init__(self):
+        self.types: Dict[str, int] = {}
+        self.levels: Dict[IssueLevel, int] = {level: 0 for level in IssueLevel}
+    
+    def add(self, issues) -> None:
+        types = self.types
+        levels = self.levels
+        for issue in issues:
+            name = issue.__class__.__name__
+            types[name] = types.get(name, 0) + 1
+            levels[issue.issue_level] += 1
+    
+    def remove(self, issues) -> None:
+        for issue in issues:
+            name = issue.__class__.__name__
+            self.types[name] -= 1
+            if self.types[name] == 0:
+                del self.types[name]
+            self.levels[issue.issue_level] -= 1
+    
+    def update(self, other: 'IssueStats') -> None:
+        for name, count in other.types.items():
+            self.types[name] = self.types.get(name, 0) + count
+        for level, count in other.levels.items():
+            self.levels[level] += count
+    
+    @classmethod
+    def from_entries(cls, entries) -> 'IssueStats':
+        stats = cls()
+        for entry in entries:
+            stats.add(entry.issues)
+        return stats
+
+class IssueStore:
+    """
+    The issues of a list of entries as columns: entry index, type code, level code and fields.
+
+    Takes a small fraction of the memory of the issue objects, which
+    from_entries(release=True) lets go of as it goes. Counts come straight
+    from the columns, and the exports and the HTML report are written from
+    records() without making the issue objects again.
+    """
+
+    def __init__(self):
+        # Positions in the entry list; appended in order, so the issues of an entry are contiguous
+        self.entry_indices = array('l')
+        self.codes = array('B')
+        self.levels = array('B')
+        self.args: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def add(self, entry_index: int, issues: Sequence[Issue]) -> None:
+        for issue in issues:
+            self.entry_indices.append(entry_index)
+            self.codes.append(issue.issue_type.code)
+            self.levels.append(issue.issue_level.code)
+            self.args.append(issue.args())
+
+    @classmethod
+    def from_entries(cls, entries: Sequence[BibEntry], release: bool = False) -> 'IssueStore':
+        """The issues of `entries`; with `release`, each entry's issue list is emptied once stored."""
+        store = cls()
+        for index, entry in enumerate(entries):
+            if entry.issues:
+                store.add(index, entry.issues)
+                if release:
+                    entry.issues = NO_ISSUES
+        return store
+
+    def records(self, entries: Sequence[BibEntry]) -> Iterator[Tuple[int, IssueType, IssueLevel, tuple, str]]:
+        """
+        (entry index, type, level, fields, message) of every issue, in order; `entries` are those the store was built from.
+
+        No issue object is made per issue: each message is formatted by one
+        issue of its type, given the entry, level and fields of every issue
+        of that type in turn.
+        """
+        formatters: Dict[int, Issue] = {}
+        entry_indices, codes, levels, args = self.entry_indices, self.codes, self.levels, self.args
+        for position in range(len(self)):
+            issue_type = ISSUE_CODES[codes[position]]
+            formatter = formatters.get(issue_type.code)
+            if formatter is None:
+                formatter = formatters[issue_type.code] = issue_type.cls.__new__(issue_type.cls)
+            entry_index = entry_indices[position]
+            level = LEVEL_CODES[levels[position]]
+            yield entry_index, issue_type, level, args[position], \
+                formatter.assign(entries[entry_index], level, args[position]).message
+
+    def stats(self) -> IssueStats:
+        stats = IssueStats()
+        counts = [0] * (max(ISSUE_CODES) + 1)
+        for code in self.codes:
+            counts[code] += 1
+        # Types in the order they are first seen, as IssueStats.add counts them
+        for code in self.codes:
+            if counts[code]:
+                stats.types[ISSUE_CODES[code].name] = counts[code]
+                counts[code] = 0
+        for level in IssueLevel:
+            stats.levels[level] = self.levels.count(level.code)
+        return stats
+
+LEVEL_CODES: Dict[int, IssueLevel] = {level.code: level for level in IssueLevel}
+
+def get_issue_legend(issue_name: str) -> str:
+    return ISSUE_TYPES[issue_name].legend
 
 if __name__ == '__main__':
     issue = IssueLevel(1)
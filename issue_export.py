@@ -0,0 +1,195 @@
+import sys
+import json
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from bib_read import BibEntry
+from issue import ISSUE_TYPES, IssueLevel, IssueStats, IssueStore, IssueType
+from profiler import Profile, phase
+
+# Formats of main.py's --format besides the HTML report
+EXPORT_FORMATS = ('jsonl', 'json', 'sarif')
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SARIF_LEVELS = {IssueLevel.NOTICE: 'note', IssueLevel.WARNING: 'warning', IssueLevel.ERROR: 'error'}
+TOOL_NAME = 'LatexBibChecker'
+TOOL_URI = 'https://github.com/JasonWang-Zqqgpllp20/LatexBibChecker'
+# json.dumps() with options builds a new encoder on every call
+encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+
+PLAIN_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+def plain_value(value):
+    """`value` as JSON-compatible data: sets become sorted lists."""
+    if value.__class__ in PLAIN_TYPES:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [plain_value(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(plain_value(item) for item in value)
+    if isinstance(value, dict):
+        return {str(key): plain_value(item) for key, item in value.items()}
+    return str(value)
+
+
+def issue_fields(issue_type: IssueType, args: tuple) -> Dict[str, object]:
+    """The fields of an issue beyond those of every issue, e.g. not_included_keys or start_page."""
+    return {name: value if value.__class__ in PLAIN_TYPES else plain_value(value)
+            for name, value in zip(issue_type.fields, args)}
+
+
+def issue_record(path: str, entry: BibEntry, issue_type: IssueType, level: IssueLevel, args: tuple,
+                 message: str) -> Dict[str, object]:
+    """One issue (a record of IssueStore.records) as a JSON object: where it is, its level and type, and its message and fields."""
+    return {
+        'file': path,
+        'key': entry.citation_key,
+        'line': entry.line_number,
+        'level': level.text.lower(),
+        'type': issue_type.name,
+        'legend': issue_type.legend,
+        'message': message,
+        'fields': issue_fields(issue_type, args),
+    }
+
+
+class IssueWriter:
+    """
+    Writer of issues in a machine-readable format, one issue at a time.
+
+    Nothing is kept in memory but the counts: every issue is written as
+    soon as it is passed in, between the text of start() and finish().
+    Issues are read from the columns of an IssueStore, one issue object
+    per type formatting all the messages.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.count = 0
+
+    def start(self) -> None:
+        pass
+
+    def write_entries(self, path: str, entries: List[BibEntry], store: IssueStore) -> None:
+        """Write the issues of the checked `entries` of the file `path`, in order, from their `store`."""
+        for entry_index, issue_type, level, args, message in store.records(entries):
+            self.write_issue(path, entries[entry_index], issue_type, level, args, message)
+            self.count += 1
+
+    def write_issue(self, path: str, entry: BibEntry, issue_type: IssueType, level: IssueLevel, args: tuple,
+                    message: str) -> None:
+        raise NotImplementedError
+
+    def finish(self, stats: IssueStats, profile: Optional[Profile] = None) -> None:
+        pass
+
+
+class JsonLinesWriter(IssueWriter):
+    """One JSON object per line and issue (--format jsonl)."""
+
+    def write_issue(self, path: str, entry: BibEntry, issue_type: IssueType, level: IssueLevel, args: tuple,
+                    message: str) -> None:
+        self.stream.write(encode_json(issue_record(path, entry, issue_type, level, args, message)) + '\n')
+
+
+class JsonWriter(IssueWriter):
+    """One JSON document: the list of issues and their counts by level and type (--format json)."""
+
+    def start(self) -> None:
+        self.stream.write('{"issues": [')
+
+    def write_issue(self, path: str, entry: BibEntry, issue_type: IssueType, level: IssueLevel, args: tuple,
+                    message: str) -> None:
+        self.stream.write((',\n  ' if self.count else '\n  ')
+                          + encode_json(issue_record(path, entry, issue_type, level, args, message)))
+
+    def finish(self, stats: IssueStats, profile: Optional[Profile] = None) -> None:
+        summary = {'levels': {level.text.lower(): count for level, count in stats.levels.items()}, 'types': stats.types}
+        self.stream.write('\n], "summary": ' + json.dumps(summary))
+        if profile is not None:
+            self.stream.write(', "profile": ' + json.dumps(profile.as_dict()))
+        self.stream.write('}\n')
+
+
+class SarifWriter(IssueWriter):
+    """
+    A SARIF 2.1.0 log, as read by code scanning tools (--format sarif).
+
+    Every registered issue type is a rule, identified by its class name and
+    with its usual level as default, and every issue a result located at
+    the first line of its entry.
+    """
+
+    def start(self) -> None:
+        self._rule_index = {name: index for index, name in enumerate(ISSUE_TYPES)}
+        rules = []
+        for name, issue_type in ISSUE_TYPES.items():
+            rules.append({'id': name, 'name': name, 'shortDescription': {'text': issue_type.legend},
+                          'defaultConfiguration': {'level': SARIF_LEVELS[issue_type.level]},
+                          'properties': {'code': issue_type.code}})
+        driver = {'name': TOOL_NAME, 'informationUri': TOOL_URI, 'rules': rules}
+        self.stream.write('{"$schema": ' + json.dumps(SARIF_SCHEMA) + ', "version": "2.1.0", "runs": [{"tool": {"driver": '
+                          + encode_json(driver) + '}, "results": [')
+
+    def write_issue(self, path: str, entry: BibEntry, issue_type: IssueType, level: IssueLevel, args: tuple,
+                    message: str) -> None:
+        result = {
+            'ruleId': issue_type.name,
+            'ruleIndex': self._rule_index[issue_type.name],
+            'level': SARIF_LEVELS[level],
+            'message': {'text': message},
+            'locations': [{'physicalLocation': {'artifactLocation': {'uri': path},
+                                                'region': {'startLine': entry.line_number}}}],
+            'properties': {'citationKey': entry.citation_key, **issue_fields(issue_type, args)},
+        }
+        self.stream.write((',\n' if self.count else '\n') + encode_json(result))
+
+    def finish(self, stats: IssueStats, profile: Optional[Profile] = None) -> None:
+        self.stream.write('\n]')
+        if profile is not None:
+            self.stream.write(', "properties": {"profile": ' + json.dumps(profile.as_dict()) + '}')
+        self.stream.write('}]}\n')
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'json': JsonWriter, 'sarif': SarifWriter}
+
+
+@contextmanager
+def open_output(path: Optional[str]) -> Iterator[TextIO]:
+    """The file `path` opened for writing text, or standard output for None or '-'."""
+    if path is None or path == '-':
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        with open(path, 'w', encoding='utf-8', newline='\n') as file:
+            yield file
+
+
+def export_issues(output_format: str, output: Optional[str], checked: List[Tuple[str, List[BibEntry], IssueStore]],
+                  stats: IssueStats, profile: Optional[Profile] = None) -> None:
+    """
+    Write the issues of every checked file in `output_format`.
+
+    Args:
+        output_format: One of EXPORT_FORMATS
+        output: File to write, or None or '-' for standard output
+        checked: (path, checked entries, IssueStore of their issues) of each file, in order
+        stats: Counts of all the issues, for the summary of the json format
+        profile: Where to record the 'render' and 'write' phases; the json
+            and sarif formats also carry the phases recorded until then
+    """
+    with phase(profile, 'render'), open_output(output) as stream:
+        writer = WRITERS[output_format](profile.timed_file(stream) if profile is not None else stream)
+        writer.start()
+        for path, entries, store in checked:
+            writer.write_entries(path, entries, store)
+        writer.finish(stats, profile)
+
+
+def exceeds_threshold(stats: IssueStats, fail_level: Optional[IssueLevel]) -> bool:
+    """Whether any issue is at least as severe as `fail_level` (never if it is None)."""
+    if fail_level is None:
+        return False
+    return any(count for level, count in stats.levels.items() if level.code >= fail_level.code)
@@ -1,93 +1,17 @@
-import re
 import os
 import sys
 import argparse
-from typing import List
 
-from html_show import html_open
-from bib_read import BibEntry, Article, InProceedings, Book
+# The HTML report, --batch, --watch, --tex and --fix are imported where they are used, so checking a
+# small file into JSON Lines (e.g. in a pre-commit hook) starts without them
+from bib_parser import BibParser
+from bib_cache import ParseCache, parse_with_cache, DEFAULT_CACHE_DIR
+from issue_export import EXPORT_FORMATS, export_issues, exceeds_threshold
 from check_bib import check
-
-class BibParser:
-    """Parser for BibTeX files with line number tracking."""
-
-    @staticmethod
-    def parse_file(file_path: str = "input.bib") -> List[BibEntry]:
-        """
-        Parse a BibTeX file and return a list of BibEntry objects.
-
-        Args:
-            file_path: Path to the BibTeX file (default: "input.bib")
-
-        Returns:
-            List of BibEntry objects with line number metadata
-        """
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-
-        # Normalize line endings
-        content = content.replace('\r\n', '\n').replace('\r', '\n')
-        if not content.endswith('\n'):
-            content += '\n'
-
-        # Precompute line start positions in the ORIGINAL content
-        line_starts = [0]
-        for match in re.finditer('\n', content):
-            line_starts.append(match.end())
-
-        def get_line_number(pos: int) -> int:
-            """Return line number (1-based) for a character offset."""
-            for i in range(len(line_starts) - 1):
-                if line_starts[i] <= pos < line_starts[i + 1]:
-                    return i + 1
-            return len(line_starts)
-
-        # Pattern to match BibTeX entries
-        entry_pattern = re.compile(
-            r'@(?P<entry_type>\w+)\s*\{(?P<citation_key>[^,]+),\s*'
-            r'(?P<fields>.*?)'
-            r'(?=\n@|\n\s*\Z|\Z)',
-            re.DOTALL
-        )
-
-        # Pattern to match fields
-        field_pattern = re.compile(
-            r'(?P<key>\w+)\s*=\s*'
-            r'(?P<value>\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}|"[^"]*"|\d+),?',
-            re.DOTALL
-        )
-
-        entries = []
-
-        for match in entry_pattern.finditer(content):
-            entry_type = match.group('entry_type').lower()
-            citation_key = match.group('citation_key').strip()
-            fields_str = match.group('fields').strip()
-
-            start_index = match.start()
-            line_number = get_line_number(start_index)
-
-            fields = {}
-            for field_match in field_pattern.finditer(fields_str):
-                key = field_match.group('key').strip().lower()
-                value = field_match.group('value').strip().replace("\n", "")
-                if (value.startswith('{') and value.endswith('}')) or \
-                    (value.startswith('"') and value.endswith('"')):
-                    value = value[1:-1]
-                fields[key] = value
-
-            # Create appropriate entry object with line number
-            if entry_type == "article":
-                entries.append(Article(citation_key, fields, line_number))
-            elif entry_type == "inproceedings":
-                entries.append(InProceedings(citation_key, fields, line_number))
-            elif entry_type == "book":
-                entries.append(Book(citation_key, fields, line_number))
-            else:
-                # You can add more BibEntry types here if needed
-                pass
-
-        return entries
+from issue import IssueLevel, IssueStats, IssueStore
+from profiler import Profile, phase
+from title_similarity import TITLE_SIMILARITY, DEFAULT_THRESHOLD, VERIFY_MODES
+from venue_db import venue_database
 
 def main():
     parser = argparse.ArgumentParser(description="Validate and format a BibTeX file.")
@@ -98,19 +22,234 @@ def main():
     )
     parser.add_argument(
         "--output", "-o",
-        default="output.html",
-        help="Path to output .html report (default: output.html)"
+        default=None,
+        help="Path to the output report, '-' for standard output "
+             "(default: output.html for the HTML report, standard output otherwise)"
+    )
+    parser.add_argument(
+        "--format", "-f",
+        choices=("html",) + EXPORT_FORMATS,
+        default="html",
+        help="Report format: the HTML report, one JSON object per issue and line, "
+             "one JSON document, or a SARIF log (default: html)"
+    )
+    parser.add_argument(
+        "--no-open",
+        action="store_true",
+        help="Write the HTML report without opening it in a browser"
+    )
+    parser.add_argument(
+        "--fail-level",
+        choices=[level.text.lower() for level in IssueLevel],
+        default=None,
+        help="Exit with status 1 when there is an issue of this level or a more severe one"
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Memory-map the input and decode fields only when a check reads them"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of processes used to parse and check large inputs (default: 1)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory of the parse cache (default: {DEFAULT_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the input from scratch"
+    )
+    parser.add_argument(
+        "--title-similarity",
+        nargs="?",
+        type=float,
+        const=DEFAULT_THRESHOLD,
+        default=0,
+        metavar="THRESHOLD",
+        help=f"Report papers whose titles are at least this similar ({DEFAULT_THRESHOLD} if no THRESHOLD is given); "
+             "it takes the longest of all checks on large files (default: off)"
+    )
+    parser.add_argument(
+        "--title-verify",
+        choices=VERIFY_MODES,
+        default="jaccard",
+        help="How candidate similar titles are confirmed: exact shingle Jaccard similarity, "
+             "the MinHash estimate, or not at all (default: jaccard)"
+    )
+    parser.add_argument(
+        "--venues",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="More venue abbreviations and their full names, one 'abbreviation<TAB>full name' per line "
+             "(or an index built by venue_db.py); they take precedence over the bundled ones. May be repeated"
+    )
+
+    parser.add_argument(
+        "--batch", "-b",
+        nargs="+",
+        metavar="INPUT",
+        default=None,
+        help="Check many .bib files (paths, directories, glob patterns or @file lists) "
+             "into one report, including duplicates across files"
+    )
+    parser.add_argument(
+        "--watch", "-w",
+        action="store_true",
+        help="Keep running and update the report whenever the input changes"
+    )
+    parser.add_argument(
+        "--tex",
+        default=None,
+        help="LaTeX project (root .tex file, or directory of .tex files) whose citations are compared with "
+             "the entries, to report cited but missing and unused entries; with --watch, editing it refreshes the report"
+    )
+
+    parser.add_argument(
+        "--fix",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="OUTPUT",
+        help="Also write a copy of the input with the safe corrections applied (page ranges as 1--10, "
+             "no years or ordinals in booktitle, no redundant fields), to OUTPUT or refs.fixed.bib for refs.bib"
+    )
+
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        choices=("memory", "time"),
+        const="memory",
+        default=None,
+        help="Measure the time, calls and peak memory of every phase (read, parse, each check rule, render, write), "
+             "print them as a table and add them to the report; the rules then run in one process. "
+             "Tracing memory slows the run down: --profile time only measures times and calls"
     )
 
     args = parser.parse_args()
+    if args.watch and args.format != "html":
+        parser.error("--watch only writes the HTML report")
+    if args.watch:
+        # --watch parses and checks incrementally, in one process, and never exits with a status
+        for option, given in (("--lazy", args.lazy), ("--jobs", args.jobs != 1), ("--no-cache", args.no_cache),
+                              ("--cache-dir", args.cache_dir != DEFAULT_CACHE_DIR), ("--fail-level", args.fail_level)):
+            if given:
+                parser.error(f"{option} does not apply to --watch")
+    if args.fix is not None and (args.batch or args.watch):
+        parser.error("--fix works on a single --input file")
+    if args.profile and (args.batch or args.watch):
+        parser.error("--profile works on a single --input file")
+    if not 0 <= args.title_similarity <= 1:
+        parser.error("--title-similarity must be 0 (off) or a similarity in (0, 1]")
+    if args.output is None:
+        args.output = "output.html" if args.format == "html" else "-"
+    fail_level = IssueLevel[args.fail_level.upper()] if args.fail_level else None
+    # Keep standard output for the report when it goes there
+    log = sys.stderr if args.output == "-" else sys.stdout
+
+    TITLE_SIMILARITY.threshold = args.title_similarity
+    TITLE_SIMILARITY.verify = args.title_verify
+    for path in args.venues:
+        try:
+            venue_database().add_file(path)
+        except (OSError, ValueError) as error:
+            print(f"Error: Cannot read venues from '{path}': {error}")
+            sys.exit(1)
+
+    if args.batch:
+        from bib_batch import expand_inputs, check_files, print_summaries
+
+        paths = expand_inputs(args.batch)
+        if not paths:
+            print("Error: No .bib files found.")
+            sys.exit(1)
+        results = check_files(paths, jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir)
+        print_summaries(results, file=log)
+        stats = IssueStats()
+        for result in results:
+            stats.update(result.stats)
+        if args.format == "html":
+            from html_show import html_batch_open
+            html_batch_open(results, file_name=args.output, open_browser=not args.no_open)
+        else:
+            checked = [(result.path, result.entries, IssueStore.from_entries(result.entries, release=True))
+                       for result in results]
+            export_issues(args.format, args.output, checked, stats)
+        sys.exit(1 if exceeds_threshold(stats, fail_level) else 0)
 
     if not os.path.exists(args.input):
         print(f"Error: File '{args.input}' does not exist.")
         sys.exit(1)
 
-    entries = BibParser.parse_file(args.input)
-    entries = check(entries=entries)
-    html_open(entries=entries, file_name=args.output)
+    if args.watch:
+        from bib_watch import WatchSession
+        WatchSession(args.input, args.output, tex=args.tex, open_browser=not args.no_open).run()
+        return
+
+    profile = Profile(memory=args.profile == "memory").start() if args.profile else None
+    if args.lazy or args.no_cache:
+        entries = BibParser.parse_file(args.input, lazy=args.lazy, jobs=args.jobs, profile=profile)
+    else:
+        entries = parse_with_cache(args.input, ParseCache(args.cache_dir), jobs=args.jobs, profile=profile)
+    parsed = list(entries)
+    # Issue counts for the report's filter panel, gathered while checking
+    stats = IssueStats()
+    entries = check(entries=entries, jobs=args.jobs, stats=stats, profile=profile)
+
+    header = ""
+    if args.tex is not None:
+        from tex_scan import TexScanner, cross_check, add_unused_issues
+
+        with phase(profile, "tex"):
+            scanner = TexScanner(jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir)
+            project = scanner.scan(args.tex)
+            missing, unused = cross_check(project, parsed)
+            add_unused_issues(entries, unused, stats)
+        for including_file, name in project.unresolved:
+            print(f"Warning: '{name}' included by '{including_file}' was not found.", file=log)
+        for key, places in missing.items():
+            path, line = places[0]
+            print(f"{path}:{line}: citation '{key}' is not in '{args.input}'", file=log)
+        if args.format == "html":
+            from html_show import missing_citations_html
+            header = missing_citations_html(missing)
+
+    if args.fix is not None:
+        from bib_fix import write_fixed, fixed_path
+
+        fix_output = args.fix or fixed_path(args.input)
+        try:
+            with phase(profile, "fix"):
+                num_edits, num_entries = write_fixed(args.input, parsed, fix_output)
+        except (OSError, ValueError) as error:
+            print(f"Error: could not write '{fix_output}': {error}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Wrote '{fix_output}': {num_edits} fixes in {num_entries} entries.", file=log)
+
+    # The report is written from the columns of the issues; the issue objects go as they are stored
+    store = IssueStore.from_entries(entries, release=True)
+    if args.format == "html":
+        from html_show import html_open, html_save, profile_html
+
+        if profile is not None:
+            # The phases up to now; those of the report itself are only in the printed table
+            header += profile_html(profile)
+        if args.no_open:
+            html_save(entries, args.output, header=header, stats=stats, profile=profile, store=store)
+        else:
+            html_open(entries=entries, file_name=args.output, header=header, stats=stats, profile=profile, store=store)
+    else:
+        export_issues(args.format, args.output, [(args.input, entries, store)], stats, profile=profile)
+    if profile is not None:
+        profile.stop()
+        profile.print_table(file=log)
+    sys.exit(1 if exceeds_threshold(stats, fail_level) else 0)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
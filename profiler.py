@@ -0,0 +1,280 @@
+import time
+import functools
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, TextIO
+
+from bib_read import BibEntry
+from check_engine import RuleRegistry, EntryRule, CorpusRule
+from issue import IssueStats
+
+# Phases of the rules of a check, as 'check:<rule name>'
+CHECK_RULE_PREFIX = 'check:'
+_NO_PHASE = nullcontext()
+
+
+class PhaseStats:
+    """What a run spent in one phase: its own time (without nested phases), calls, and for rules entries and issues."""
+
+    __slots__ = ('name', 'calls', 'seconds', 'entries', 'issues', 'peak_bytes')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.entries: Optional[int] = None
+        self.issues: Optional[int] = None
+        # Most memory allocated at once during the phase, nested phases included
+        self.peak_bytes: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, object]:
+        return {'name': self.name, 'calls': self.calls, 'seconds': round(self.seconds, 6),
+                'entries': self.entries, 'issues': self.issues, 'peak_bytes': self.peak_bytes}
+
+
+class _Frame:
+    __slots__ = ('phase', 'start', 'nested_seconds', 'peak_bytes')
+
+    def __init__(self, phase: PhaseStats):
+        self.phase = phase
+        self.start = time.perf_counter()
+        self.nested_seconds = 0.0
+        self.peak_bytes = 0
+
+
+class Profile:
+    """
+    Wall time, call counts and peak memory of the phases of a run (main.py --profile).
+
+    Callers that take an optional `profile` wrap their phases in
+    `profile.phase(name)` when it is not None, so nothing is measured or
+    slowed down without --profile. Phases nest; each one's time is its own,
+    without that of the phases inside it. With `memory`, allocations are
+    traced with tracemalloc from start() to stop(), which makes the run
+    several times slower (allocation-heavy phases the most).
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self._tracemalloc = None
+        if memory:
+            # Imported here: it pulls in modules (pickle, tokenize, ...) that runs without --profile never use
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+        self.phases: Dict[str, PhaseStats] = {}
+        self._stack: List[_Frame] = []
+        self._started_tracing = False
+        # Peak over the whole run
+        self.peak_bytes: Optional[int] = None
+        # Hits and misses of caches (e.g. check_bib.venue_analysis), by name
+        self.caches: Dict[str, Dict[str, int]] = {}
+
+    def start(self) -> 'Profile':
+        tracemalloc = self._tracemalloc
+        if tracemalloc is None:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        return self
+
+    def stop(self) -> None:
+        if self._tracing():
+            self.peak_bytes = max(self.peak_bytes or 0, self._tracemalloc.get_traced_memory()[1])
+            if self._started_tracing:
+                self._tracemalloc.stop()
+                self._started_tracing = False
+
+    def _get(self, name: str) -> PhaseStats:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = PhaseStats(name)
+        return phase
+
+    def _tracing(self) -> bool:
+        return self._tracemalloc is not None and self._tracemalloc.is_tracing()
+
+    def _peak(self) -> int:
+        return self._tracemalloc.get_traced_memory()[1] if self._tracing() else 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """Count the code run in the with block as one call of the phase `name`."""
+        if self._stack:
+            # The peak so far belongs to the enclosing phase; start afresh for this one
+            parent = self._stack[-1]
+            parent.peak_bytes = max(parent.peak_bytes, self._peak())
+        if self._tracing():
+            self._tracemalloc.reset_peak()
+        frame = _Frame(self._get(name))
+        self._stack.append(frame)
+        try:
+            yield frame.phase
+        finally:
+            elapsed = time.perf_counter() - frame.start
+            self._stack.pop()
+            phase = frame.phase
+            phase.calls += 1
+            phase.seconds += elapsed - frame.nested_seconds
+            if self._tracing():
+                peak = max(frame.peak_bytes, self._peak())
+                phase.peak_bytes = max(phase.peak_bytes or 0, peak)
+                self.peak_bytes = max(self.peak_bytes or 0, peak)
+            if self._stack:
+                parent = self._stack[-1]
+                parent.nested_seconds += elapsed
+                parent.peak_bytes = max(parent.peak_bytes, phase.peak_bytes or 0)
+
+    def add(self, name: str, seconds: float, calls: int = 1, entries: Optional[int] = None,
+            issues: Optional[int] = None) -> None:
+        """Record time spent in the phase `name` inside the current phase, measured by the caller."""
+        phase = self._get(name)
+        phase.calls += calls
+        phase.seconds += seconds
+        if entries is not None:
+            phase.entries = (phase.entries or 0) + entries
+        if issues is not None:
+            phase.issues = (phase.issues or 0) + issues
+        if self._stack:
+            self._stack[-1].nested_seconds += seconds
+
+    def add_cache(self, name: str, hits: int, misses: int, size: int) -> None:
+        """Record the hits and misses of the cache `name` during the run, and the number of items it holds."""
+        cache = self.caches.setdefault(name, {'hits': 0, 'misses': 0, 'size': 0})
+        cache['hits'] += hits
+        cache['misses'] += misses
+        cache['size'] = size
+
+    def run_rules(self, registry: RuleRegistry, entries: List[BibEntry],
+                  stats: Optional[IssueStats] = None) -> List[BibEntry]:
+        """
+        registry.run(entries) with every rule timed, as the phase 'check:<rule name>'.
+
+        The rules run through wrappers that count their calls, the entries
+        they look at and the issues they report. The wrappers only exist for
+        this run, so check() without a profile runs the rules as they are.
+        """
+        profiled = RuleRegistry()
+        counters = []
+        for rule in registry.rules:
+            counter = RuleCounter()
+            counters.append((rule.name, counter))
+            if isinstance(rule, CorpusRule):
+                rule_class = type(rule.name, (), {'collect': staticmethod(counter.wrap_collect(rule.collect)),
+                                                  'reduce': staticmethod(counter.wrap_reduce(rule.reduce))})
+                profiled.rules.append(CorpusRule(rule_class, rule.entry_types))
+            else:
+                profiled.rules.append(EntryRule(counter.wrap_entry_rule(rule.func), rule.entry_types, rule.fields))
+
+        profiled.run(entries, stats=stats)
+        for name, counter in counters:
+            self.add(CHECK_RULE_PREFIX + name, counter.seconds, counter.calls, counter.entries, counter.issues)
+        return entries
+
+    def timed_file(self, file, name: str = 'write') -> 'TimedFile':
+        """`file`, with the time spent in its write() counted as the phase `name`."""
+        return TimedFile(self, file, name)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {'phases': [phase.as_dict() for phase in self.phases.values()], 'peak_bytes': self.peak_bytes,
+                'caches': self.caches}
+
+    def print_table(self, file: Optional[TextIO] = None) -> None:
+        """The phases, in the order they first ran, with their share of the total time."""
+        total = sum(phase.seconds for phase in self.phases.values()) or 1.0
+        print(f"{'phase':<32} {'calls':>9} {'time':>11} {'share':>6} {'entries':>9} {'issues':>8} {'peak':>10}", file=file)
+        for phase in self.phases.values():
+            print(f"{phase.name:<32} {phase.calls:9d} {phase.seconds * 1000:8.1f} ms {phase.seconds / total:6.1%} "
+                  f"{_optional(phase.entries):>9} {_optional(phase.issues):>8} {format_bytes(phase.peak_bytes):>10}",
+                  file=file)
+        print(f"{'total':<32} {'':>9} {total * 1000:8.1f} ms {'':>6} {'':>9} {'':>8} {format_bytes(self.peak_bytes):>10}",
+              file=file)
+        for name, cache in self.caches.items():
+            lookups = cache['hits'] + cache['misses']
+            print(f"cache {name}: {cache['hits']} hits, {cache['misses']} misses "
+                  f"({cache['hits'] / (lookups or 1):.1%} hit rate), {cache['size']} items", file=file)
+
+
+class RuleCounter:
+    """Calls, time, entries and issues of one rule, gathered by the wrappers of Profile.run_rules."""
+
+    __slots__ = ('calls', 'seconds', 'entries', 'issues')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.entries = 0
+        self.issues = 0
+
+    def wrap_entry_rule(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def timed(*args):
+            start = time.perf_counter()
+            result = func(*args)
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+            self.entries += 1
+            if result:
+                self.issues += len(result)
+            return result
+        return timed
+
+    def wrap_collect(self, collect: Callable) -> Callable:
+        def timed(entry):
+            start = time.perf_counter()
+            summary = collect(entry)
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+            self.entries += 1
+            return summary
+        return timed
+
+    def wrap_reduce(self, reduce: Callable) -> Callable:
+        def timed(entries, summaries):
+            start = time.perf_counter()
+            found = reduce(entries, summaries)
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+            self.issues += sum(len(issues) for issues in found.values())
+            return found
+        return timed
+
+
+class TimedFile:
+    """Write-only file wrapper for Profile.timed_file."""
+
+    __slots__ = ('profile', 'file', 'name')
+
+    def __init__(self, profile: Profile, file, name: str):
+        self.profile = profile
+        self.file = file
+        self.name = name
+
+    def write(self, data):
+        start = time.perf_counter()
+        written = self.file.write(data)
+        self.profile.add(self.name, time.perf_counter() - start)
+        return written
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+def phase(profile: Optional[Profile], name: str) -> ContextManager:
+    """profile.phase(name), or a context that does nothing if there is no profile."""
+    return _NO_PHASE if profile is None else profile.phase(name)
+
+
+def _optional(value: Optional[int]) -> str:
+    return '-' if value is None else str(value)
+
+
+def format_bytes(count: Optional[float]) -> str:
+    """`count` bytes in B, kB, MB or GB, or '-' for None."""
+    if count is None:
+        return '-'
+    for unit in ('B', 'kB', 'MB'):
+        if abs(count) < 1024:
+            return f"{count:.0f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
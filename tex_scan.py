@@ -0,0 +1,320 @@
+import os
+import re
+import marshal
+import hashlib
+import tempfile
+from array import array
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from bib_read import BibEntry, NO_ISSUES
+from bib_parser import LineIndex
+from bib_cache import DEFAULT_CACHE_DIR
+from issue import IssueLevel, IssueStats, IssueUnusedEntry
+
+TEX_SUFFIX = '.tex'
+TEX_CACHE_SUFFIX = '.texcache'
+# Files read in one level of the include tree before a process pool pays off
+PARALLEL_MIN_FILES = 16
+
+# \cite, \citep, \citet, \nocite and the biblatex commands (\parencite, \textcite, \autocite,
+# \footcite, \citeauthor, \Cite, \cites, ...), starred or not, with their optional [..] and (..)
+# arguments before the key list
+CITE_PATTERN = re.compile(
+    r'\\(?P<command>[A-Za-z]*cite[A-Za-z]*)\*?\s*(?:(?:\[[^\]]*\]|\([^)]*\))\s*)*\{(?P<keys>[^{}]*)\}')
+# Further key lists of biblatex multicite commands: \cites[..]{a}[..]{b}
+MULTICITE_PATTERN = re.compile(r'\s*(?:(?:\[[^\]]*\]|\([^)]*\))\s*)*\{(?P<keys>[^{}]*)\}')
+# Matched by CITE_PATTERN but take no keys
+NON_CITE_COMMANDS = frozenset({'citestyle', 'citesetup', 'citation', 'excite', 'recite'})
+INCLUDE_PATTERN = re.compile(r'\\(?:input|include|subfile)\s*\{(?P<name>[^{}]+)\}')
+# A % that is not escaped (\%, but \\% is a line break and a comment) up to the end of the line
+COMMENT_PATTERN = re.compile(r'(?<!\\)((?:\\\\)*)%.*')
+COMMENT_ENVIRONMENT_PATTERN = re.compile(r'\\begin\{comment\}.*?\\end\{comment\}', re.DOTALL)
+
+# Citations of one file, compactly: the cited keys joined by commas (which keys never
+# contain) and the line number of each as array('I') bytes; then the names it includes
+FileScan = Tuple[str, bytes, List[str]]
+
+
+def scan_tex_text(text: str) -> FileScan:
+    """Citations and included file names in LaTeX source `text`, comments excluded."""
+    if '\\begin{comment}' in text:
+        text = COMMENT_ENVIRONMENT_PATTERN.sub(lambda match: '\n' * match.group().count('\n'), text)
+    if '%' in text:
+        text = COMMENT_PATTERN.sub(r'\1', text)
+
+    line_index = LineIndex(text)
+    keys = []
+    lines = array('I')
+    for match in CITE_PATTERN.finditer(text):
+        command = match.group('command')
+        if command in NON_CITE_COMMANDS:
+            continue
+        line = line_index.line_of(match.start())
+        key_lists = [match.group('keys')]
+        if command.endswith('cites'):
+            position = match.end()
+            while True:
+                more = MULTICITE_PATTERN.match(text, position)
+                if more is None:
+                    break
+                key_lists.append(more.group('keys'))
+                position = more.end()
+        for key_list in key_lists:
+            for key in key_list.split(','):
+                key = key.strip()
+                # '#1' in the definition of a citation macro
+                if key and '#' not in key:
+                    keys.append(key)
+                    lines.append(line)
+
+    includes = [match.group('name').strip() for match in INCLUDE_PATTERN.finditer(text)]
+    return ','.join(keys), lines.tobytes(), includes
+
+
+def scan_tex_file(path: str) -> FileScan:
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        return scan_tex_text(file.read())
+
+
+class TexProject:
+    """What a scan of a LaTeX project found: its files and the citations in them."""
+
+    def __init__(self):
+        self.files: List[str] = []
+        self.scans: List[FileScan] = []
+        # Included files that do not exist: (including file, name as written)
+        self.unresolved: List[Tuple[str, str]] = []
+        self._cited_keys: Optional[Set[str]] = None
+
+    @property
+    def cited_keys(self) -> Set[str]:
+        if self._cited_keys is None:
+            self._cited_keys = set().union(*(keys.split(',') for keys, _, _ in self.scans if keys))
+        return self._cited_keys
+
+    @property
+    def cites_all(self) -> bool:
+        """Whether \\nocite{*} makes every entry count as used."""
+        return '*' in self.cited_keys
+
+    def places(self, keys: Optional[Set[str]] = None) -> Dict[str, List[Tuple[str, int]]]:
+        """(file, line) of every citation of `keys` (default: all keys), by key in order of first citation."""
+        found: Dict[str, List[Tuple[str, int]]] = {}
+        for path, (file_keys, line_bytes, _) in zip(self.files, self.scans):
+            if not file_keys:
+                continue
+            lines = array('I')
+            lines.frombytes(line_bytes)
+            for key, line in zip(file_keys.split(','), lines):
+                if keys is None or key in keys:
+                    found.setdefault(key, []).append((path, line))
+        return found
+
+    @property
+    def citations(self) -> Dict[str, List[Tuple[str, int]]]:
+        return self.places()
+
+
+class TexScanner:
+    """
+    Scanner of LaTeX projects, with per-file results cached by modification time and size.
+
+    A scan starts from a root file (or every .tex file in a directory) and
+    follows \\input, \\include and \\subfile. The files of one level of the
+    include tree are read together, in `jobs` worker processes when enough
+    of them changed. Results are kept in memory between scans and, with a
+    cache directory, in one file per project on disk, so scanning an
+    unchanged project again only stats its files.
+    """
+
+    def __init__(self, jobs: int = 1, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        # Path -> (mtime_ns, size, scan result)
+        self._results: Dict[str, Tuple[int, int, FileScan]] = {}
+        self._loaded_root: Optional[str] = None
+        self._project: Optional[TexProject] = None
+        # Number of files read (not taken from the cache) by the last scan
+        self.num_scanned = 0
+
+    def _cache_path(self, root: str) -> str:
+        digest = hashlib.blake2b(root.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, 'tex-' + digest + TEX_CACHE_SUFFIX)
+
+    def _load(self, root: str) -> None:
+        if self._loaded_root == root:
+            return
+        self._loaded_root = root
+        self._project = None
+        if self.cache_dir is None:
+            return
+        try:
+            with open(self._cache_path(root), 'rb') as file:
+                self._results = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            self._results = {}
+
+    def _store(self, root: str) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(marshal.dumps(self._results))
+            os.replace(temp_path, self._cache_path(root))
+        except OSError:
+            pass
+
+    def _scan_files(self, paths: List[str], executor_holder: list) -> List[Optional[FileScan]]:
+        """Results for `paths` (None for a file that cannot be read), from the cache where unchanged."""
+        results: List[Optional[FileScan]] = [None] * len(paths)
+        stale = []
+        for position, path in enumerate(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached = self._results.get(path)
+            if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                results[position] = cached[2]
+            else:
+                stale.append((position, path, stat.st_mtime_ns, stat.st_size))
+
+        if len(stale) >= PARALLEL_MIN_FILES and self.jobs > 1:
+            if not executor_holder:
+                from concurrent.futures import ProcessPoolExecutor
+                executor_holder.append(ProcessPoolExecutor(max_workers=self.jobs))
+            scans = executor_holder[0].map(scan_tex_file, [path for _, path, _, _ in stale],
+                                           chunksize=max(1, len(stale) // (self.jobs * 4)))
+        else:
+            scans = map(scan_tex_file, [path for _, path, _, _ in stale])
+
+        for (position, path, mtime, size), scan in zip(stale, scans):
+            results[position] = scan
+            self._results[path] = (mtime, size, scan)
+        self.num_scanned += len(stale)
+        return results
+
+    @staticmethod
+    def _resolve(name: str, root_directory: str, including_file: str) -> Optional[str]:
+        candidates = [name] if name.endswith(TEX_SUFFIX) else [name + TEX_SUFFIX, name]
+        for directory in (root_directory, os.path.dirname(including_file)):
+            for candidate in candidates:
+                path = os.path.normpath(os.path.join(directory, candidate))
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def scan(self, root: str) -> TexProject:
+        """Scan the project of the root file `root`, or of every .tex file in the directory `root`."""
+        root = os.path.abspath(root)
+        self._load(root)
+        self.num_scanned = 0
+
+        if os.path.isdir(root):
+            root_directory = root
+            level = []
+            for directory, subdirectories, names in os.walk(root):
+                subdirectories.sort()
+                level += [os.path.join(directory, name) for name in sorted(names) if name.endswith(TEX_SUFFIX)]
+        else:
+            root_directory = os.path.dirname(root)
+            level = [root]
+
+        project = TexProject()
+        seen = set(level)
+        executor_holder: list = []
+        try:
+            # Breadth first through the include tree, one level at a time
+            while level:
+                next_level = []
+                for path, scan in zip(level, self._scan_files(level, executor_holder)):
+                    if scan is None:
+                        project.unresolved.append((path, path))
+                        continue
+                    project.files.append(path)
+                    project.scans.append(scan)
+                    for name in scan[2]:
+                        included = self._resolve(name, root_directory, path)
+                        if included is None:
+                            project.unresolved.append((path, name))
+                        elif included not in seen:
+                            seen.add(included)
+                            next_level.append(included)
+                level = next_level
+        finally:
+            for executor in executor_holder:
+                executor.shutdown()
+
+        # Forget files that left the project
+        files = set(project.files)
+        for path in [path for path in self._results if path not in files]:
+            del self._results[path]
+        if self.num_scanned or len(self._results) != len(files):
+            self._store(root)
+
+        previous = self._project
+        if (not self.num_scanned and previous is not None and previous.files == project.files
+                and previous.unresolved == project.unresolved):
+            # Nothing changed: keep the keys already gathered
+            return previous
+        self._project = project
+        return project
+
+
+def cross_check(project: TexProject, entries: Sequence[BibEntry]) -> Tuple[Dict[str, List[Tuple[str, int]]], List[BibEntry]]:
+    """
+    Join the citations of `project` with the entries of the .bib file.
+
+    Args:
+        project: Result of TexScanner.scan
+        entries: Every parsed entry (of any type)
+
+    Returns:
+        (cited keys that no entry defines, with where they are cited;
+         entries that are neither cited nor cross-referenced by a cited entry)
+    """
+    defined = {entry.citation_key: entry for entry in entries}
+    cited = project.cited_keys
+    missing_keys = cited.difference(defined)
+    missing_keys.discard('*')
+    missing = project.places(missing_keys) if missing_keys else {}
+    if project.cites_all:
+        return missing, []
+
+    used = cited.intersection(defined)
+    # Entries pulled in through the crossref field of a cited entry count as cited too
+    pending = list(used)
+    while pending:
+        crossref = defined[pending.pop()].fields.get('crossref')
+        if crossref and crossref in defined and crossref not in used:
+            used.add(crossref)
+            pending.append(crossref)
+    unused = [entry for entry in entries if entry.citation_key not in used]
+    return missing, unused
+
+
+def add_unused_issues(entries: Sequence[BibEntry], unused: Sequence[BibEntry],
+                      stats: Optional[IssueStats] = None) -> None:
+    """
+    Give each checked entry in `unused` an IssueUnusedEntry, and take it from the others.
+
+    Issue lists are replaced rather than modified, since in watch mode
+    IncrementalChecker hands out the same lists again for unchanged entries.
+    The issues added and taken are counted in `stats`, if given.
+    """
+    unused_ids = set(map(id, unused))
+    for entry in entries:
+        has_issue = any(isinstance(issue, IssueUnusedEntry) for issue in entry.issues)
+        is_unused = id(entry) in unused_ids
+        if has_issue == is_unused:
+            continue
+        issues = [issue for issue in entry.issues if not isinstance(issue, IssueUnusedEntry)]
+        if stats is not None and not is_unused:
+            stats.remove([issue for issue in entry.issues if isinstance(issue, IssueUnusedEntry)])
+        if is_unused:
+            issues.append(IssueUnusedEntry(entry=None, issue_level=IssueLevel.NOTICE))
+            if stats is not None:
+                stats.add(issues[-1:])
+        entry.issues = issues if issues else NO_ISSUES
@@ -0,0 +1,275 @@
+import re
+import hashlib
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Similarity a near-duplicate title check uses unless told otherwise (the check itself is off by default)
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+SHINGLE_SIZE = 3
+# How candidate pairs from the LSH buckets are confirmed: exact Jaccard similarity of the
+# shingle sets, the similarity estimated from the MinHash signatures, or not at all
+VERIFY_MODES = ('jaccard', 'minhash', 'none')
+# Chance that a pair exactly at the threshold shares a bucket; sets the band layout
+LSH_RECALL = 0.95
+
+# Shingle hashes have 56 bits, leaving the top byte of a 64-bit signature value for the
+# distance an empty bin borrows its value from (so num_perm is at most 256)
+HASH_BITS = 56
+HASH_SALT = b'bibtitle'
+EMPTY_BIN = 1 << 64
+
+# LaTeX commands that stand for a letter (\ss, \o, \ae, ...); all other commands are dropped
+LATEX_LETTERS = {'ss': 'ss', 'o': 'o', 'O': 'o', 'ae': 'ae', 'AE': 'ae', 'oe': 'oe', 'OE': 'oe',
+                 'aa': 'a', 'AA': 'a', 'l': 'l', 'L': 'l', 'i': 'i', 'j': 'j'}
+LATEX_COMMAND_PATTERN = re.compile(r'\\([A-Za-z]+|[^A-Za-z\s])\s*')
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+# Grouping and math shift characters, deleted so that {R}esidual stays one word
+LATEX_GROUPING = str.maketrans('', '', '{}$')
+
+
+def normalize_title(title: str) -> str:
+    """
+    Canonical form of a title for duplicate detection.
+
+    LaTeX commands, braces and math shifts are removed, accents are folded
+    (both \\'e and é become e), the text is casefolded and every run of
+    punctuation or whitespace becomes one space.
+    """
+    if '\\' in title:
+        title = LATEX_COMMAND_PATTERN.sub(lambda match: LATEX_LETTERS.get(match.group(1), ''), title)
+    if not title.isascii():
+        title = ''.join(char for char in unicodedata.normalize('NFKD', title) if not unicodedata.combining(char))
+    if '{' in title or '$' in title:
+        title = title.translate(LATEX_GROUPING)
+    return NON_WORD_PATTERN.sub(' ', title.casefold()).strip()
+
+
+def choose_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Return (bands, rows) for LSH over `num_perm` MinHash values.
+
+    Uses the most rows per band (the fewest false candidates) for which a
+    pair with similarity `threshold` still shares a bucket with probability
+    LSH_RECALL.
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= LSH_RECALL:
+            return bands, rows
+    return num_perm, 1
+
+
+class MinHasher:
+    """
+    MinHash signatures of character shingles, by densified one-permutation hashing.
+
+    Each shingle is hashed once (and the hash kept in a table) and falls
+    into one of `num_perm` bins, which keeps the smallest hash it gets; an
+    empty bin borrows the value of the next non-empty one to its right,
+    offset by the distance. Two signatures agree in a position with
+    probability close to the Jaccard similarity of the shingle sets, as with
+    `num_perm` independent permutations, for one hash per shingle instead of
+    `num_perm`. Hashes are seeded and independent of PYTHONHASHSEED, so
+    results are the same in every run.
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = SHINGLE_SIZE):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._table: Dict[str, int] = {}
+
+    def shingles(self, text: str) -> Set[str]:
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text}
+        return set(map(''.join, zip(*[text[start:] for start in range(size)])))
+
+    def _hash(self, shingle: str) -> int:
+        value = self._table[shingle] = int.from_bytes(
+            hashlib.blake2b(shingle.encode(), digest_size=HASH_BITS // 8, salt=HASH_SALT).digest(), 'little')
+        return value
+
+    def hashes(self, text: str) -> List[int]:
+        """The hashes of the distinct shingles of `text`."""
+        table = self._table
+        shingles = self.shingles(text)
+        values = list(map(table.get, shingles))
+        if None in values:
+            values = [table.get(shingle) or self._hash(shingle) for shingle in shingles]
+        return values
+
+    def signature(self, hashes: Iterable[int]) -> array:
+        """Signature of the shingle `hashes` of a text: `num_perm` values below 2^64."""
+        num_perm = self.num_perm
+        bins = [EMPTY_BIN] * num_perm
+        for value in hashes:
+            position = value % num_perm
+            if value < bins[position]:
+                bins[position] = value
+
+        if EMPTY_BIN in bins:
+            # Scan twice around from the right, so every empty bin has seen the next non-empty one
+            source, distance = EMPTY_BIN, 0
+            doubled = bins + bins
+            for position in range(2 * num_perm - 1, -1, -1):
+                value = doubled[position]
+                if value != EMPTY_BIN:
+                    source, distance = value, 0
+                    continue
+                distance += 1
+                if position < num_perm and source != EMPTY_BIN:
+                    bins[position] = source + (distance << HASH_BITS)
+        return array('Q', bins)
+
+
+class TitleIndex:
+    """
+    Near-duplicate index of normalized titles: MinHash signatures in LSH buckets.
+
+    A title is only compared with the titles it shares a bucket with, so
+    adding n titles costs O(n) bucket lookups plus the candidate checks,
+    instead of n²/2 comparisons. Titles can be added and removed in any
+    order (each distinct title is counted), and the similar titles of every
+    title are kept up to date, with a version number that changes whenever
+    they do.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, verify: str = 'jaccard',
+                 num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = SHINGLE_SIZE):
+        if verify not in VERIFY_MODES:
+            raise ValueError(f"verify must be one of {', '.join(VERIFY_MODES)}, not '{verify}'")
+        self.threshold = threshold
+        self.verify = verify
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = choose_bands(threshold, num_perm)
+        if num_perm > 256:
+            raise ValueError("num_perm must be at most 256")
+        self._counts: Dict[str, int] = {}
+        # What candidates are verified with: the shingle hashes of each title for 'jaccard',
+        # its signature otherwise (compact arrays, kept for remove() too)
+        self._sketches: Dict[str, array] = {}
+        # Bucket key -> the title in it, or a list once there are several
+        self._buckets: Dict[int, object] = {}
+        self._neighbors: Dict[str, Dict[str, float]] = {}
+        self._versions: Dict[str, int] = {}
+        # Candidate pairs looked at, and those that passed verification
+        self.num_candidates = 0
+        self.num_similar = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _bucket_keys(self, signature: array) -> List[int]:
+        rows = self.rows
+        return [hash((band, *signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _signature(self, sketch: array) -> array:
+        return sketch if self.verify != 'jaccard' else self.hasher.signature(sketch)
+
+    def add(self, title: str) -> None:
+        """Add one occurrence of the normalized `title`."""
+        count = self._counts.get(title, 0)
+        self._counts[title] = count + 1
+        if count:
+            return
+
+        hashes = self.hasher.hashes(title)
+        signature = self.hasher.signature(hashes)
+        if self.verify == 'jaccard':
+            sketch = self._sketches[title] = array('Q', hashes)
+            shingle_set = set(hashes)
+        else:
+            sketch = self._sketches[title] = signature
+        sketches = self._sketches
+        threshold = self.threshold
+        accept_all = self.verify == 'none'
+
+        neighbors = self._neighbors[title] = {}
+        self._versions[title] = 0
+        buckets = self._buckets
+        seen = set()
+        for key in self._bucket_keys(signature):
+            members = buckets.get(key)
+            if members is None:
+                buckets[key] = title
+                continue
+            if members.__class__ is str:
+                members = buckets[key] = [members]
+            for other in members:
+                if other in seen:
+                    continue
+                seen.add(other)
+                self.num_candidates += 1
+                other_sketch = sketches[other]
+                if self.verify == 'jaccard':
+                    common = len(shingle_set.intersection(other_sketch))
+                    similarity = common / (len(sketch) + len(other_sketch) - common)
+                else:
+                    similarity = sum(map(int.__eq__, signature, other_sketch)) / len(signature)
+                if accept_all or similarity >= threshold:
+                    self.num_similar += 1
+                    neighbors[other] = similarity
+                    self._neighbors[other][title] = similarity
+                    self._versions[other] += 1
+            members.append(title)
+
+    def remove(self, title: str) -> None:
+        """Remove one occurrence of the normalized `title`."""
+        count = self._counts[title] - 1
+        if count:
+            self._counts[title] = count
+            return
+        del self._counts[title]
+
+        buckets = self._buckets
+        for key in self._bucket_keys(self._signature(self._sketches.pop(title))):
+            members = buckets[key]
+            if members.__class__ is str:
+                del buckets[key]
+            else:
+                members.remove(title)
+                if len(members) == 1:
+                    buckets[key] = members[0]
+        for other in self._neighbors.pop(title):
+            del self._neighbors[other][title]
+            self._versions[other] += 1
+        del self._versions[title]
+
+    def similar(self, title: str) -> Dict[str, float]:
+        """The other titles in the index similar to `title` (which must be in it), with their similarity."""
+        return self._neighbors[title]
+
+    def version(self, title: str) -> int:
+        return self._versions[title]
+
+
+class TitleSimilarity:
+    """Settings of the near-duplicate title check; threshold None (or 0) turns it off."""
+
+    def __init__(self, threshold: Optional[float] = DEFAULT_THRESHOLD, verify: str = 'jaccard',
+                 num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = SHINGLE_SIZE):
+        self.threshold = threshold
+        self.verify = verify
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.threshold)
+
+    def new_index(self) -> TitleIndex:
+        return TitleIndex(self.threshold, self.verify, self.num_perm, self.shingle_size)
+
+
+def find_similar_titles(titles: Iterable[str], settings: Optional[TitleSimilarity] = None) -> TitleIndex:
+    """Index the normalized `titles` and return the index, to query with similar()."""
+    index = (settings or TitleSimilarity()).new_index()
+    for title in titles:
+        index.add(title)
+    return index
+
+
+# Settings used by check(): off unless main.py's --title-similarity turns it on
+TITLE_SIMILARITY = TitleSimilarity(threshold=0)
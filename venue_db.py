@@ -0,0 +1,251 @@
+import os
+import sys
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Bundled venues: the list that is edited, and the index built from it that the checker reads
+DEFAULT_SOURCE = os.path.join(DATA_DIR, "venues.tsv")
+DEFAULT_INDEX = os.path.join(DATA_DIR, "venues.bin")
+
+MAGIC = b"BIBVENUE"
+FORMAT_VERSION = 1
+# Format version, number of trie nodes, number of full names, bytes of full names
+_HEADER = struct.Struct("<IIII")
+
+
+def venue_key(abbreviation: str) -> bytes:
+    """What an abbreviation is looked up by: upper case UTF-8, so 'NeurIPS' and 'NEURIPS' are the same venue."""
+    return abbreviation.strip().upper().encode("utf-8")
+
+
+def read_venue_list(path: str) -> Dict[str, str]:
+    """
+    Read a venue list: one 'abbreviation<TAB>full name' per line; blank lines and lines starting with '#' are skipped.
+
+    Returns:
+        {abbreviation: full name}, the last line winning for repeated abbreviations
+
+    Raises:
+        ValueError: A line without a tab, or with an empty abbreviation or name
+    """
+    venues = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            abbreviation, _, name = line.partition("\t")
+            if not abbreviation.strip() or not name.strip():
+                raise ValueError(f"{path}:{number}: expected 'abbreviation<TAB>full name'")
+            venues[abbreviation.strip()] = name.strip()
+    return venues
+
+
+class VenueIndex:
+    """
+    Full names of venues by abbreviation, in the compact binary form of venues.bin.
+
+    The abbreviations are kept in a byte-wise trie whose nodes are numbered
+    breadth first, so the children of a node are consecutive and sorted by
+    their byte. Each node has the byte leading to it, the number of its
+    first child, its number of children and the full name ending there (-1
+    for none); the distinct full names follow as one UTF-8 block. A lookup
+    walks one node per byte of the abbreviation, finding the child by
+    binary search among at most 256, so it takes O(length) steps.
+
+    File layout (little endian): MAGIC, header (_HEADER), then the arrays
+    first child (u32), full name (i32), full name offsets (u32, one more
+    than the names), child count (u16), byte (u8) and the names.
+    """
+
+    def __init__(self, labels: bytes, first: array, counts: array, values: array, offsets: array, names: bytes):
+        self._labels = labels
+        self._first = first
+        self._counts = counts
+        self._values = values
+        self._offsets = offsets
+        self._names = names
+
+    @classmethod
+    def build(cls, venues: Dict[str, str]) -> 'VenueIndex':
+        """Index {abbreviation: full name}."""
+        name_numbers: Dict[str, int] = {}
+        trie: dict = {}
+        for abbreviation, name in venues.items():
+            node = trie
+            for byte in venue_key(abbreviation):
+                node = node.setdefault(byte, {})
+            node[None] = name_numbers.setdefault(name, len(name_numbers))
+
+        labels = bytearray([0])
+        first, counts, values = array("I"), array("H"), array("i")
+        queue = [trie]
+        # Breadth first: the children of every node are numbered together, after all earlier nodes' children
+        for node in queue:
+            children = sorted(byte for byte in node if byte is not None)
+            first.append(len(queue))
+            counts.append(len(children))
+            values.append(node.get(None, -1))
+            for byte in children:
+                labels.append(byte)
+                queue.append(node[byte])
+
+        offsets, names = array("I", [0]), bytearray()
+        for name in name_numbers:
+            names += name.encode("utf-8")
+            offsets.append(len(names))
+        return cls(bytes(labels), first, counts, values, offsets, bytes(names))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'VenueIndex':
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a venue index")
+        version, node_count, name_count, names_size = _HEADER.unpack_from(data, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"venue index version {version}, expected {FORMAT_VERSION}")
+        position = len(MAGIC) + _HEADER.size
+
+        def read(typecode: str, count: int) -> array:
+            nonlocal position
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(data[position:position + size])
+            position += size
+            if sys.byteorder != "little":
+                values.byteswap()
+            return values
+
+        first = read("I", node_count)
+        values = read("i", node_count)
+        offsets = read("I", name_count + 1)
+        counts = read("H", node_count)
+        labels = bytes(data[position:position + node_count])
+        names = bytes(data[position + node_count:position + node_count + names_size])
+        if len(labels) != node_count or len(names) != names_size:
+            raise ValueError("truncated venue index")
+        return cls(labels, first, counts, values, offsets, names)
+
+    def to_bytes(self) -> bytes:
+        parts = [MAGIC, _HEADER.pack(FORMAT_VERSION, len(self._labels), len(self._offsets) - 1, len(self._names))]
+        for values in (self._first, self._values, self._offsets, self._counts):
+            if sys.byteorder != "little":
+                values = array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        parts += [self._labels, self._names]
+        return b"".join(parts)
+
+    @classmethod
+    def load(cls, path: str) -> 'VenueIndex':
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    def _node(self, key: bytes) -> Optional[int]:
+        labels, first, counts = self._labels, self._first, self._counts
+        node = 0
+        for byte in key:
+            start = first[node]
+            end = start + counts[node]
+            node = bisect_left(labels, byte, start, end)
+            if node == end or labels[node] != byte:
+                return None
+        return node
+
+    def _name(self, number: int) -> str:
+        return self._names[self._offsets[number]:self._offsets[number + 1]].decode("utf-8")
+
+    def get(self, abbreviation: str) -> Optional[str]:
+        """The full name of the venue `abbreviation`, or None if it is not known."""
+        node = self._node(venue_key(abbreviation))
+        if node is None or self._values[node] < 0:
+            return None
+        return self._name(self._values[node])
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """(abbreviation in upper case, full name) of every venue, sorted by abbreviation."""
+        stack = [(0, b"")]
+        while stack:
+            node, key = stack.pop()
+            if self._values[node] >= 0:
+                yield key.decode("utf-8"), self._name(self._values[node])
+            start = self._first[node]
+            for child in reversed(range(start, start + self._counts[node])):
+                stack.append((child, key + self._labels[child:child + 1]))
+
+    def __len__(self) -> int:
+        return sum(1 for value in self._values if value >= 0)
+
+
+class VenueDatabase:
+    """
+    The bundled venue index and the venue lists or indexes added by the user (main.py --venues).
+
+    Files added later take precedence, so a user list can rename or add venues.
+    """
+
+    def __init__(self, indexes: Iterable[VenueIndex] = ()):
+        self.indexes: List[VenueIndex] = list(indexes)
+        # Files added with add_file, in order (see check_bib.CheckSettings)
+        self.paths: List[str] = []
+
+    def add_file(self, path: str) -> None:
+        """Add a venue list (see read_venue_list) or a binary index written by `python venue_db.py`."""
+        with open(path, "rb") as file:
+            data = file.read()
+        if data.startswith(MAGIC):
+            self.indexes.append(VenueIndex.from_bytes(data))
+        else:
+            self.indexes.append(VenueIndex.build(read_venue_list(path)))
+        self.paths.append(path)
+
+    def full_name(self, abbreviation: str) -> Optional[str]:
+        for index in reversed(self.indexes):
+            name = index.get(abbreviation)
+            if name is not None:
+                return name
+        return None
+
+
+_VENUES: Optional[VenueDatabase] = None
+
+
+def venue_database() -> VenueDatabase:
+    """
+    The venue database used by check(): the bundled index, read on first use, and the files added to it.
+
+    Files must be added before checking, as the analyses of venues are
+    cached (see check_bib.venue_analysis).
+    """
+    global _VENUES
+    if _VENUES is None:
+        _VENUES = VenueDatabase([VenueIndex.load(DEFAULT_INDEX)])
+    return _VENUES
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the binary index of a venue list.")
+    parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE,
+                        help="Venue list, one 'abbreviation<TAB>full name' per line (default: the bundled one)")
+    parser.add_argument("output", nargs="?", default=DEFAULT_INDEX,
+                        help="Index to write (default: the bundled one)")
+    args = parser.parse_args()
+    try:
+        index = VenueIndex.build(read_venue_list(args.source))
+    except (OSError, ValueError) as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+    index.save(args.output)
+    print(f"Wrote '{args.output}': {len(index)} venues, {os.path.getsize(args.output)} bytes.")
+
+
+if __name__ == "__main__":
+    main()